@@ -5,13 +5,17 @@ import os
 from datetime import datetime
 from utils.PageUtils import load_style_config, open_file_explorer, load_video_config, read_global_config, write_global_config
 from utils.PathUtils import get_data_paths, get_user_versions
-from utils.VideoUtils import render_all_video_clips, combine_full_video_direct, combine_full_video_ffmpeg_concat_gl, render_complete_full_video
+from utils.StorageUtils import json_file_exists
+from utils.EncodingProfiles import DEFAULT_ENCODING_PROFILE, ENCODING_PROFILES, benchmark_encoding_profiles
+from utils.SmartRender import XFADE_TRANSITIONS, combine_full_video_xfade, render_full_video_smart
+from utils.VideoUtils import RENDER_BACKENDS, get_default_render_workers, render_all_video_clips, combine_full_video_direct, combine_full_video_ffmpeg_concat_gl, render_complete_full_video, get_full_video_progress
 
 st.header("Step 5: Generate videos")
 
 st.info("Before rendering videos, make sure Steps 4-1 and 4-2 are complete and every setting has been double-checked.")
 
-G_config = read_global_config()
+# Only top-level keys are replaced when the render settings are saved
+G_config = dict(read_global_config())
 style_config = load_style_config()
 
 ### Savefile Management - Start ###
@@ -73,6 +77,12 @@ _video_res = G_config['VIDEO_RES']
 _video_bitrate = 5000 # TODO: Persist in the configuration file
 _trans_enable = G_config['VIDEO_TRANS_ENABLE']
 _trans_time = G_config['VIDEO_TRANS_TIME']
+_render_backend = G_config.get('VIDEO_RENDER_BACKEND', RENDER_BACKENDS[0])
+_max_render_workers = os.cpu_count() or 1
+_render_workers = min(G_config.get('VIDEO_RENDER_WORKERS', get_default_render_workers()), _max_render_workers)
+_encoding_profile = G_config.get('VIDEO_ENCODING_PROFILE', DEFAULT_ENCODING_PROFILE)
+_encoding_profile_names = list(ENCODING_PROFILES)
+_smart_full_video = G_config.get('VIDEO_SMART_RENDER', False)
 
 options = ["Generate individual clips", "Generate a full video"]
 with st.container(border=True):
@@ -80,7 +90,25 @@ with st.container(border=True):
             options=options, 
             index=_mode_index)
     
-    force_render_clip = st.checkbox("Overwrite existing video files when rendering clips", value=False)
+    force_render_clip = st.checkbox("Re-render every clip, including unchanged ones", value=False,
+                                    help="Clips whose settings and input files haven't changed since they were rendered are reused; "
+                                         "changed clips are always re-rendered. An unchanged full video is reused the same way, "
+                                         "and an interrupted one resumes from its last finished segment.")
+    render_backend = st.selectbox("Clip rendering backend",
+                                  options=RENDER_BACKENDS,
+                                  index=RENDER_BACKENDS.index(_render_backend) if _render_backend in RENDER_BACKENDS else 0,
+                                  format_func=lambda backend: {"moviepy": "moviepy (frame-by-frame compositing)",
+                                                               "ffmpeg": "ffmpeg (single filter graph per clip, faster)"}[backend],
+                                  help="Applies to clip rendering only; the classic full video mode always composites with moviepy.")
+    render_workers = st.number_input("Parallel clip rendering workers", min_value=1, max_value=_max_render_workers,
+                                     value=_render_workers, step=1,
+                                     help="Clips are rendered in separate processes and encoder threads are split evenly "
+                                          "across them. Each worker holds its own clip in memory; lower this if you run out of RAM.")
+    smart_full_video = st.checkbox("Smart full video rendering", value=_smart_full_video,
+                                   disabled=mode_str != options[1],
+                                   help="Renders every clip on its own (reusing unchanged clips and the workers above), "
+                                        "re-encodes only the short transition windows between clips and stream-copies "
+                                        "the rest. Transitions look the same as the classic full video mode.")
 
 trans_config_placeholder = st.empty()
 with trans_config_placeholder.container(border=True):
@@ -97,6 +125,23 @@ with st.container(border=True):
 with st.container(border=True):
     st.write("Video bitrate (kbps)")  
     v_bitrate = st.number_input("Video bitrate", min_value=1000, max_value=10000, value=_video_bitrate)
+    encoding_profile = st.selectbox("Encoding profile",
+                                    options=_encoding_profile_names,
+                                    index=_encoding_profile_names.index(_encoding_profile)
+                                    if _encoding_profile in _encoding_profile_names else 0,
+                                    format_func=lambda name: f"{name} - {ENCODING_PROFILES[name]['description']}",
+                                    help="Controls the encoder preset, rate control, keyframe interval and audio quality "
+                                         "for clips and the full video. Changing it re-renders existing clips.")
+    with st.expander("Compare encoding profiles on this machine"):
+        st.info("Encodes a 10-second synthetic clip at the current resolution with every profile "
+                "and reports encoding speed and file size. This can take a minute.")
+        if st.button("Run encoding benchmark"):
+            with st.spinner("Encoding benchmark clips..."):
+                benchmark_results = benchmark_encoding_profiles(resolution=(v_res_width, v_res_height),
+                                                                video_bitrate=f"{v_bitrate}k")
+            st.dataframe(benchmark_results, hide_index=True,
+                         column_config={"fps": "Encode speed (fps)", "size_mb": "Size (MB)",
+                                        "bitrate_kbps": "Actual bitrate (kbps)", "seconds": "Encode time (s)"})
 
 v_mode_index = options.index(mode_str)
 v_bitrate_kbps = f"{v_bitrate}k"
@@ -107,7 +152,7 @@ if not os.path.exists(video_output_path):
 
 # Load the video config file from the save.
 video_config_file = current_paths['video_config']
-if not os.path.exists(video_config_file):
+if not json_file_exists(video_config_file):
     st.error(f"Video configuration file {video_config_file} not found. Check earlier steps and make sure the B50 save is complete!")
     st.stop()
 video_configs = load_video_config(video_config_file)
@@ -119,9 +164,30 @@ def save_video_render_config():
     G_config['VIDEO_BITRATE'] = v_bitrate
     G_config['VIDEO_TRANS_ENABLE'] = trans_enable
     G_config['VIDEO_TRANS_TIME'] = trans_time
+    G_config['VIDEO_RENDER_BACKEND'] = render_backend
+    G_config['VIDEO_RENDER_WORKERS'] = render_workers
+    G_config['VIDEO_ENCODING_PROFILE'] = encoding_profile
+    G_config['VIDEO_SMART_RENDER'] = smart_full_video
     write_global_config(G_config)
     st.toast("Configuration saved!")
 
+def show_clip_render_results(results):
+    # Summarize per-clip results and report whether every clip is available for concatenation.
+    failed = [r for r in results if r['status'] == "error"]
+    rendered = sum(1 for r in results if r['status'] == "success")
+    skipped = sum(1 for r in results if r['status'] == "skipped")
+    st.write(f"Rendered {rendered} clips, skipped {skipped} existing clips, {len(failed)} failed.")
+    for result in failed:
+        st.error(result['info'])
+    return not failed
+
+# A full video render that was interrupted keeps its finished segments and resumes from the first missing one.
+full_video_progress = get_full_video_progress(video_output_path, username)
+if full_video_progress and full_video_progress['state'] != "done":
+    st.info(f"An unfinished full video render was found ({full_video_progress['completed_segments']}/"
+            f"{full_video_progress['total_segments']} segments, {full_video_progress['percent']}%). "
+            "Generating the full video again with the same settings resumes from where it stopped.")
+
 if st.button("Start rendering videos"):
     save_video_render_config()
     video_res = (v_res_width, v_res_height)
@@ -132,16 +198,21 @@ if st.button("Start rendering videos"):
             with placeholder.container(border=True, height=560):
                 st.warning("Don't navigate away or refresh during rendering; it can interrupt the process.")
                 with st.spinner("Rendering all video clips..."):
-                    render_all_video_clips(resources=video_configs,
-                                           style_config=style_config,
-                                           video_output_path=video_output_path,
-                                           video_res=video_res,
-                                           video_bitrate=v_bitrate_kbps,
-                                           auto_add_transition=False,
-                                           trans_time=trans_time,
-                                           force_render=force_render_clip)
+                    results = render_all_video_clips(resources=video_configs,
+                                                     style_config=style_config,
+                                                     video_output_path=video_output_path,
+                                                     video_res=video_res,
+                                                     video_bitrate=v_bitrate_kbps,
+                                                     auto_add_transition=False,
+                                                     trans_time=trans_time,
+                                                     force_render=force_render_clip,
+                                                     backend=render_backend,
+                                                     workers=render_workers,
+                                                     encoding_profile=encoding_profile)
                     st.info("Batch clip rendering started. Watch the console window for progress.")
-            st.success("Clip rendering complete! Use the button below to open the output folder.")
+                clips_ok = show_clip_render_results(results)
+            if clips_ok:
+                st.success("Clip rendering complete! Use the button below to open the output folder.")
         except Exception as e:
             st.error(f"Clip rendering failed. Details: {traceback.print_exc()}")
 
@@ -151,15 +222,39 @@ if st.button("Start rendering videos"):
                 st.info("Heads-up: generating the full video can take a while. Monitor progress in the console window.")
                 st.warning("Don't navigate away or refresh during rendering; it can interrupt the process.")
                 with st.spinner("Rendering the full video..."):
-                    output_info = render_complete_full_video(configs=video_configs, 
-                                                             style_config=style_config,
-                                                             username=username,
-                                                             video_output_path=video_output_path, 
-                                                             video_res=video_res, 
-                                                             video_bitrate=v_bitrate_kbps,
-                                                             video_trans_enable=trans_enable, 
-                                                             video_trans_time=trans_time, 
-                                                             full_last_clip=False)
+                    if smart_full_video:
+                        output_info = render_full_video_smart(configs=video_configs,
+                                                              style_config=style_config,
+                                                              username=username,
+                                                              video_output_path=video_output_path,
+                                                              video_res=video_res,
+                                                              video_bitrate=v_bitrate_kbps,
+                                                              video_trans_enable=trans_enable,
+                                                              video_trans_time=trans_time,
+                                                              backend=render_backend,
+                                                              workers=render_workers,
+                                                              force_render=force_render_clip,
+                                                              encoding_profile=encoding_profile)
+                    else:
+                        progress_bar = st.progress(0, text="Preparing the full video...")
+
+                        def show_full_video_progress(progress):
+                            progress_bar.progress(min(progress['percent'] / 100, 1.0),
+                                                  text=f"Rendered {progress['completed_segments']}/{progress['total_segments']} "
+                                                       f"segments ({progress['percent']}%)")
+
+                        output_info = render_complete_full_video(configs=video_configs, 
+                                                                 style_config=style_config,
+                                                                 username=username,
+                                                                 video_output_path=video_output_path, 
+                                                                 video_res=video_res, 
+                                                                 video_bitrate=v_bitrate_kbps,
+                                                                 video_trans_enable=trans_enable, 
+                                                                 video_trans_time=trans_time, 
+                                                                 full_last_clip=False,
+                                                                 encoding_profile=encoding_profile,
+                                                                 force_render=force_render_clip,
+                                                                 progress_callback=show_full_video_progress)
                     st.write(f"Result: {output_info['info']}")
             st.success("Full video rendering complete! Use the button below to open the output folder.")
         except Exception as e:
@@ -177,24 +272,48 @@ st.write("Alternative video generation options")
 st.warning("These features are experimental. Video quality and stability aren't guaranteed, so proceed with caution.")
 with st.container(border=True):
     st.write("[Quick mode] Render all clips first, then stitch them into a full video")
-    st.info("This mode reduces memory usage and speeds up rendering, but transitions between clips will be simple black fades.")
+    st.info("This mode reduces memory usage and speeds up rendering. Clips either fade through black, "
+            "or are joined with an ffmpeg xfade transition that only re-encodes the few seconds around each cut.")
+    quick_transition = st.selectbox("Transition between clips",
+                                    options=[None] + list(XFADE_TRANSITIONS),
+                                    format_func=lambda name: "Fade through black" if name is None else name,
+                                    disabled=not trans_enable,
+                                    help="Uses the transition duration above. Named transitions don't need Node.js or ffmpeg-concat.")
     if st.button("Generate full video via direct concatenation"):
         save_video_render_config()
         video_res = (v_res_width, v_res_height)
+        # xfade transitions blend unfaded clips; fade through black is baked into each clip instead.
+        use_xfade = trans_enable and quick_transition is not None
         with st.spinner("Rendering all video clips..."):
-            render_all_video_clips(
+            results = render_all_video_clips(
                 resources=video_configs, 
                 style_config=style_config,
                 video_output_path=video_output_path, 
                 video_res=video_res, 
                 video_bitrate=v_bitrate_kbps,
-                auto_add_transition=trans_enable, 
+                auto_add_transition=trans_enable and not use_xfade, 
                 trans_time=trans_time,
-                force_render=force_render_clip
+                force_render=force_render_clip,
+                backend=render_backend,
+                workers=render_workers,
+                encoding_profile=encoding_profile,
+                split_keyframes=use_xfade
             )
             st.info("Batch clip rendering started. Watch the console window for progress.")
+        if not show_clip_render_results(results):
+            st.stop()
         with st.spinner("Concatenating clips into a full video..."):
-            combine_full_video_direct(video_output_path)
+            try:
+                if use_xfade:
+                    combine_full_video_xfade([os.path.join(video_output_path, r['file']) for r in results],
+                                             video_output_path, v_bitrate_kbps, quick_transition, trans_time,
+                                             workers=render_workers, encoding_profile=encoding_profile)
+                else:
+                    combine_full_video_direct(video_output_path)
+            except (ValueError, RuntimeError, OSError) as e:
+                # Clips rendered with different settings can't be stream-copied together.
+                st.error(f"Concatenation failed: {e}")
+                st.stop()
         st.success("All tasks finished. Use the button above to open the folder and review the videos.")
 
 with st.container(border=True):
@@ -213,12 +332,12 @@ with st.container(border=True):
 
     with st.container(border=True):
         st.write("Clip transition effect")
-        trans_name = st.selectbox("Choose a transition", options=["fade", "circleOpen", "crossWarp", "directionalWarp", "directionalWipe", "crossZoom", "dreamy", "squaresWire"], index=0)
+        trans_name = st.selectbox("Choose a transition", options=list(XFADE_TRANSITIONS), index=0)
         if st.button("Render video with ffmpeg-concat"):
             save_video_render_config()
             video_res = (v_res_width, v_res_height)
             with st.spinner("Rendering all video clips..."):
-                render_all_video_clips(
+                results = render_all_video_clips(
                     resources=video_configs, 
                     style_config=style_config,
                     video_output_path=video_output_path, 
@@ -226,9 +345,14 @@ with st.container(border=True):
                     video_bitrate=v_bitrate_kbps,
                     auto_add_transition=trans_enable,
                     trans_time=trans_time,
-                    force_render=force_render_clip
+                    force_render=force_render_clip,
+                    backend=render_backend,
+                    workers=render_workers,
+                    encoding_profile=encoding_profile
                 )
                 st.info("Batch clip rendering started. Watch the console window for progress.")
+            if not show_clip_render_results(results):
+                st.stop()
             with st.spinner("Concatenating video with ffmpeg-concat..."):
                 combine_full_video_ffmpeg_concat_gl(video_output_path, video_res, trans_name, trans_time)
                 st.info("Video concatenation started. Watch the console window for progress.")
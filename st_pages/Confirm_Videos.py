@@ -2,10 +2,12 @@ import time
 import random
 import traceback
 import os
+from copy import deepcopy
 import streamlit as st
 from datetime import datetime
 from utils.PageUtils import escape_markdown_text, load_record_config, save_record_config, read_global_config
 from utils.PathUtils import get_data_paths, get_user_versions
+from utils.StorageUtils import json_file_exists
 from utils.WebAgentUtils import download_one_video
 
 G_config = read_global_config()
@@ -278,10 +280,10 @@ if downloader_type == "youtube":
     b50_config_file = current_paths['config_yt']
 elif downloader_type == "bilibili":
     b50_config_file = current_paths['config_bi']
-if not os.path.exists(b50_config_file):
+if not json_file_exists(b50_config_file):
     st.error(f"Configuration file {b50_config_file} not found. Verify that the B50 save data is complete!")
     st.stop()
-b50_config = load_record_config(b50_config_file, username)
+b50_config = deepcopy(load_record_config(b50_config_file, username))
 
 if b50_config:
     for song in b50_config:
@@ -7,7 +7,7 @@ from datetime import datetime
 from utils.themes import DEFAULT_STYLES
 from utils.PageUtils import read_global_config, write_global_config, DEFAULT_STYLE_CONFIG_FILE_PATH
 from utils.ImageUtils import generate_single_image
-from utils.VideoUtils import get_video_preview_frame
+from utils.VideoUtils import get_preview_resolution, get_video_preview_frame
 
 st.header("Video Style Configuration")
 
@@ -145,6 +145,10 @@ def update_preview_images(style_config, placeholder, test_string):
         "text": test_string
     }
     
+    # 按输出分辨率排版，缩小后显示，文字大小与实际渲染一致
+    video_res = G_config.get("VIDEO_RES", (1920, 1080))
+    preview_res = get_preview_resolution(video_res)
+
     with placeholder.container(border=True):
         st.info("Heads-up: This is just a preview of your style changes. Click the save button below to make them permanent!")
 
@@ -152,9 +156,10 @@ def update_preview_images(style_config, placeholder, test_string):
         pil_img1 = get_video_preview_frame(
             clip_config=intro_template,
             style_config=style_config,
-            resolution=G_config.get("VIDEO_RES", (1920, 1080)),
+            resolution=video_res,
             type="maimai",
-            part="intro"
+            part="intro",
+            preview_resolution=preview_res
         )
         st.image(pil_img1, caption="Preview 1 (Intro)")
 
@@ -174,9 +179,10 @@ def update_preview_images(style_config, placeholder, test_string):
         pil_img2 = get_video_preview_frame(
             clip_config=content_template,
             style_config=style_config,
-            resolution=G_config.get("VIDEO_RES", (1920, 1080)),
+            resolution=video_res,
             type="maimai",
-            part="content"
+            part="content",
+            preview_resolution=preview_res
         )
         st.image(pil_img2, caption="Preview 2 (Main segment)")
 
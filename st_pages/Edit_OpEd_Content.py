@@ -1,9 +1,11 @@
 import streamlit as st
 import os
+from copy import deepcopy
 import traceback
 from datetime import datetime
 from utils.PageUtils import load_video_config, save_video_config, read_global_config
 from utils.PathUtils import get_data_paths, get_user_versions
+from utils.StorageUtils import json_file_exists
 
 st.header("Step 4-2: Edit Intro/Outro Content")
 
@@ -103,11 +105,11 @@ if save_id:
     # To enable real-time widget updates, text box data is stored in session_state,
     # so it must be refreshed while reading the save
     video_config_file = current_paths['video_config']
-    if not os.path.exists(video_config_file):
+    if not json_file_exists(video_config_file):
         st.error(f"Video content configuration file {video_config_file} not found. Please verify previous steps and the integrity of the B50 save data!")
         config = None
     else:
-        config = load_video_config(video_config_file)
+        config = deepcopy(load_video_config(video_config_file))
         for name in ["intro", "ending"]:
             st.session_state[f"{name}_items"] = config[name]
 else:
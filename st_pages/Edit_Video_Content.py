@@ -1,11 +1,14 @@
 import streamlit as st
 import os
+from copy import deepcopy
 import traceback
 from datetime import datetime
 from utils.PageUtils import LEVEL_LABELS, load_style_config, open_file_explorer, get_video_duration, load_full_config_safe, load_video_config, save_video_config, read_global_config
 from utils.PathUtils import get_data_paths, get_user_versions
+from utils.StorageUtils import json_file_exists, remove_json_file
 from utils.WebAgentUtils import st_gene_resource_config
 from utils.VideoUtils import render_one_video_clip
+from utils.EncodingProfiles import DEFAULT_ENCODING_PROFILE
 
 DEFAULT_VIDEO_MAX_DURATION = 180
 
@@ -217,7 +220,7 @@ if downloader_type == "youtube":
     b50_config_file = current_paths['config_yt']
 elif downloader_type == "bilibili":
     b50_config_file = current_paths['config_bi']
-if not os.path.exists(b50_config_file):
+if not json_file_exists(b50_config_file):
     st.error(f"Save configuration file {b50_config_file} not found. Please check the integrity of the B50 save data!")
     st.stop()
 
@@ -233,7 +236,7 @@ st.info("Before editing, you can configure background images, background music,
 if st.button("Video template style settings", key="style_button"):
     st.switch_page("st_pages/Custom_Video_Style_Config.py")
 
-video_config = load_video_config(video_config_output_file)
+video_config = deepcopy(load_video_config(video_config_output_file))
 if not video_config or 'main' not in video_config:
     st.warning("This save doesn't have a video content configuration file yet. Click the button below to generate one before editing.")
     if st.button("Generate video content configuration"):
@@ -325,7 +328,8 @@ if video_config:
                     video_file_name=target_video_filename,
                     video_output_path=video_output_path,
                     video_res=v_res,
-                    video_bitrate=v_bitrate_kbps
+                    video_bitrate=v_bitrate_kbps,
+                    encoding_profile=G_config.get('VIDEO_ENCODING_PROFILE', DEFAULT_ENCODING_PROFILE)
                 )
             if res['status'] == 'success':
                 st.success(res['info'])
@@ -356,12 +360,12 @@ with st.expander("Additional settings and configuration management"):
             st.warning("Are you sure you want to force a configuration refresh? This action cannot be undone!")
             if st.button("Confirm delete and refresh", key=f"confirm_delete_video_config"):
                 try:
-                    os.remove(file)
+                    remove_json_file(file)
                     st.rerun()
                 except Exception as e:
                     st.error(f"Failed to delete the current configuration file: Detailed error information: {traceback.format_exc()}")
 
-        if os.path.exists(video_config_file):
+        if json_file_exists(video_config_file):
             if st.button("Force refresh video configuration file", key=f"delete_btn_video_config"):
                 delete_video_config_dialog(video_config_file)
         else:
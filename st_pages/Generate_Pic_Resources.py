@@ -7,6 +7,7 @@ from datetime import datetime
 from utils.ImageUtils import generate_single_image, check_mask_waring
 from utils.PageUtils import load_style_config, open_file_explorer, load_record_config
 from utils.PathUtils import get_data_paths, get_user_versions
+from utils.SaveCatalog import refresh_save_at
 
 
 def st_generate_b50_images(placeholder, user_id, save_paths):
@@ -56,6 +57,7 @@ def st_generate_b50_images(placeholder, user_id, save_paths):
             finally:
                 duration = perf_counter() - iter_start
                 print(f"{log_prefix} - finished in {duration:.2f}s")
+    refresh_save_at(save_paths['image_dir'])
 
 st.title("Step 1: Generate B50 background images")
 
@@ -7,8 +7,11 @@ from copy import deepcopy
 from datetime import datetime
 import pandas as pd
 from utils.PathUtils import *
-from utils.PageUtils import DATA_CONFIG_VERSION, LEVEL_LABELS, format_record_songid, load_full_config_safe, remove_invalid_chars, open_file_explorer
+from utils.PageUtils import DATA_CONFIG_VERSION, LEVEL_LABELS, format_record_songid, load_full_config_safe, invalidate_config_cache, remove_invalid_chars, open_file_explorer
 from utils.DataUtils import search_songs
+from utils.StorageUtils import dump_json
+from utils.SaveCatalog import refresh_save
+from utils.record_filters import FILTER_PRESETS
 from utils.dxnet_extension import get_rate, parse_level, compute_rating
 
 # Check streamlit extension installation status
@@ -123,7 +126,8 @@ def load_config_from_file(username, save_id):
     config_file = save_paths['data_file']
     try:
     # When loading save, check config file version. If old, try to auto-update.
-        content = load_full_config_safe(config_file, username)
+        # The loaded config is shared with the cache and is edited in place on this page
+        content = deepcopy(load_full_config_safe(config_file, username))
         return content
     except FileNotFoundError:
         return None
@@ -159,10 +163,11 @@ def save_config_to_file(username, save_id, config):
             return [_recursive_transform(elem, integer_fields) for elem in item]
         return item
     
-    with open(save_paths['data_file'], 'w', encoding='utf-8') as f:
-        integer_fields=["song_id", "level_index"]
-        config = _recursive_transform(config, integer_fields)
-        json.dump(config, f, ensure_ascii=False, indent=4)
+    integer_fields=["song_id", "level_index"]
+    config = _recursive_transform(config, integer_fields)
+    dump_json(save_paths['data_file'], config)
+    invalidate_config_cache(save_paths['data_file'])
+    refresh_save(username, save_id)
     
     return save_paths
 
@@ -186,10 +191,16 @@ def edit_config_info():
         options=["maimai"],
         index= 0 if current_config["type"] == "maimai" else 0,
     )
+    # Preset saves (AP/FC/... bests) store their filter tag as sub_type; keep it selectable so it isn't lost on save.
+    sub_type_options = ["custom", "best"] + list(FILTER_PRESETS.keys())
+    current_sub_type = current_config.get("sub_type", "custom")
+    if current_sub_type not in sub_type_options:
+        sub_type_options.append(current_sub_type)
     sub_type = st.radio(
-        "Is this a BestXX save? (If 'best' is selected, video rendering will be in reverse order)", 
-        options=["custom", "best"],
-        index= 1 if current_config["sub_type"] in ["ap", "best"] else 0,
+        "Save type (best and preset saves such as 'ap' are rendered in reverse order)", 
+        options=sub_type_options,
+        index=sub_type_options.index(current_sub_type),
+        horizontal=True,
     )
     rating = st.number_input(
         "Rating value (optional)",
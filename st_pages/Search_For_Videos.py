@@ -1,16 +1,18 @@
 import os
 import time
-import shutil
 import random
 import traceback
 import streamlit as st
 from datetime import datetime
-from utils.PageUtils import load_record_config, save_record_config, read_global_config, write_global_config
+from utils.PageUtils import open_record_store, read_global_config, write_global_config
 from utils.PathUtils import get_data_paths, get_user_versions
+from utils.SaveCatalog import refresh_save_at
+from utils.StorageUtils import json_file_exists, copy_json_file
 from utils.video_crawler import PurePytubefixDownloader, BilibiliDownloader
 from utils.WebAgentUtils import search_one_video
 
-G_config = read_global_config()
+# Only top-level keys are replaced when the search settings are saved
+G_config = dict(read_global_config())
 _downloader = G_config.get('DOWNLOADER', 'bilibili')
 _use_proxy = G_config.get('USE_PROXY', False)
 _proxy_address = G_config.get('PROXY_ADDRESS', '127.0.0.1:7890')
@@ -192,13 +194,13 @@ if downloader == "youtube":
 elif downloader == "bilibili":
     b50_config_file = current_paths['config_bi']
 
-if not os.path.exists(b50_data_file):
+if not json_file_exists(b50_data_file):
     st.error("B50 data file not found. Verify the save data is complete!")
     st.stop()
 
-if not os.path.exists(b50_config_file):
+if not json_file_exists(b50_config_file):
     # Copy the base data file to initialize the config file
-    shutil.copy(b50_data_file, b50_config_file)
+    copy_json_file(b50_data_file, b50_config_file)
     st.toast(f"Created the B50 index file for {downloader}.")
 
 # Compare and merge b50_data_file and b50_config_file
@@ -211,31 +213,31 @@ if not os.path.exists(b50_config_file):
 #     st.toast(f"Loaded the {downloader} B50 index with {update_count} updates")
 
 def st_search_b50_videoes(dl_instance, placeholder, search_wait_time):
-    # Load the existing B50 data
-    b50_records = load_record_config(b50_config_file)
-    record_len = len(b50_records)
+    # Load the existing B50 data; each search result is appended to the save journal
+    with open_record_store(b50_config_file) as record_store:
+        b50_records = record_store.records
+        record_len = len(b50_records)
 
-    with placeholder.container(border=True, height=560):
-        with st.spinner("Searching for B50 video information..."):
-            progress_bar = st.progress(0)
-            write_container = st.container(border=True, height=400)
-            i = 0
-            for song in b50_records:
-                i += 1
-                progress_bar.progress(i / record_len, text=f"Searching ({i}/{record_len}): {song['title']}")
-                if 'video_info_match' in song and song['video_info_match']:
-                    write_container.write(f"Skipping ({i}/{record_len}): {song['title']} — video info already stored")
-                    continue
-                
-                song_data, ouput_info = search_one_video(dl_instance, song)
-                write_container.write(f"[{i}/{record_len}] {ouput_info}")
+        with placeholder.container(border=True, height=560):
+            with st.spinner("Searching for B50 video information..."):
+                progress_bar = st.progress(0)
+                write_container = st.container(border=True, height=400)
+                for i, song in enumerate(b50_records, start=1):
+                    progress_bar.progress(i / record_len, text=f"Searching ({i}/{record_len}): {song['title']}")
+                    if 'video_info_match' in song and song['video_info_match']:
+                        write_container.write(f"Skipping ({i}/{record_len}): {song['title']} — video info already stored")
+                        continue
 
-                # Persist progress after each search
-                save_record_config(b50_config_file, b50_records)
-                
-                # Wait a few seconds to reduce the chance of being flagged as a bot
-                if search_wait_time[0] > 0 and search_wait_time[1] > search_wait_time[0]:
-                    time.sleep(random.randint(search_wait_time[0], search_wait_time[1]))
+                    song_data, ouput_info = search_one_video(dl_instance, song)
+                    write_container.write(f"[{i}/{record_len}] {ouput_info}")
+
+                    # Persist progress after each search
+                    record_store.update_record(i - 1, song_data)
+
+                    # Wait a few seconds to reduce the chance of being flagged as a bot
+                    if search_wait_time[0] > 0 and search_wait_time[1] > search_wait_time[0]:
+                        time.sleep(random.randint(search_wait_time[0], search_wait_time[1]))
+    refresh_save_at(b50_config_file)
 
 # Only show the search button after settings are saved
 if st.session_state.get('config_saved_step2', False):
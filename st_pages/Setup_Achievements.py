@@ -1,15 +1,35 @@
 import streamlit as st
 import os
-import json
+from copy import deepcopy
 import traceback
 from datetime import datetime
-from utils.user_gamedata_handlers import fetch_user_gamedata, update_b50_data_int
+from utils.user_gamedata_handlers import fetch_user_gamedata, fetch_users_gamedata_batch, update_b50_data_int
+from utils.save_diff import create_delta_save
 from utils.PageUtils import *
 from utils.PathUtils import *
+from utils.StorageUtils import json_file_exists, load_json, archive_old_versions
+from utils.BlobStore import dedupe_user_saves, collect_garbage, get_space_report
+from utils.SaveCatalog import remove_save, query_saves, rebuild_catalog
+from utils.MediaProbe import prune_media_index
+from utils.AudioUtils import prune_loudness_index
+from utils.VisionUtils import prune_circle_index
+from utils.TextRaster import prune_text_raster_cache
+from utils.RenderCache import RenderCache
 import glob
 
 maimai_level_label_list = list(LEVEL_LABELS.values())
 
+def prune_runtime_caches(username):
+    """
+    Drop stale entries from the media probe, loudness and circle detection indexes and from
+    the render caches of the user's saves, and trim the text raster cache.
+    Returns the number of removed entries.
+    """
+    removed = prune_media_index() + prune_loudness_index() + prune_circle_index() + prune_text_raster_cache()
+    for save_id in get_user_versions(username):
+        removed += RenderCache(get_data_paths(username, save_id)['output_video_dir']).prune()
+    return removed
+
 def convert_old_files(folder, username, save_paths):
     """
     Traverse all JSON files in the folder and rename any legacy files containing the
@@ -57,11 +77,11 @@ def convert_old_files(folder, username, save_paths):
     # Update image paths in the video configuration file.
     video_config_file = save_paths['video_config']
     print(video_config_file)
-    if not os.path.exists(video_config_file):
+    if not json_file_exists(video_config_file):
         st.error("Could not find video_config file! Make sure the full legacy data set was copied into the new directory.")
         return
     try:
-        video_config = load_video_config(video_config_file)
+        video_config = deepcopy(load_video_config(video_config_file))
         main_clips = video_config['main']
         for each in main_clips:
             id = each['id']
@@ -77,10 +97,9 @@ def convert_old_files(folder, username, save_paths):
 def edit_b50_data(user_id, save_id):
     save_paths = get_data_paths(user_id, save_id)
     datafile_path = save_paths['data_file']
-    with open(datafile_path, 'r', encoding='utf-8') as f:
-        head_data = json.load(f)
-        dx_rating = head_data.get("rating", 0)
-        data = head_data.get("records", None)
+    head_data = load_json(datafile_path)
+    dx_rating = head_data.get("rating", 0)
+    data = head_data.get("records", None)
     st.markdown(
         f"**Save details**\n\n"
         f"- Username: {user_id}\n\n"
@@ -196,7 +215,22 @@ with st.container(border=True):
             st.session_state.username = username  # Persist the username in session_state.
             st.session_state.config_saved = True  # Track that configuration has been stored.
 
-def fetch_new_achievement_data(username, save_paths, source, params=None):
+def show_delta_report(report):
+    if report is None:
+        st.info("No previous save was found, so every record needs to be processed.")
+        return
+    with st.container(border=True):
+        st.write(f"Reused assets from save {report['base_save_id']}: "
+                 f"{len(report['unchanged'])} unchanged, {len(report['changed'])} updated, "
+                 f"{len(report['added'])} new, {len(report['removed'])} removed records.")
+        st.write(f"Reused {report['reused_images']} images and {report['reused_clips']} rendered clips.")
+        for key, label in [("needs_search", "Need a video search"),
+                           ("needs_image", "Need a new image"),
+                           ("needs_render", "Need rendering")]:
+            if report[key]:
+                st.write(f"{label} ({len(report[key])}): {', '.join(report[key])}")
+
+def fetch_new_achievement_data(username, save_paths, source, params=None, reuse_previous=False):
     save_timestamp = os.path.dirname(save_paths['data_file'])
     raw_file_path = save_paths['raw_file']
     data_file_path = save_paths['data_file']
@@ -211,6 +245,10 @@ def fetch_new_achievement_data(username, save_paths, source, params=None):
             raise ValueError("Unknown data source!")
         st.success(f"Created a new save from user {username}'s latest data at {save_timestamp}.")
         st.session_state.data_updated_step1 = True
+        if reuse_previous:
+            save_id = os.path.basename(save_timestamp)
+            report = create_delta_save(st.session_state.username, save_id, global_config=read_global_config())
+            show_delta_report(report)
     except Exception as e:
         st.session_state.data_updated_step1 = False
         st.error(f"Failed to fetch B50 data: {e}")
@@ -221,7 +259,7 @@ def check_save_available(username, save_id):
     if not save_id:
         return False
     save_paths = get_data_paths(username, save_id)
-    return os.path.exists(save_paths['data_file'])
+    return json_file_exists(save_paths['data_file'])
 
 @st.dialog("Confirm save deletion")
 def delete_save_data(username, save_id):
@@ -235,6 +273,8 @@ def delete_save_data(username, save_id):
             for name in dirs:
                 os.rmdir(os.path.join(root, name))
         os.rmdir(version_dir)
+        invalidate_config_cache(version_dir)
+        remove_save(username, save_id)
         st.toast(f"Save deleted: {username} - {save_id}")
         st.rerun()
     if st.button("Cancel"):
@@ -256,12 +296,21 @@ if st.session_state.get('config_saved', False):
     st.write("Load B50 saves")
     versions = get_user_versions(username)
     if versions:
+        save_summaries = {save['save_id']: save for save in query_saves(username=username)}
+
+        def format_save_option(save_id):
+            label = f"{username} - {save_id} ({datetime.strptime(save_id.split('_')[0], '%Y%m%d').strftime('%Y-%m-%d')})"
+            summary = save_summaries.get(save_id, None)
+            if summary and summary['has_data']:
+                label += f" · {summary['record_count']} records · Rating {summary['rating']}"
+            return label
+
         with st.container(border=True):
             st.write("Newly created saves might not appear immediately. Select any other save to refresh the list.")
             selected_save_id = st.selectbox(
                 "Choose a save",
                 versions,
-                format_func=lambda x: f"{username} - {x} ({datetime.strptime(x.split('_')[0], '%Y%m%d').strftime('%Y-%m-%d')})"
+                format_func=format_save_option
             )
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -289,9 +338,44 @@ if st.session_state.get('config_saved', False):
             with col3:
                 if st.button("Delete save"):
                     delete_save_data(username, selected_save_id)
+        with st.expander("Compress older saves"):
+            st.info("Archived saves can still be loaded as usual. They are decompressed automatically the next time they are modified.")
+            keep_latest = st.number_input("Number of recent saves to keep uncompressed", min_value=1, value=3, step=1)
+            archive_codec = st.radio("Compression format", ["gzip", "zstd"], horizontal=True,
+                                     help="zstd requires the zstandard library. gzip is used when it is not installed.")
+            if st.button("Compress older saves"):
+                archive_result = archive_old_versions(username, keep_latest=int(keep_latest), codec=archive_codec)
+                st.success(f"Compressed {len(archive_result['archived'])} saves and freed {archive_result['saved_bytes'] / 1024:.1f} KB.")
+        with st.expander("Deduplicate images and rendered clips across saves"):
+            st.info("Identical score images and rendered clips in different saves are merged into one shared copy using hard links. Deleting a save and then running cleanup frees any files that no other save uses. Cleanup also drops stale entries from the media, loudness, circle detection and render caches.")
+            space_report = get_space_report(username)
+            st.write(f"Asset size across all saves: {space_report['logical_bytes'] / 1024 / 1024:.1f} MB, "
+                     f"actual disk usage: {space_report['physical_bytes'] / 1024 / 1024:.1f} MB")
+            dedupe_col, gc_col = st.columns(2)
+            with dedupe_col:
+                if st.button("Deduplicate assets"):
+                    dedupe_result = dedupe_user_saves(username)
+                    st.success(f"Processed {dedupe_result['files']} files and freed {dedupe_result['saved_bytes'] / 1024 / 1024:.1f} MB.")
+            with gc_col:
+                if st.button("Clean up unused shared files"):
+                    gc_result = collect_garbage()
+                    pruned_entries = prune_runtime_caches(username)
+                    st.success(f"Removed {gc_result['removed']} unused files and freed {gc_result['reclaimed_bytes'] / 1024 / 1024:.1f} MB. "
+                               f"Dropped {pruned_entries} stale cache entries.")
     else:
         st.warning(f"{username} has no historical saves. Fetch new B50 data below.")
 
+    with st.expander("Repair save index"):
+        st.info("The save list is read from an index of the b50_datas folder. If saves are missing or outdated after editing that folder by hand, rebuild the index from disk.")
+        if st.button("Rebuild save index"):
+            try:
+                user_count = rebuild_catalog()
+            except Exception as e:
+                st.error(f"Failed to rebuild the save index: {e}")
+            else:
+                st.toast(f"Rebuilt the save index for {user_count} users.")
+                st.rerun()
+
     @st.dialog("Import data from HTML source", width='large')
     def input_origin_data():
         st.write("Paste the copied page source into the field below:")
@@ -319,6 +403,8 @@ if st.session_state.get('config_saved', False):
     with st.container(border=True):
         # ======= Data from FISH =======
         st.info(f"Use the buttons below to pull B50 data from the CN server. We'll query the tracker as {raw_username} and create a fresh save automatically.")
+        reuse_previous_save = st.checkbox("Reuse video searches, images and rendered clips of unchanged records from the previous save",
+                                          value=True)
 
         if st.button("Fetch B50 data from Fish (CN server)"):
             current_paths = get_data_paths(username, timestamp=None)  # Determine the paths for a fresh save.
@@ -335,7 +421,8 @@ if st.session_state.get('config_saved', False):
                         params={
                             "type": "maimai",
                             "query": "best"
-                        }
+                        },
+                        reuse_previous=reuse_previous_save
                     )
 
         if st.button("Fetch AP B50 save from Fish"):
@@ -357,9 +444,79 @@ if st.session_state.get('config_saved', False):
                                 "tag": "ap",
                                 "top": 50
                             },
-                        }
+                        },
+                        reuse_previous=reuse_previous_save
                     )
 
+        with st.expander("Fetch a filtered save from Fish (FC50, per-level bests, ...)"):
+            filter_tag_labels = {
+                "fc": "FC50 (FC or better)",
+                "ap": "AP50 (AP or better)",
+                "fs": "FS50 (FS or better)",
+                "fdx": "FDX50 (FDX or better)",
+                "level": "Best records of one level",
+                "ds": "Highest chart constants",
+            }
+            filter_tag = st.selectbox("Filter", options=list(filter_tag_labels.keys()),
+                                      format_func=lambda x: filter_tag_labels[x])
+            col1, col2 = st.columns(2)
+            with col1:
+                filter_top = st.number_input("Number of records", min_value=1, max_value=200, value=50)
+            with col2:
+                filter_chart_type = st.selectbox("Chart type", options=["All", "SD", "DX"])
+            filter_level = st.text_input("Level (e.g. 14+, only used by the per-level filter)", value="14+",
+                                         disabled=filter_tag != "level")
+            if st.button("Fetch filtered save from Fish"):
+                current_paths = get_data_paths(username, timestamp=None)  # Determine the paths for a fresh save.
+                save_dir = os.path.dirname(current_paths['data_file'])
+                save_id = os.path.basename(save_dir)  # Use the save folder name as the timestamp.
+                record_filter = {
+                    "tag": filter_tag,
+                    "top": filter_top,
+                }
+                if filter_tag == "level":
+                    record_filter["level"] = filter_level.strip()
+                if filter_chart_type != "All":
+                    record_filter["chart_type"] = filter_chart_type
+                if save_id:
+                    os.makedirs(save_dir, exist_ok=True) # Create the save directory
+                    st.session_state.save_id = save_id
+                    with st.spinner("Fetching latest data..."):
+                        fetch_new_achievement_data(
+                            raw_username,
+                            current_paths,
+                            source="fish",
+                            params={
+                                "type": "maimai",
+                                "query": "all",
+                                "filter": record_filter,
+                            },
+                            reuse_previous=reuse_previous_save
+                        )
+
+
+        with st.expander("Batch fetch B50 saves for multiple players (Fish)"):
+            st.info("Enter one Fish username per line. A new save is created for every player; switch to a player with the username box above to continue editing.")
+            batch_usernames = st.text_area("Usernames", height=150)
+            batch_workers = st.number_input("Concurrent requests", min_value=1, max_value=16, value=4)
+            if st.button("Fetch all"):
+                usernames = [name for name in batch_usernames.splitlines() if name.strip()]
+                if not usernames:
+                    st.error("Enter at least one username!")
+                else:
+                    batch_log = st.container(border=True, height=300)
+                    def show_batch_result(name, result):
+                        if result['status'] == "success":
+                            batch_log.write(f"{name}: created save {result['save_id']}")
+                        else:
+                            batch_log.write(f"{name}: {result['info']}")
+                    with st.spinner("Fetching data for all players..."):
+                        fetch_users_gamedata_batch(usernames,
+                                                   params={"type": "maimai", "query": "best"},
+                                                   max_workers=batch_workers,
+                                                   on_result=show_batch_result)
+                    st.success("Batch fetch finished.")
+
 
         # ======= Data from DX Web =======
         st.info("Follow the steps below for International/JP server data. CN server users can skip this section.")
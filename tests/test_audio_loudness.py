@@ -0,0 +1,43 @@
+import subprocess
+
+import pytest
+from moviepy.config import FFMPEG_BINARY
+
+from utils import AudioUtils
+from utils.CacheUtils import FileKeyedIndex
+
+
+@pytest.fixture(autouse=True)
+def loudness_index(tmp_path, monkeypatch):
+    index = FileKeyedIndex(str(tmp_path / "audio_loudness_index.json"))
+    monkeypatch.setattr(AudioUtils, "_loudness_index", index)
+    return index
+
+
+def make_tone(path, seconds=2):
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+           '-f', 'lavfi', '-i', f"sine=f=440:d={seconds}", '-c:a', 'libmp3lame', str(path)]
+    subprocess.run(cmd, check=True)
+    return str(path)
+
+
+def test_rms_is_cached(tmp_path, loudness_index):
+    file_path = make_tone(tmp_path / "tone.mp3")
+    rms = AudioUtils.get_audio_rms(file_path, 0, 1)
+    assert rms > 0
+    assert loudness_index.get(file_path) == {"0.000-1.000": rms}
+
+
+def test_failed_decode_raises_and_is_not_cached(tmp_path, loudness_index):
+    file_path = tmp_path / "broken.mp3"
+    file_path.write_bytes(b"not an audio file")
+    with pytest.raises(RuntimeError, match="ffmpeg"):
+        AudioUtils.get_audio_rms(str(file_path))
+    assert loudness_index.get(str(file_path)) is None
+    assert AudioUtils.get_source_gain(str(file_path)) is None
+
+
+def test_empty_range_is_not_cached(tmp_path, loudness_index):
+    file_path = make_tone(tmp_path / "tone.mp3")
+    assert AudioUtils.get_audio_rms(file_path, 5, 6) is None
+    assert loudness_index.get(file_path) is None
@@ -0,0 +1,72 @@
+import subprocess
+
+import numpy as np
+import pytest
+from moviepy.config import FFMPEG_BINARY
+
+from utils import MediaProbe
+from utils.CacheUtils import FileKeyedIndex
+from utils.ConcatUtils import concat_videos, find_stream_mismatches, read_video_codec_config, read_video_sample_layout
+
+WIDTH, HEIGHT, FPS, SECONDS = 320, 240, 30, 2
+
+
+def make_clip(path, source, x264_params, audio_channels=1):
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+           '-f', 'lavfi', '-i', f"{source}=s={WIDTH}x{HEIGHT}:r={FPS}:d={SECONDS}",
+           '-f', 'lavfi', '-i', f"sine=f=440:d={SECONDS}",
+           '-ac', str(audio_channels), '-pix_fmt', 'yuv420p',
+           '-c:v', 'libx264', '-profile:v', 'high', '-preset', 'veryfast', '-x264-params', x264_params,
+           '-c:a', 'libmp3lame', '-shortest', str(path)]
+    subprocess.run(cmd, check=True)
+    return str(path)
+
+
+def decode_frames(path):
+    cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-nostdin', '-i', str(path),
+           '-fps_mode', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    raw = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+    return np.frombuffer(raw, np.uint8).reshape(-1, HEIGHT, WIDTH, 3)
+
+
+@pytest.fixture(autouse=True)
+def moviepy_probe(tmp_path, monkeypatch):
+    # 模拟未安装ffprobe的环境，探测结果写入临时索引
+    monkeypatch.setattr(MediaProbe.shutil, "which", lambda name: None)
+    monkeypatch.setattr(MediaProbe, "_probe_index", FileKeyedIndex(str(tmp_path / "media_probe_index.json")))
+
+
+def test_moviepy_probe_reports_stream_fields(tmp_path):
+    info = MediaProbe.get_media_info(make_clip(tmp_path / "a.mp4", "testsrc2", "ref=1", audio_channels=2))
+    assert info["pix_fmt"] == "yuv420p"
+    assert info["audio_codec"] == "mp3"
+    assert info["channels"] == 2
+
+
+def test_unknown_field_is_a_mismatch():
+    known = {"video_codec": "h264", "video_profile": "High", "width": WIDTH, "height": HEIGHT, "fps": FPS,
+             "pix_fmt": "yuv420p", "audio_codec": "mp3", "sample_rate": 44100, "channels": 1}
+    unknown = dict(known, pix_fmt=None)
+    assert find_stream_mismatches(["a.mp4", "b.mp4"], [known, known]) == []
+    assert find_stream_mismatches(["a.mp4", "b.mp4"], [known, unknown]) == ["b.mp4: 无法确定 pix_fmt"]
+
+
+def test_channel_mismatch_is_rejected(tmp_path):
+    files = [make_clip(tmp_path / "mono.mp4", "testsrc2", "ref=1", audio_channels=1),
+             make_clip(tmp_path / "stereo.mp4", "testsrc2", "ref=1", audio_channels=2)]
+    with pytest.raises(ValueError, match="channels"):
+        concat_videos(files, str(tmp_path / "out.mp4"))
+
+
+def test_concat_with_different_parameter_sets(tmp_path):
+    # 编码参数相同但PPS不同（CABAC与CAVLC），MP4不能直接拼接，需要走带内参数集的回退路径
+    files = [make_clip(tmp_path / "cabac.mp4", "testsrc2", "ref=1"),
+             make_clip(tmp_path / "cavlc.mp4", "testsrc", "cabac=0:ref=4")]
+    assert read_video_codec_config(files[0]) != read_video_codec_config(files[1])
+
+    output_file = str(tmp_path / "out.mp4")
+    assert concat_videos(files, output_file) == "nut"
+
+    expected = np.concatenate([decode_frames(file_path) for file_path in files])
+    assert read_video_sample_layout(output_file)["frame_count"] == len(expected)
+    assert np.array_equal(decode_frames(output_file), expected)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from utils import VideoUtils
+from utils.PageUtils import DATA_CONFIG_VERSION, load_video_config, save_video_config
+from utils.PathUtils import get_data_paths
+from utils.StorageUtils import dump_json
+from utils.WebAgentUtils import st_gene_resource_config
+from utils.save_diff import create_delta_save
+
+USERNAME = "tester"
+OLD_SAVE = "20250101_000000"
+NEW_SAVE = "20250102_000000"
+GLOBAL_CONFIG = {"CLIP_START_INTERVAL": [10, 10], "CLIP_PLAY_TIME": 5, "DEFAULT_COMMENT_PLACEHOLDERS": False}
+STYLE_CONFIG = {"asset_paths": {}, "options": {}}
+
+
+def make_record(index, achievements):
+    return {
+        "clip_id": f"PastBest_{index}", "clip_name": f"PastBest {index}",
+        "title": f"song {index}", "song_id": index, "level_index": 3, "level_label": "Master", "type": "DX",
+        "achievements": achievements, "fc": "", "fs": "",
+    }
+
+
+def write_save(save_id, records, with_images):
+    paths = get_data_paths(USERNAME, save_id)
+    os.makedirs(paths['image_dir'], exist_ok=True)
+    for record in records if with_images else []:
+        with open(os.path.join(paths['image_dir'], f"{record['clip_id']}.png"), "wb") as f:
+            f.write(f"{save_id}-{record['clip_id']}".encode())
+    dump_json(paths['data_file'], {"version": DATA_CONFIG_VERSION, "type": "maimai", "sub_type": "best",
+                                   "records": records})
+    return paths
+
+
+def fake_render_clip_job(job, video_output_path, **kwargs):
+    prefix, clip_config, _ = job
+    file_name = f"{prefix}_{clip_config['id']}.mp4"
+    os.makedirs(video_output_path, exist_ok=True)
+    with open(os.path.join(video_output_path, file_name), "wb") as f:
+        f.write(repr(clip_config).encode())
+    return {"status": "success", "file": file_name, "info": f"rendered {file_name}"}
+
+
+def render(paths):
+    resources = load_video_config(paths['video_config'])
+    results = VideoUtils.render_all_video_clips(resources, STYLE_CONFIG, paths['output_video_dir'],
+                                                (640, 360), "1000k")
+    # 以片段id（去掉文件名中的序号前缀与扩展名）为键
+    return {os.path.splitext(result['file'])[0].split("_", 1)[1]: result['status'] for result in results}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(VideoUtils, "render_clip_job", fake_render_clip_job)
+    return tmp_path
+
+
+def test_delta_save_carries_render_cache(workdir):
+    old_records = [make_record(1, 100.5), make_record(2, 100.0)]
+    old_paths = write_save(OLD_SAVE, old_records, with_images=True)
+    save_video_config(old_paths['video_config'],
+                      st_gene_resource_config(old_records, "best", old_paths['image_dir'], "./videos/downloads",
+                                              old_paths['video_config'], GLOBAL_CONFIG["CLIP_START_INTERVAL"],
+                                              GLOBAL_CONFIG["CLIP_PLAY_TIME"], False))
+    assert set(render(old_paths).values()) == {"success"}
+
+    # 第2条记录的成绩变化，其余片段应沿用旧存档的渲染结果；新存档的成绩图在增量创建之后才生成
+    new_records = [make_record(1, 100.5), make_record(2, 100.2)]
+    new_paths = write_save(NEW_SAVE, new_records, with_images=False)
+    report = create_delta_save(USERNAME, NEW_SAVE, OLD_SAVE, GLOBAL_CONFIG)
+    assert report["reused_clips"] == 3
+    assert report["needs_render"] == ["PastBest 2"]
+
+    statuses = render(new_paths)
+    skipped = sorted(clip_id for clip_id, status in statuses.items() if status == "skipped")
+    assert skipped == ["PastBest_1", "ending_1", "intro_1"]
+    assert statuses["PastBest_2"] == "success"
@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+
+from utils.CacheUtils import FileKeyedIndex
+
+FILES_PER_WORKER = 20
+
+
+def write_entries(index_file, data_dir, worker):
+    index = FileKeyedIndex(index_file)
+    for n in range(FILES_PER_WORKER):
+        path = os.path.join(data_dir, f"{worker}_{n}.txt")
+        index.set(path, {"worker": worker, "n": n})
+
+
+def test_concurrent_writers_merge_entries(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    workers = 4
+    for worker in range(workers):
+        for n in range(FILES_PER_WORKER):
+            (data_dir / f"{worker}_{n}.txt").write_text(f"{worker}-{n}")
+    index_file = str(tmp_path / "index.json")
+
+    # 与并行渲染相同，使用spawn启动的子进程各自持有一个索引对象
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=write_entries, args=(index_file, str(data_dir), worker))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    index = FileKeyedIndex(index_file)
+    for worker in range(workers):
+        for n in range(FILES_PER_WORKER):
+            assert index.get(str(data_dir / f"{worker}_{n}.txt")) == {"worker": worker, "n": n}
+
+
+def test_reload_after_other_writer(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("a")
+    index_file = str(tmp_path / "index.json")
+    reader = FileKeyedIndex(index_file)
+    assert reader.get(str(path)) is None
+
+    FileKeyedIndex(index_file).set(str(path), {"value": 1})
+    assert reader.get(str(path)) == {"value": 1}
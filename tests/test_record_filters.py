@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from utils import user_gamedata_handlers
+from utils.record_filters import build_version_map, filter_records
+
+MUSIC_METADATA = [
+    {"id": "1", "name": "old song", "type": 0, "version": "maimai"},
+    {"id": "2", "name": "new song", "type": 1, "version": "maimai でらっくす BUDDiES"},
+    {"id": "3", "name": "another new song", "type": 1, "version": "maimai でらっくす BUDDiES"},
+    {"id": None, "name": "unknown song", "type": 1, "version": "maimai"},
+]
+
+
+def make_record(song_id, ra):
+    return {"song_id": song_id, "title": f"song {song_id}", "type": "DX", "level_index": 3,
+            "level_label": "Master", "ds": 13.0, "ra": ra, "achievements": 100.0, "fc": "", "fs": ""}
+
+
+RECORDS = [make_record(1, 300), make_record(2, 200), make_record(3, 250), make_record(4, 400)]
+
+
+def test_version_filter_selects_records():
+    version_map = build_version_map(MUSIC_METADATA)
+    assert version_map == {"1": "maimai", "2": "maimai でらっくす BUDDiES", "3": "maimai でらっくす BUDDiES"}
+
+    result = filter_records(RECORDS, {"tag": "level", "version": "maimai でらっくす BUDDiES"}, version_map)
+    assert [record["song_id"] for record in result] == [3, 2]
+
+
+def test_version_filter_without_map_raises():
+    with pytest.raises(ValueError, match="版本"):
+        filter_records(RECORDS, {"tag": "level", "version": "maimai"})
+
+
+def test_generate_config_with_version_filter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("music_metadata/maimaidx")
+    with open("music_metadata/maimaidx/songs.json", "w", encoding="utf-8") as f:
+        json.dump(MUSIC_METADATA, f)
+
+    fish_data = {"username": "tester", "rating": 10000, "records": [dict(record) for record in RECORDS]}
+    params = {"type": "maimai", "query": "all", "filter": {"tag": "level", "version": ["maimai"], "top": 50}}
+    config = user_gamedata_handlers.generate_config_file_from_fish(fish_data, str(tmp_path / "b50.json"), params)
+    assert [record["song_id"] for record in config["records"]] == [1]
+
+
+def test_version_filter_without_metadata_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError, match="版本"):
+        user_gamedata_handlers.load_version_map({"tag": "level", "version": "maimai"})
@@ -0,0 +1,41 @@
+import os
+
+from utils import VideoUtils
+from utils.PathUtils import get_data_paths
+from utils.SaveCatalog import scan_save
+
+# 纯数字的用户名，完整视频的文件名同样以数字开头
+USERNAME = "12345"
+SAVE_ID = "20250101_000000"
+CLIP_FILES = ["0_intro_1.mp4", "1_clip_1.mp4", "2_clip_2.mp4", "3_ending_1.mp4"]
+FULL_VIDEO_FILES = [f"{USERNAME}_FULL_VIDEO.mp4", "final_output.mp4"]
+
+
+def make_output_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    output_dir = get_data_paths(USERNAME, SAVE_ID)['output_video_dir']
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name in CLIP_FILES + FULL_VIDEO_FILES:
+        with open(os.path.join(output_dir, file_name), "wb") as f:
+            f.write(file_name.encode())
+    return output_dir
+
+
+def test_full_video_is_not_counted_as_clip(tmp_path, monkeypatch):
+    make_output_dir(tmp_path, monkeypatch)
+    info = scan_save(USERNAME, SAVE_ID)
+    assert info["rendered_clip_count"] == len(CLIP_FILES)
+    assert info["has_full_video"] == 1
+
+
+def test_direct_concat_skips_full_video(tmp_path, monkeypatch):
+    output_dir = make_output_dir(tmp_path, monkeypatch)
+    concatenated = []
+
+    def fake_concat_videos(files, output_file):
+        concatenated.extend(os.path.basename(file_path) for file_path in files)
+        return "mp4"
+
+    monkeypatch.setattr(VideoUtils, "concat_videos", fake_concat_videos)
+    VideoUtils.combine_full_video_direct(output_dir)
+    assert concatenated == CLIP_FILES
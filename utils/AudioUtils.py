@@ -0,0 +1,126 @@
+import subprocess
+import tempfile
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from utils.CacheUtils import FileKeyedIndex
+from utils.MediaProbe import get_media_duration
+
+AUDIO_LOUDNESS_INDEX_FILE = "./videos/audio_loudness_index.json"
+# 每次从解码管道读取的时长，整段音频不会一次性载入内存
+CHUNK_SECONDS = 10
+ANALYSIS_SAMPLE_RATE = 44100
+ANALYSIS_CHANNELS = 2
+# 与原先的增益计算保持一致的限制范围，避免过度放大或减弱
+MIN_GAIN, MAX_GAIN = 0.1, 3.0
+
+_loudness_index = FileKeyedIndex(AUDIO_LOUDNESS_INDEX_FILE)
+
+
+def iter_pcm_chunks(file_path, start=0, end=None, chunk_seconds=CHUNK_SECONDS):
+    """用一个ffmpeg进程解码[start, end)区间的音频，按块返回float32的PCM数据（交错的多声道样本）"""
+    cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-nostdin']
+    if start > 0:
+        cmd += ['-ss', f"{start:.6f}"]
+    cmd += ['-i', str(file_path)]
+    if end is not None:
+        cmd += ['-t', f"{max(end - start, 0):.6f}"]
+    cmd += ['-vn', '-ac', str(ANALYSIS_CHANNELS), '-ar', str(ANALYSIS_SAMPLE_RATE), '-f', 'f32le', '-']
+    chunk_bytes = int(chunk_seconds * ANALYSIS_SAMPLE_RATE) * ANALYSIS_CHANNELS * 4
+    # stderr写入临时文件而不是管道，避免只读取stdout时stderr管道写满导致阻塞
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            while True:
+                data = proc.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                # 末尾可能不足一个完整样本
+                data = data[:len(data) - len(data) % 4]
+                yield np.frombuffer(data, dtype=np.float32)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        # 解码失败或被截断时已返回的数据不完整，不能作为测量结果
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            message = stderr_file.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"ffmpeg解码音频失败（返回码 {proc.returncode}）: {message}")
+
+
+def measure_mean_square(file_path, start=0, end=None):
+    """
+    计算区间内全部样本的均方值。
+
+    Returns:
+        tuple: (均方值, 样本数)，没有音频数据时样本数为0
+    """
+    total = 0.0
+    count = 0
+    for chunk in iter_pcm_chunks(file_path, start, end):
+        chunk = chunk.astype(np.float64)
+        total += float(np.dot(chunk, chunk))
+        count += chunk.size
+    return (total / count if count else 0.0), count
+
+
+def get_audio_rms(file_path, start=0, end=None, loop=False):
+    """
+    获取音频区间的均方根值（线性幅度），结果按 (源文件, start, end) 缓存，源文件变化后自动失效。
+
+    Args:
+        loop (bool): 音频会被循环播放到end（如开场bgm），此时按循环后的内容计算
+
+    Returns:
+        float: 均方根值，没有音频数据时返回None
+    """
+    key = f"{float(start):.3f}-{'' if end is None else f'{float(end):.3f}'}{'-loop' if loop else ''}"
+    cached = _loudness_index.get(file_path) or {}
+    if key in cached:
+        return cached[key]
+
+    if loop and end is not None:
+        # 循环播放的音频由若干个完整循环加上开头的一段组成，分别计算后按样本数加权
+        source_duration = get_media_duration(file_path)
+        if source_duration <= 0:
+            return None
+        full_loops, remainder = divmod(end - start, source_duration)
+        full_ms, full_count = measure_mean_square(file_path) if full_loops else (0.0, 0)
+        part_ms, part_count = measure_mean_square(file_path, 0, remainder) if remainder > 0 else (0.0, 0)
+        count = full_loops * full_count + part_count
+        mean_square = (full_loops * full_count * full_ms + part_count * part_ms) / count if count else 0.0
+    else:
+        mean_square, count = measure_mean_square(file_path, start, end)
+
+    if not count:
+        # 没有解码出任何样本时不缓存，下次重新分析
+        return None
+    rms = float(np.sqrt(mean_square))
+    entry = dict(_loudness_index.get(file_path) or {})
+    entry[key] = rms
+    _loudness_index.set(file_path, entry)
+    return rms
+
+
+def rms_to_gain(rms, target_dbfs=-20):
+    """计算将均方根响度调整到目标分贝值所需的增益"""
+    target_rms = 10 ** (target_dbfs / 20)
+    gain = target_rms / (rms + 1e-8)  # 添加小值避免除零
+    return float(np.clip(gain, MIN_GAIN, MAX_GAIN))
+
+
+def get_source_gain(file_path, start=0, end=None, target_dbfs=-20, loop=False):
+    """音频区间均衡到目标响度所需的增益，无法分析时返回None"""
+    try:
+        rms = get_audio_rms(file_path, start, end, loop=loop)
+    except Exception as e:
+        print(f"Warning: 分析音频响度失败 {file_path}: {e}")
+        return None
+    if rms is None:
+        return None
+    return rms_to_gain(rms, target_dbfs)
+
+
+def prune_loudness_index():
+    return _loudness_index.prune()
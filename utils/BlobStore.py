@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import shutil
+
+from utils.CacheUtils import file_lock
+from utils.PathUtils import get_data_paths, get_user_versions
+
+# 内容寻址的资源仓库：存档中的成绩图与已渲染片段以硬链接的方式引用 .blobs 中的同一份文件，
+# 不同存档间内容相同的文件只占用一份磁盘空间
+BLOB_ROOT = os.path.join("b50_datas", ".blobs")
+BLOB_LOCK_FILE = os.path.join(BLOB_ROOT, ".lock")
+# 超过该时间仍未释放的锁视为进程异常退出后的残留
+BLOB_LOCK_STALE_SECONDS = 600
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 只对逐条生成、可以跨存档复用的文件去重（不包括 final_output.mp4 等整体输出）
+DEDUPE_FILE_PATTERNS = {
+    'image_dir': re.compile(r".+\.png$", re.IGNORECASE),
+    'output_video_dir': re.compile(r"^\d+_.+\.mp4$", re.IGNORECASE),
+}
+
+
+def blob_store_lock(timeout=60):
+    """跨进程的排他锁，入库与垃圾回收均需持有该锁"""
+    return file_lock(BLOB_LOCK_FILE, timeout=timeout, stale_seconds=BLOB_LOCK_STALE_SECONDS)
+
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_blob_path(digest, ext=""):
+    return os.path.join(BLOB_ROOT, digest[:2], digest + ext.lower())
+
+
+def is_linked(path):
+    return os.path.exists(path) and os.stat(path).st_nlink > 1
+
+
+def break_link(path):
+    """
+    写入文件前调用：如果文件与资源仓库（或其他存档）共享同一份数据，先删除该链接，
+    确保之后的写入只会产生新文件，而不会原地修改其他存档引用的内容。
+    """
+    if is_linked(path):
+        os.remove(path)
+
+
+def _replace_with_link(blob_path, path):
+    temp_path = f"{path}.{os.getpid()}.link"
+    os.link(blob_path, temp_path)
+    os.replace(temp_path, path)
+
+
+def store_file(path):
+    """
+    将文件存入资源仓库，并将原路径替换为指向仓库文件的硬链接。
+
+    Returns:
+        int: 因内容重复而节省的字节数；文件系统不支持硬链接时保持原文件不变并返回0
+    """
+    digest = hash_file(path)
+    blob_path = get_blob_path(digest, os.path.splitext(path)[1])
+    size = os.path.getsize(path)
+    try:
+        with blob_store_lock():
+            if os.path.exists(blob_path):
+                if os.path.samefile(blob_path, path):
+                    return 0
+                _replace_with_link(blob_path, path)
+                return size
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.link(path, blob_path)
+            return 0
+    except OSError as e:
+        # 跨磁盘或文件系统（如FAT32/exFAT）不支持硬链接，保留独立副本
+        print(f"Warning: 无法为 {path} 创建硬链接，将保留独立副本：{e}")
+        return 0
+
+
+def link_or_copy(src, dst):
+    """将src复制到dst；能够硬链接时，两者与资源仓库共享同一份数据"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    store_file(src)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def iter_save_assets(username, save_id):
+    """遍历存档中可以去重的资源文件"""
+    paths = get_data_paths(username, save_id)
+    for dir_key, pattern in DEDUPE_FILE_PATTERNS.items():
+        asset_dir = paths[dir_key]
+        if not os.path.isdir(asset_dir):
+            continue
+        for file_name in sorted(os.listdir(asset_dir)):
+            file_path = os.path.join(asset_dir, file_name)
+            if pattern.match(file_name) and os.path.isfile(file_path):
+                yield file_path
+
+
+def dedupe_user_saves(username):
+    """
+    将用户所有存档中的成绩图与已渲染片段存入资源仓库，内容相同的文件合并为同一份数据。
+
+    Returns:
+        dict: {"files": 处理的文件数, "saved_bytes": 本次节省的字节数}
+    """
+    file_count = 0
+    saved_bytes = 0
+    for save_id in get_user_versions(username):
+        for file_path in iter_save_assets(username, save_id):
+            saved_bytes += store_file(file_path)
+            file_count += 1
+    print(f"Info: 已处理{file_count}个资源文件，节省空间{saved_bytes / 1024 / 1024:.1f}MB")
+    return {"files": file_count, "saved_bytes": saved_bytes}
+
+
+def collect_garbage():
+    """
+    删除不再被任何存档引用的仓库文件（硬链接数为1）。
+
+    持有仓库锁时不会有新的链接产生，因此可以在其他存档正在使用时安全运行：
+    仍被存档引用的文件硬链接数大于1，不会被删除。
+
+    Returns:
+        dict: {"removed": 删除的文件数, "reclaimed_bytes": 回收的字节数}
+    """
+    removed = 0
+    reclaimed_bytes = 0
+    if not os.path.isdir(BLOB_ROOT):
+        return {"removed": removed, "reclaimed_bytes": reclaimed_bytes}
+    with blob_store_lock():
+        for root, _, files in os.walk(BLOB_ROOT):
+            for file_name in files:
+                blob_path = os.path.join(root, file_name)
+                if blob_path == BLOB_LOCK_FILE:
+                    continue
+                stat = os.stat(blob_path)
+                if stat.st_nlink <= 1:
+                    os.remove(blob_path)
+                    removed += 1
+                    reclaimed_bytes += stat.st_size
+    print(f"Info: 资源仓库回收了{removed}个文件，共{reclaimed_bytes / 1024 / 1024:.1f}MB")
+    return {"removed": removed, "reclaimed_bytes": reclaimed_bytes}
+
+
+def get_space_report(username):
+    """
+    统计用户存档资源的逻辑大小（各存档文件大小之和）与实际占用（按inode去重后的大小）。
+    """
+    logical_bytes = 0
+    physical = {}
+    for save_id in get_user_versions(username):
+        for file_path in iter_save_assets(username, save_id):
+            stat = os.stat(file_path)
+            logical_bytes += stat.st_size
+            physical[(stat.st_dev, stat.st_ino)] = stat.st_size
+    physical_bytes = sum(physical.values())
+    return {
+        "logical_bytes": logical_bytes,
+        "physical_bytes": physical_bytes,
+        "shared_bytes": logical_bytes - physical_bytes,
+    }
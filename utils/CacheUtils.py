@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.StorageUtils import dump_json, load_json
+
+# 超过该时间仍未释放的文件锁视为进程异常退出后的残留
+FILE_LOCK_STALE_SECONDS = 600
+# 写入索引时等待其他进程释放锁的最长时间
+INDEX_LOCK_TIMEOUT = 30
+
+
+@contextmanager
+def file_lock(lock_file, timeout=60, stale_seconds=FILE_LOCK_STALE_SECONDS):
+    """以独占创建lock_file实现的跨进程排他锁，超时未获得锁时抛出TimeoutError"""
+    lock_dir = os.path.dirname(lock_file)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_file) > stale_seconds:
+                    print(f"Warning: 发现过期的锁文件 {lock_file}，已自动清除。")
+                    os.remove(lock_file)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"等待锁超时：{lock_file}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_file)
+        except FileNotFoundError:
+            pass
+
+
+def file_signature(path):
+    """文件的 (大小, 修改时间) 签名，任一变化都视为文件已被替换或修改"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class FileKeyedIndex:
+    """
+    以文件路径为键、文件大小与修改时间为校验的持久化索引，保存为单个JSON文件。
+
+    用于缓存由文件内容计算出的结果（如媒体探测信息），文件被替换后对应条目自动失效。
+    同一进程内可被多个线程共享；多个进程（如并行渲染的子进程）写入同一索引时，
+    每次写入都在文件锁内重新读取磁盘上的索引并合并，不会覆盖其他进程写入的条目。
+    """
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self._entries = None
+        # 上次读取时索引文件的签名，文件被其他进程更新后重新读取
+        self._loaded_signature = None
+        self._lock = threading.Lock()
+
+    def _index_signature(self):
+        try:
+            return file_signature(self.index_file)
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        signature = self._index_signature()
+        if self._entries is not None and signature == self._loaded_signature:
+            return
+        try:
+            self._entries = load_json(self.index_file)
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception as e:
+            print(f"Warning: 索引文件 {self.index_file} 读取失败，将重新建立索引：{e}")
+            self._entries = {}
+        self._loaded_signature = signature
+
+    def _update(self, apply):
+        """在文件锁内重新读取索引，调用 apply(entries) 修改后写回；apply返回False时不写入"""
+        try:
+            with file_lock(self.index_file + ".lock", timeout=INDEX_LOCK_TIMEOUT):
+                self._load()
+                if apply(self._entries) is False:
+                    return
+                dump_json(self.index_file, self._entries)
+                self._loaded_signature = self._index_signature()
+        except TimeoutError as e:
+            # 索引只是缓存，无法获得锁时放弃本次写入，之后需要时重新计算
+            print(f"Warning: 索引文件 {self.index_file} 写入失败：{e}")
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def get(self, path):
+        """返回path的缓存结果，文件不存在、未缓存或已变化时返回None"""
+        if not os.path.exists(path):
+            return None
+        signature = file_signature(path)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self._key(path), None)
+        if entry is None or entry["signature"] != signature:
+            return None
+        return entry["data"]
+
+    def set(self, path, data):
+        entry = {"signature": file_signature(path), "data": data}
+        with self._lock:
+            self._update(lambda entries: entries.__setitem__(self._key(path), entry))
+
+    def get_or_compute(self, path, compute):
+        data = self.get(path)
+        if data is None:
+            data = compute(path)
+            if data is not None:
+                self.set(path, data)
+        return data
+
+    def prune(self):
+        """移除已不存在或已变化的文件的条目，返回移除的条目数"""
+        stale = []
+
+        def remove_stale(entries):
+            stale.extend(key for key, entry in entries.items()
+                         if not os.path.exists(key) or file_signature(key) != entry["signature"])
+            for key in stale:
+                del entries[key]
+            return bool(stale)
+
+        with self._lock:
+            self._update(remove_stale)
+        return len(stale)
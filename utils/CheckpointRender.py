@@ -0,0 +1,275 @@
+import os
+import shutil
+import time
+
+import numpy as np
+from moviepy.tools import find_extension
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from utils.BlobStore import break_link
+from utils.CacheUtils import file_signature
+from utils.ConcatUtils import concat_videos, mux_video_audio, read_video_sample_layout
+from utils.StorageUtils import dump_json, load_json
+
+# 分段渲染的检查点：完整视频按时间切分为若干段，每段单独编码为一个文件，
+# 清单文件记录每段是否已完成，中断后重新开始时从第一个未完成的段继续
+CHECKPOINT_MANIFEST_NAME = "manifest.json"
+# 清单格式或分段方式变化时递增，旧的检查点不再复用
+CHECKPOINT_VERSION = 1
+# 每段的时长（秒），中断时最多损失这么长的渲染进度
+CHECKPOINT_SEGMENT_SECONDS = 60
+# 渲染一段的过程中，每隔这么多帧更新一次清单中的进度
+PROGRESS_UPDATE_FRAMES = 150
+
+
+def plan_checkpoint_segments(total_frames, segment_frames):
+    """将 [0, total_frames) 帧切分为每段segment_frames帧的 (开始帧, 结束帧) 列表"""
+    return [(start, min(start + segment_frames, total_frames))
+            for start in range(0, total_frames, segment_frames)]
+
+
+def load_checkpoint_manifest(work_dir):
+    """读取检查点目录中的清单，不存在或无法读取时返回None"""
+    try:
+        return load_json(os.path.join(work_dir, CHECKPOINT_MANIFEST_NAME))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Warning: 读取检查点清单失败，将重新渲染：{e}")
+        return None
+
+
+def _save_manifest(work_dir, manifest, progress_callback=None):
+    manifest['updated_at'] = time.time()
+    dump_json(os.path.join(work_dir, CHECKPOINT_MANIFEST_NAME), manifest, compact=False)
+    if progress_callback:
+        progress_callback(summarize_checkpoint_progress(manifest))
+
+
+def summarize_checkpoint_progress(manifest):
+    """
+    由清单计算渲染进度。
+
+    Returns:
+        dict: {"state", "completed_segments", "total_segments", "completed_frames", "total_frames",
+               "percent", "audio_done", "updated_at", "error"}
+    """
+    segments = manifest.get('segments', [])
+    done = [segment for segment in segments if segment['done']]
+    total_frames = manifest.get('total_frames') or 0
+    completed_frames = sum(segment['end'] - segment['start'] for segment in done)
+    current = manifest.get('current')
+    if current is not None and not segments[current]['done']:
+        completed_frames += manifest.get('current_frames', 0)
+    return {
+        "state": manifest.get('state'),
+        "completed_segments": len(done),
+        "total_segments": len(segments),
+        "completed_frames": completed_frames,
+        "total_frames": total_frames,
+        "percent": round(100 * completed_frames / total_frames, 1) if total_frames else 0.0,
+        "audio_done": bool(manifest.get('audio') and manifest['audio']['done']),
+        "updated_at": manifest.get('updated_at'),
+        "error": manifest.get('error'),
+    }
+
+
+def get_checkpoint_progress(work_dir):
+    """查询检查点目录中的渲染进度（可以在渲染进行中从其他进程或页面查询），没有清单时返回None"""
+    manifest = load_checkpoint_manifest(work_dir)
+    return summarize_checkpoint_progress(manifest) if manifest else None
+
+
+def _part_is_valid(work_dir, part, expected_frames=None):
+    """已完成的段文件仍然存在、未被修改，且帧数与计划一致"""
+    if not part.get('done'):
+        return False
+    path = os.path.join(work_dir, part['file'])
+    if not os.path.exists(path) or file_signature(path) != part.get('signature'):
+        return False
+    if expected_frames is not None:
+        layout = read_video_sample_layout(path)
+        return layout is not None and layout['frame_count'] == expected_frames
+    return True
+
+
+def _new_manifest(fingerprint, output_file, total_frames, fps, segment_frames, audio_ext):
+    return {
+        "version": CHECKPOINT_VERSION,
+        "fingerprint": fingerprint,
+        "output_file": os.path.abspath(output_file),
+        "fps": fps,
+        "total_frames": total_frames,
+        "segment_frames": segment_frames,
+        "state": "rendering",
+        "segments": [{"start": start, "end": end, "file": f"{n:04d}.mp4", "done": False, "signature": None}
+                     for n, (start, end) in enumerate(plan_checkpoint_segments(total_frames, segment_frames))],
+        "audio": {"file": f"audio.{audio_ext}", "done": False, "signature": None} if audio_ext else None,
+        "current": None,
+        "current_frames": 0,
+        "error": None,
+    }
+
+
+def _write_segment(clip, start, end, output_file, write_kwargs, on_frames=None):
+    """
+    编码 [start, end) 帧为不含音频的视频文件。逐帧取画面与编码参数与 write_videofile 完全一致，
+    各段按流复制拼接后与一次性渲染的画面相同。先写入临时文件，完成后再替换。
+    """
+    fps = write_kwargs['fps']
+    temp_file = output_file[:-len(".mp4")] + ".partial.mp4"
+    has_mask = clip.mask is not None
+    with FFMPEG_VideoWriter(temp_file, clip.size, fps,
+                            codec=write_kwargs['codec'],
+                            preset=write_kwargs['preset'],
+                            bitrate=write_kwargs['bitrate'],
+                            with_mask=has_mask,
+                            threads=write_kwargs['threads'],
+                            ffmpeg_params=write_kwargs['ffmpeg_params']) as writer:
+        for n in range(start, end):
+            t = n / fps
+            frame = clip.get_frame(t)
+            if frame.dtype != "uint8":
+                frame = frame.astype("uint8")
+            if has_mask:
+                mask = 255 * clip.mask.get_frame(t)
+                if mask.dtype != "uint8":
+                    mask = mask.astype("uint8")
+                frame = np.dstack([frame, mask])
+            writer.write_frame(frame)
+            if on_frames and (n + 1 - start) % PROGRESS_UPDATE_FRAMES == 0:
+                on_frames(n + 1 - start)
+    os.replace(temp_file, output_file)
+
+
+def render_clip_checkpointed(make_clip, output_file, work_dir, fingerprint, write_kwargs,
+                             total_frames=None, segment_seconds=CHECKPOINT_SEGMENT_SECONDS,
+                             force_render=False, progress_callback=None, logger="bar"):
+    """
+    分段渲染一个moviepy片段，输出与 write_videofile 相同的视频文件。
+
+    视频按 segment_seconds 切分，每段编码为work_dir中的一个文件；音频单独编码为一个文件。
+    每完成一段都会更新清单，中断后以相同的fingerprint再次调用时，只渲染缺失或已损坏的段，
+    最后以流复制的方式拼接所有段并合并音频。拼接完成后删除各段文件，清单保留，
+    指纹相同且输出文件未被修改时再次调用会直接复用已有的输出文件。
+
+    Args:
+        make_clip (callable): 创建要渲染的片段，只在存在需要渲染的部分时调用
+        fingerprint (str): 渲染内容的指纹，与清单中记录的不同时丢弃旧的检查点
+        write_kwargs (dict): get_write_videofile_kwargs 生成的编码参数
+        total_frames (int): 总帧数，None表示由片段时长计算
+        force_render (bool): 丢弃已有的检查点与输出文件，全部重新渲染
+        progress_callback (callable): 进度更新时调用 progress_callback(progress)，见 summarize_checkpoint_progress
+
+    Returns:
+        dict: 渲染结束时的进度信息，另含 "rendered_segments"（本次实际渲染的段数）
+              与 "reused_output"（是否直接复用了已有的输出文件）
+    """
+    fps = write_kwargs['fps']
+    segment_frames = max(1, int(segment_seconds * fps))
+    os.makedirs(work_dir, exist_ok=True)
+
+    manifest = load_checkpoint_manifest(work_dir)
+    if manifest and not force_render and manifest.get('state') == "done" and manifest.get('fingerprint') == fingerprint \
+            and os.path.exists(output_file) and file_signature(output_file) == manifest.get('output_signature'):
+        print(f"Info: 视频配置未变化，复用已渲染的文件 {output_file}")
+        return dict(summarize_checkpoint_progress(manifest), rendered_segments=0, reused_output=True)
+    if manifest and (force_render or manifest.get('state') == "done"
+                     or manifest.get('version') != CHECKPOINT_VERSION or manifest.get('fingerprint') != fingerprint
+                     or manifest.get('segment_frames') != segment_frames):
+        if not force_render and manifest.get('state') != "done":
+            print("Info: 视频配置已变化，丢弃之前的渲染检查点")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir, exist_ok=True)
+        manifest = None
+
+    clip = None
+
+    def get_clip():
+        nonlocal clip
+        if clip is None:
+            clip = make_clip()
+        return clip
+
+    try:
+        if manifest is None:
+            source = get_clip()
+            frames = total_frames if total_frames is not None else int(source.duration * fps)
+            audio_ext = find_extension(write_kwargs['audio_codec']) if source.audio is not None else None
+            manifest = _new_manifest(fingerprint, output_file, frames, fps, segment_frames, audio_ext)
+        manifest['state'] = "rendering"
+        manifest['error'] = None
+        _save_manifest(work_dir, manifest, progress_callback)
+
+        rendered = 0
+        for index, segment in enumerate(manifest['segments']):
+            if _part_is_valid(work_dir, segment, segment['end'] - segment['start']):
+                continue
+            if segment['done']:
+                print(f"Warning: 第{index + 1}段的检查点文件缺失或已损坏，将重新渲染")
+            print(f"Info: 正在渲染第{index + 1}/{len(manifest['segments'])}段"
+                  f"（第{segment['start']}至{segment['end']}帧）")
+            manifest['current'] = index
+            manifest['current_frames'] = 0
+            segment['done'] = False
+            _save_manifest(work_dir, manifest, progress_callback)
+
+            def on_frames(count):
+                manifest['current_frames'] = count
+                _save_manifest(work_dir, manifest, progress_callback)
+
+            segment_file = os.path.join(work_dir, segment['file'])
+            _write_segment(get_clip(), segment['start'], segment['end'], segment_file, write_kwargs, on_frames)
+            segment['done'] = True
+            segment['signature'] = file_signature(segment_file)
+            manifest['current'] = None
+            manifest['current_frames'] = 0
+            _save_manifest(work_dir, manifest, progress_callback)
+            rendered += 1
+
+        audio = manifest['audio']
+        if audio and not _part_is_valid(work_dir, audio):
+            print("Info: 正在合成完整视频的音频")
+            audio_file = os.path.join(work_dir, audio['file'])
+            # 采样位数与 write_videofile 的默认值（audio_nbytes=4）一致
+            get_clip().audio.write_audiofile(audio_file, write_kwargs['audio_fps'], nbytes=4,
+                                             codec=write_kwargs['audio_codec'],
+                                             bitrate=write_kwargs['audio_bitrate'],
+                                             logger=logger)
+            audio['done'] = True
+            audio['signature'] = file_signature(audio_file)
+            _save_manifest(work_dir, manifest, progress_callback)
+
+        manifest['state'] = "concatenating"
+        _save_manifest(work_dir, manifest, progress_callback)
+        segment_files = [os.path.join(work_dir, segment['file']) for segment in manifest['segments']]
+        break_link(output_file)
+        if audio:
+            video_file = os.path.join(work_dir, "video.mp4")
+            concat_videos(segment_files, video_file)
+            mux_video_audio(video_file, os.path.join(work_dir, audio['file']), output_file)
+            os.remove(video_file)
+        else:
+            concat_videos(segment_files, output_file)
+
+        # 拼接完成后删除各段文件，只保留清单供查询结果与判断输出文件是否需要重新渲染
+        for part in manifest['segments'] + ([audio] if audio else []):
+            part_file = os.path.join(work_dir, part['file'])
+            if os.path.exists(part_file):
+                os.remove(part_file)
+        manifest['output_signature'] = file_signature(output_file)
+        manifest['state'] = "done"
+        _save_manifest(work_dir, manifest, progress_callback)
+        return dict(summarize_checkpoint_progress(manifest), rendered_segments=rendered, reused_output=False)
+    except BaseException as e:
+        # 已完成的段保留在清单中，下次从第一个未完成的段继续
+        if manifest is not None:
+            manifest['state'] = "interrupted" if isinstance(e, KeyboardInterrupt) else "error"
+            manifest['error'] = str(e) or type(e).__name__
+            manifest['current'] = None
+            manifest['current_frames'] = 0
+            _save_manifest(work_dir, manifest)
+        raise
+    finally:
+        if clip is not None:
+            clip.close()
@@ -0,0 +1,254 @@
+import os
+import struct
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from moviepy.config import FFMPEG_BINARY
+
+from utils.MediaProbe import get_media_info
+
+# 流复制拼接要求所有片段的这些参数一致（探测不到的字段视为不一致）
+CONCAT_STREAM_FIELDS = ["video_codec", "video_profile", "width", "height", "fps", "pix_fmt",
+                        "audio_codec", "sample_rate", "channels"]
+# 视频轨道的编码参数（stsd）、帧数（stsz）与关键帧表（stss）所在的box路径
+SAMPLE_DESCRIPTION_PATH = [b"mdia", b"minf", b"stbl", b"stsd"]
+SAMPLE_SIZE_PATH = [b"mdia", b"minf", b"stbl", b"stsz"]
+SYNC_SAMPLE_PATH = [b"mdia", b"minf", b"stbl", b"stss"]
+# stsd内容：版本与标志(4) + 条目数(4)；视频条目的子box之前有78字节的固定字段
+STSD_HEADER_SIZE = 8
+VISUAL_SAMPLE_ENTRY_SIZE = 78
+# 每个文件各不相同、与解码无关的子box（码率统计）
+IGNORED_SAMPLE_ENTRY_BOXES = (b"btrt",)
+
+
+def get_concat_signature(file_path):
+    info = get_media_info(file_path)
+    if info is None:
+        raise IOError(f"无法读取视频文件信息：{file_path}")
+    return {field: info.get(field) for field in CONCAT_STREAM_FIELDS}
+
+
+def find_stream_mismatches(files, signatures=None):
+    """
+    以第一个文件为基准，检查其他文件的流参数是否一致。
+
+    Returns:
+        list[str]: 不一致之处的说明，全部一致时为空列表
+    """
+    signatures = signatures or [get_concat_signature(file_path) for file_path in files]
+    reference = signatures[0]
+    mismatches = []
+    for file_path, signature in zip(files[1:], signatures[1:]):
+        for field in CONCAT_STREAM_FIELDS:
+            expected, actual = reference[field], signature[field]
+            # 无法确认参数一致时不能冒险流复制
+            if expected is None or actual is None:
+                unknown = files[0] if expected is None else file_path
+                mismatches.append(f"{os.path.basename(unknown)}: 无法确定 {field}")
+            elif expected != actual:
+                mismatches.append(f"{os.path.basename(file_path)}: {field} 为 {actual}，"
+                                  f"而 {os.path.basename(files[0])} 为 {expected}")
+    return mismatches
+
+
+def _iter_boxes(f, start, end):
+    """遍历MP4文件中[start, end)范围内的box，返回 (类型, 内容开始位置, 结束位置)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, pos + size
+        pos += size
+
+
+def _find_box(f, start, end, path):
+    for box_type, box_start, box_end in _iter_boxes(f, start, end):
+        if box_type == path[0]:
+            return (box_start, box_end) if len(path) == 1 else _find_box(f, box_start, box_end, path[1:])
+    return None
+
+
+def _read_handler_type(f, trak_start, trak_end):
+    hdlr = _find_box(f, trak_start, trak_end, [b"mdia", b"hdlr"])
+    if hdlr is None:
+        return None
+    # hdlr内容：版本与标志(4) + pre_defined(4) + handler_type(4)
+    f.seek(hdlr[0] + 8)
+    return f.read(4)
+
+
+def _iter_tracks(f):
+    """遍历MP4文件中的轨道，返回 (handler类型, trak内容开始位置, 结束位置)"""
+    moov = _find_box(f, 0, os.fstat(f.fileno()).st_size, [b"moov"])
+    if moov is None:
+        return
+    for box_type, trak_start, trak_end in _iter_boxes(f, *moov):
+        if box_type == b"trak":
+            yield _read_handler_type(f, trak_start, trak_end), trak_start, trak_end
+
+
+def read_video_codec_config(file_path):
+    """
+    读取MP4视频轨道第一个编码条目的类型与其中的编码配置box（如H.264的avcC，含SPS/PPS）。
+    MP4的concat demuxer只保留第一个文件的编码配置，配置不同的片段不能直接拼接。
+    只读取文件中的box结构，不需要启动ffmpeg。
+
+    Returns:
+        bytes: 编码条目类型与各子box的原始数据（不含码率统计），不是MP4文件或没有视频轨道时返回None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            for handler_type, trak_start, trak_end in _iter_tracks(f):
+                if handler_type != b"vide":
+                    continue
+                stsd = _find_box(f, trak_start, trak_end, SAMPLE_DESCRIPTION_PATH)
+                if stsd is None:
+                    return None
+                entry = next(_iter_boxes(f, stsd[0] + STSD_HEADER_SIZE, stsd[1]), None)
+                if entry is None:
+                    return None
+                entry_type, entry_start, entry_end = entry
+                config = [entry_type]
+                for child_type, child_start, child_end in _iter_boxes(f, entry_start + VISUAL_SAMPLE_ENTRY_SIZE, entry_end):
+                    if child_type in IGNORED_SAMPLE_ENTRY_BOXES:
+                        continue
+                    f.seek(child_start)
+                    config += [child_type, f.read(child_end - child_start)]
+                return b"".join(config)
+    except (OSError, struct.error) as e:
+        print(f"Warning: 读取 {file_path} 的编码参数失败：{e}")
+    return None
+
+
+def read_video_sample_layout(file_path):
+    """
+    读取MP4视频轨道的帧数与关键帧位置，以及文件是否包含音频轨道，不需要启动ffmpeg。
+    关键帧为IDR帧时，其解码顺序与显示顺序的序号相同，可以直接作为按显示顺序的帧序号使用。
+
+    Returns:
+        dict: {"frame_count", "keyframes": 关键帧的帧序号（从0开始）, "has_audio"}，读取失败时返回None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            layout = {"frame_count": None, "keyframes": None, "has_audio": False}
+            for handler_type, trak_start, trak_end in _iter_tracks(f):
+                if handler_type == b"soun":
+                    layout["has_audio"] = True
+                if handler_type != b"vide" or layout["frame_count"] is not None:
+                    continue
+                stsz = _find_box(f, trak_start, trak_end, SAMPLE_SIZE_PATH)
+                if stsz is None:
+                    return None
+                # stsz内容：版本与标志(4) + 统一的帧大小(4) + 帧数(4)
+                f.seek(stsz[0] + 8)
+                layout["frame_count"] = struct.unpack(">I", f.read(4))[0]
+                stss = _find_box(f, trak_start, trak_end, SYNC_SAMPLE_PATH)
+                if stss is None:
+                    # 没有关键帧表时每一帧都是关键帧
+                    layout["keyframes"] = list(range(layout["frame_count"]))
+                else:
+                    # stss内容：版本与标志(4) + 条目数(4) + 从1开始的帧序号
+                    f.seek(stss[0] + 4)
+                    count = struct.unpack(">I", f.read(4))[0]
+                    layout["keyframes"] = [n - 1 for n in struct.unpack(f">{count}I", f.read(4 * count))]
+            return layout if layout["frame_count"] is not None else None
+    except (OSError, struct.error) as e:
+        print(f"Warning: 读取 {file_path} 的关键帧信息失败：{e}")
+    return None
+
+
+def _concat_list(files):
+    """concat demuxer的文件列表，使用file协议的绝对路径，列表通过标准输入传入而不写临时文件"""
+    lines = []
+    for file_path in files:
+        path = os.path.abspath(file_path).replace('\\', '/').replace("'", "'\\''")
+        lines.append(f"file 'file:{path}'")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _run_concat(files, output_file):
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+           '-f', 'concat', '-safe', '0', '-protocol_whitelist', 'file,pipe', '-i', 'pipe:0',
+           '-map', '0', '-c', 'copy', '-movflags', '+faststart', output_file]
+    result = subprocess.run(cmd, input=_concat_list(files), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"拼接视频失败：{result.stderr.decode(errors='ignore').strip()}")
+
+
+def _remux_with_inband_parameters(file_path, nut_path):
+    """
+    转封装为NUT，并将H.264的SPS/PPS写入每个关键帧之前（h264_mp4toannexb），
+    拼接后每个片段仍使用自己的参数集解码。NUT保留原始时间戳，不像TS那样引入起始偏移。
+    """
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin', '-i', file_path,
+           '-map', '0', '-c', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'nut', nut_path]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"转封装 {file_path} 失败：{result.stderr.decode(errors='ignore').strip()}")
+
+
+def _default_workers(count):
+    # 转封装与探测主要是读写文件，线程数可以多于CPU核心数
+    return max(1, min(count, 2 * (os.cpu_count() or 1), 16))
+
+
+def concat_videos(files, output_file, workers=None):
+    """
+    以流复制的方式按顺序拼接视频文件，不重新编码。
+
+    先检查所有文件的编码、分辨率、帧率与音频参数是否一致，不一致时无法流复制，抛出ValueError。
+    视频轨道的编码配置（如H.264的SPS/PPS）也一致时，直接用concat demuxer拼接MP4文件；
+    否则将各片段并行转封装为带内参数集的NUT文件（每个片段自带参数集）后再拼接。
+
+    Args:
+        files (list[str]): 按顺序排列的视频文件路径
+        output_file (str): 输出文件路径
+        workers (int): 并行探测与转封装的线程数，None表示自动
+
+    Returns:
+        str: 使用的拼接方式，"mp4" 或 "nut"
+    """
+    if not files:
+        raise ValueError("没有需要拼接的视频文件！")
+    files = [os.path.abspath(file_path) for file_path in files]
+    output_file = os.path.abspath(output_file)
+    workers = workers or _default_workers(len(files))
+
+    # 未缓存的文件需要启动ffmpeg探测，并行进行
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        signatures = list(executor.map(get_concat_signature, files))
+    mismatches = find_stream_mismatches(files, signatures)
+    if mismatches:
+        raise ValueError("视频片段的编码参数不一致，无法直接拼接，请使用相同的设置重新渲染全部片段：\n"
+                         + "\n".join(mismatches))
+
+    codec_configs = [read_video_codec_config(file_path) for file_path in files]
+    if all(config is not None and config == codec_configs[0] for config in codec_configs):
+        _run_concat(files, output_file)
+        return "mp4"
+
+    print("Info: 视频片段的编码配置不完全相同，将先转封装为带内参数集的NUT再拼接")
+    with tempfile.TemporaryDirectory(prefix="concat_nut_", dir=os.path.dirname(output_file)) as work_dir:
+        nut_files = [os.path.join(work_dir, f"{i:04d}.nut") for i in range(len(files))]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_remux_with_inband_parameters, files, nut_files))
+        _run_concat(nut_files, output_file)
+    return "nut"
+
+
+def mux_video_audio(video_file, audio_file, output_file):
+    """以流复制的方式将单独的视频与音频文件合并为一个文件"""
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin', '-i', video_file, '-i', audio_file,
+           '-map', '0:v', '-map', '1:a', '-c', 'copy', '-movflags', '+faststart', output_file]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"合并音视频失败：{result.stderr.decode(errors='ignore').strip()}")
@@ -8,6 +8,7 @@ from PIL import Image
 
 BUCKET_ENDPOINT = "https://nickbit-maigen-images.oss-cn-shanghai.aliyuncs.com"
 FC_PROXY_ENDPOINT = "https://fish-usta-proxy-efexqrwlmf.cn-shanghai.fcapp.run"
+DIVING_FISH_ENDPOINT = "https://www.diving-fish.com/api/maimaidxprober"
 CHART_TYPE_MAP_MAIMAI =  {   
     "SD": 0,
     "DX": 1,
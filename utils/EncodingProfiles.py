@@ -0,0 +1,191 @@
+import os
+import subprocess
+import tempfile
+import time
+
+from moviepy.config import FFMPEG_BINARY
+
+# 所有输出片段与完整视频的帧率，与 CONTENT_VIDEO_FPS 一致
+OUTPUT_FPS = 30
+AUDIO_SAMPLE_RATE = 44100
+# moviepy总是输出双声道音频，ffmpeg后端保持一致，片段之间可以直接拼接
+AUDIO_CHANNELS = 2
+
+# 命名的编码配置：
+#   rate_control: "bitrate" 使用页面上设置的固定码率；"crf" 使用恒定质量，
+#                 max_bitrate为True时以页面上的码率作为峰值码率上限
+#   threads: 编码线程数，None表示由调用方决定（并行渲染时按进程数平均分配）
+#   gop_seconds: 关键帧间隔（秒），None表示使用编码器默认值
+#   audio_bitrate: None表示使用编码器默认值
+# draft 与之前固定的编码参数（ultrafast + 固定码率）完全相同
+ENCODING_PROFILES = {
+    "draft": {
+        "description": "Fastest encode at the configured bitrate (previous default)",
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "tune": None,
+        "rate_control": "bitrate",
+        "crf": None,
+        "max_bitrate": False,
+        "gop_seconds": None,
+        "threads": 4,
+        "audio_codec": "libmp3lame",
+        "audio_bitrate": None,
+    },
+    "standard": {
+        "description": "Constant quality, capped at the configured bitrate; much smaller files",
+        "codec": "libx264",
+        "preset": "veryfast",
+        "tune": None,
+        "rate_control": "crf",
+        "crf": 23,
+        "max_bitrate": True,
+        "gop_seconds": 2,
+        "threads": None,
+        "audio_codec": "libmp3lame",
+        "audio_bitrate": "192k",
+    },
+    "archive": {
+        "description": "High quality for long-term storage; slow, ignores the bitrate setting",
+        "codec": "libx264",
+        "preset": "slow",
+        "tune": "animation",
+        "rate_control": "crf",
+        "crf": 18,
+        "max_bitrate": False,
+        "gop_seconds": 5,
+        "threads": None,
+        "audio_codec": "libmp3lame",
+        "audio_bitrate": "320k",
+    },
+}
+DEFAULT_ENCODING_PROFILE = "draft"
+
+
+def get_encoding_profile(name):
+    """按名称获取编码配置，名称无效时回退到默认配置"""
+    if name not in ENCODING_PROFILES:
+        print(f"Warning: 未知的编码配置 {name}，将使用默认配置 {DEFAULT_ENCODING_PROFILE}")
+        name = DEFAULT_ENCODING_PROFILE
+    return ENCODING_PROFILES[name]
+
+
+def _resolve_threads(profile, threads):
+    # 调用方显式指定的线程数（并行渲染时的分配结果）优先
+    if threads is not None:
+        return threads
+    return profile['threads'] or os.cpu_count() or 1
+
+
+def _rate_control_args(profile, video_bitrate):
+    """除preset与线程数以外的视频编码参数（码率控制、tune、关键帧间隔）"""
+    args = []
+    if profile['rate_control'] == "crf":
+        args += ['-crf', str(profile['crf'])]
+        if profile['max_bitrate'] and video_bitrate:
+            bitrate_k = int(str(video_bitrate).rstrip('kK'))
+            args += ['-maxrate', f"{bitrate_k}k", '-bufsize', f"{bitrate_k * 2}k"]
+    if profile['tune']:
+        args += ['-tune', profile['tune']]
+    if profile['gop_seconds']:
+        args += ['-g', str(int(profile['gop_seconds'] * OUTPUT_FPS))]
+    return args
+
+
+def get_split_keyframes(duration, trans_time):
+    """
+    分段拼接完整视频时片段需要的关键帧（帧序号）：片头转场结束处与片尾转场开始处。
+    片段在这两个关键帧之间的部分可以直接流复制，只有转场部分需要重新编码。
+    """
+    trans_frames = round(trans_time * OUTPUT_FPS)
+    # 片段的实际帧数可能因取整少一帧，片尾的关键帧提前一帧
+    tail = int(duration * OUTPUT_FPS) - trans_frames - 1
+    return [trans_frames] + ([tail] if tail > trans_frames else [])
+
+
+def _keyframe_args(keyframes):
+    if not keyframes:
+        return []
+    return ['-force_key_frames', "expr:" + "+".join(f"eq(n,{k})" for k in keyframes)]
+
+
+def get_write_videofile_kwargs(profile_name, video_bitrate, threads=None, keyframes=None):
+    """
+    生成moviepy write_videofile的编码参数。
+
+    Args:
+        video_bitrate (str): 页面上设置的码率，如 "5000k"
+        threads (int): 编码线程数，None表示使用编码配置中的设置
+        keyframes (list[int]): 需要强制设为关键帧的帧序号，见 get_split_keyframes
+    """
+    profile = get_encoding_profile(profile_name)
+    return {
+        "fps": OUTPUT_FPS,
+        "codec": profile['codec'],
+        "preset": profile['preset'],
+        "bitrate": video_bitrate if profile['rate_control'] == "bitrate" else None,
+        "threads": _resolve_threads(profile, threads),
+        "ffmpeg_params": _rate_control_args(profile, video_bitrate) + _keyframe_args(keyframes),
+        "audio_codec": profile['audio_codec'],
+        "audio_bitrate": profile['audio_bitrate'],
+        "audio_fps": AUDIO_SAMPLE_RATE,
+    }
+
+
+def get_ffmpeg_video_args(profile_name, video_bitrate, threads=None, keyframes=None):
+    """生成ffmpeg命令行的视频编码参数，与 get_write_videofile_kwargs 对应"""
+    profile = get_encoding_profile(profile_name)
+    args = ['-c:v', profile['codec'], '-preset', profile['preset']]
+    if profile['rate_control'] == "bitrate":
+        args += ['-b:v', str(video_bitrate)]
+    args += _rate_control_args(profile, video_bitrate) + _keyframe_args(keyframes)
+    args += ['-pix_fmt', 'yuv420p', '-r', str(OUTPUT_FPS), '-threads', str(_resolve_threads(profile, threads))]
+    return args
+
+
+def get_ffmpeg_audio_args(profile_name):
+    profile = get_encoding_profile(profile_name)
+    args = ['-c:a', profile['audio_codec'], '-ar', str(AUDIO_SAMPLE_RATE), '-ac', str(AUDIO_CHANNELS)]
+    if profile['audio_bitrate']:
+        args += ['-b:a', profile['audio_bitrate']]
+    return args
+
+
+def benchmark_encoding_profiles(resolution=(1920, 1080), duration=10, video_bitrate="5000k", profiles=None):
+    """
+    在本机上用合成的测试片段依次以各编码配置编码，测量编码速度与输出文件大小。
+    测试片段模仿谱面确认片段的画面构成：静止的全屏背景上，在谱面视频的位置叠加高度为画面一半的运动画面，
+    并带有正弦波音频。测试片段先以无损方式生成，计时只包含编码过程。
+
+    Returns:
+        list[dict]: 每个配置的 {"profile", "seconds", "fps", "size_mb", "bitrate_kbps"}
+    """
+    width, height = resolution
+    frames = int(duration * OUTPUT_FPS)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="encoding_benchmark_") as work_dir:
+        source_file = os.path.join(work_dir, "source.mkv")
+        chart_size = height // 2
+        subprocess.run([FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+                        '-f', 'lavfi', '-i', f"smptehdbars=s={width}x{height}:r={OUTPUT_FPS}:d={duration}",
+                        '-f', 'lavfi', '-i', f"testsrc2=s={chart_size}x{chart_size}:r={OUTPUT_FPS}:d={duration}",
+                        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate={AUDIO_SAMPLE_RATE}:d={duration}",
+                        '-filter_complex', f"[0:v][1:v]overlay=x={int(0.092 * width)}:y={int(0.328 * height)}[v]",
+                        '-map', '[v]', '-map', '2:a', '-c:v', 'ffv1', '-c:a', 'pcm_s16le', source_file], check=True)
+        for name in profiles or ENCODING_PROFILES:
+            output_file = os.path.join(work_dir, f"{name}.mp4")
+            cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin', '-i', source_file]
+            cmd += get_ffmpeg_video_args(name, video_bitrate) + get_ffmpeg_audio_args(name) + [output_file]
+            start = time.perf_counter()
+            subprocess.run(cmd, check=True)
+            seconds = time.perf_counter() - start
+            size = os.path.getsize(output_file)
+            results.append({
+                "profile": name,
+                "seconds": round(seconds, 2),
+                "fps": round(frames / seconds, 1),
+                "size_mb": round(size / 1024 / 1024, 2),
+                "bitrate_kbps": round(size * 8 / 1000 / duration),
+            })
+            print(f"Info: 编码配置 {name}: {frames / seconds:.1f} fps, {size / 1024 / 1024:.2f} MB")
+    return results
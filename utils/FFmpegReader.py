@@ -0,0 +1,192 @@
+import subprocess
+
+import numpy as np
+from moviepy import AudioFileClip, VideoClip
+from moviepy.config import FFMPEG_BINARY
+
+# 向后跳转，或向前跳过超过该秒数的画面时，重新启动ffmpeg并直接定位，而不是逐帧读取丢弃
+SEEK_RESTART_SECONDS = 2.0
+
+
+def build_filter_chain(scale=None, crop=None, fps=None):
+    """
+    组合ffmpeg的视频滤镜：先缩放，再裁剪，最后转换帧率。
+
+    Args:
+        scale (tuple): 缩放后的 (宽, 高)
+        crop (tuple): 在缩放后的画面上裁剪的 (x, y, 宽, 高)
+        fps (float): 输出帧率
+    """
+    filters = []
+    if scale:
+        filters.append(f"scale={int(scale[0])}:{int(scale[1])}:flags=lanczos")
+    if crop:
+        x, y, w, h = (int(v) for v in crop)
+        filters.append(f"crop={w}:{h}:{x}:{y}")
+    if fps:
+        filters.append(f"fps={fps}")
+    return ",".join(filters)
+
+
+def get_output_size(source_size, scale=None, crop=None):
+    if crop:
+        return int(crop[2]), int(crop[3])
+    if scale:
+        return int(scale[0]), int(scale[1])
+    return int(source_size[0]), int(source_size[1])
+
+
+def read_frame_at(file_path, t, size):
+    """用ffmpeg解码t时刻的单帧并缩放到size (宽, 高)，返回RGB的numpy数组"""
+    w, h = int(size[0]), int(size[1])
+    cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-ss', f"{t:.3f}", '-i', str(file_path),
+           '-frames:v', '1', '-vf', build_filter_chain(scale=(w, h)),
+           '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or len(result.stdout) < w * h * 3:
+        raise IOError(f"无法读取视频 {file_path} 在 {t:.3f}s 处的画面：{result.stderr.decode(errors='ignore').strip()}")
+    return np.frombuffer(result.stdout[:w * h * 3], dtype=np.uint8).reshape(h, w, 3)
+
+
+def read_frames_at(file_path, times, size, accurate=True):
+    """
+    用一个ffmpeg进程解码多个时刻的单帧并缩放到size (宽, 高)。
+    每个时刻作为一个单独定位的输入，只解码定位点附近的画面，不会顺序解码整段视频。
+
+    Args:
+        accurate (bool): 为False时只解码关键帧，取各时刻之前最近的关键帧，
+                         无需解码关键帧之后的画面，适用于只需要大致均匀采样的分析
+
+    Returns:
+        list[numpy.ndarray]: 与times一一对应的RGB画面
+    """
+    w, h = int(size[0]), int(size[1])
+    cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-nostdin']
+    for t in times:
+        if not accurate:
+            cmd += ['-skip_frame', 'nokey', '-noaccurate_seek']
+        cmd += ['-ss', f"{t:.3f}", '-i', str(file_path)]
+    scale = build_filter_chain(scale=(w, h))
+    filters = [f"[{i}:v]trim=end_frame=1,{scale},setpts=N/TB[f{i}]" for i in range(len(times))]
+    filters.append("".join(f"[f{i}]" for i in range(len(times))) + f"concat=n={len(times)}:v=1:a=0[out]")
+    cmd += ['-filter_complex', ";".join(filters), '-map', '[out]', '-fps_mode', 'passthrough',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    nbytes = w * h * 3
+    if result.returncode != 0 or len(result.stdout) < nbytes * len(times):
+        raise IOError(f"无法读取视频 {file_path} 的采样画面：{result.stderr.decode(errors='ignore').strip()}")
+    return [np.frombuffer(result.stdout[i * nbytes:(i + 1) * nbytes], dtype=np.uint8).reshape(h, w, 3)
+            for i in range(len(times))]
+
+
+class FFmpegFilteredReader:
+    """
+    顺序读取经过ffmpeg滤镜（缩放、裁剪、帧率转换）处理后的视频帧。
+
+    缩放与裁剪在ffmpeg解码进程中完成，传入Python的只有最终尺寸的画面；
+    按时间顺序读取时只需从管道中依次取帧，向后跳转或大幅向前跳转时重新定位。
+    """
+    def __init__(self, file_path, size, fps, start=0, duration=None, filter_chain=""):
+        self.file_path = str(file_path)
+        self.size = size
+        self.fps = fps
+        self.start = start
+        self.duration = duration
+        self.filter_chain = filter_chain
+        self.proc = None
+        # pos 为下一次从管道读出的帧序号（相对于start）
+        self.pos = 0
+        self.last_frame = None
+        self.last_pos = -1
+
+    def get_frame_number(self, t):
+        # 与moviepy的读取器一致，避免 3.0 被表示为 2.9999 时取到前一帧
+        return int(self.fps * t + 0.00001)
+
+    def _open(self, frame_number):
+        self.close()
+        seek = self.start + frame_number / self.fps
+        cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-nostdin']
+        if seek > 0:
+            cmd += ['-ss', f"{seek:.6f}"]
+        cmd += ['-i', self.file_path]
+        if self.duration is not None:
+            cmd += ['-t', f"{max(self.duration - frame_number / self.fps, 0):.6f}"]
+        if self.filter_chain:
+            cmd += ['-vf', self.filter_chain]
+        cmd += ['-an', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     bufsize=self.size[0] * self.size[1] * 3 * 4)
+        self.pos = frame_number
+
+    def _read_next(self):
+        w, h = self.size
+        nbytes = w * h * 3
+        data = self.proc.stdout.read(nbytes)
+        if len(data) != nbytes:
+            # 已读到片段末尾（时长取整误差），与moviepy一致地返回最后一帧
+            if self.last_frame is None:
+                raise IOError(f"无法从视频 {self.file_path} 读取画面，请检查文件是否完整。")
+            return self.last_frame
+        self.pos += 1
+        return np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+
+    def get_frame(self, t):
+        frame_number = self.get_frame_number(t)
+        if frame_number == self.last_pos and self.last_frame is not None:
+            return self.last_frame
+        if self.proc is None or frame_number < self.pos \
+                or frame_number - self.pos > SEEK_RESTART_SECONDS * self.fps:
+            self._open(frame_number)
+        while self.pos < frame_number:
+            self._read_next()
+        self.last_frame = self._read_next()
+        self.last_pos = frame_number
+        return self.last_frame
+
+    def close(self):
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.terminate()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+
+    def __del__(self):
+        self.close()
+
+
+class FilteredVideoClip(VideoClip):
+    """
+    由 FFmpegFilteredReader 提供画面的视频片段，可替代
+    VideoFileClip(...).subclipped(start, end).with_effects([Resize]).cropped(...)，
+    但缩放、裁剪与帧率转换都在ffmpeg中完成。
+
+    Args:
+        file_path (str): 视频文件路径
+        start (float): 片段在源视频中的开始时间
+        end (float): 片段在源视频中的结束时间
+        source_size (tuple): 源视频的 (宽, 高)
+        scale (tuple): 缩放后的 (宽, 高)，None表示不缩放
+        crop (tuple): 缩放后裁剪的 (x, y, 宽, 高)，None表示不裁剪
+        fps (float): 输出帧率
+        audio (bool): 是否附带源视频中同一时间段的音频
+    """
+    def __init__(self, file_path, start, end, source_size, scale=None, crop=None, fps=30, audio=True):
+        self.reader = FFmpegFilteredReader(file_path,
+                                           size=get_output_size(source_size, scale, crop),
+                                           fps=fps, start=start, duration=end - start,
+                                           filter_chain=build_filter_chain(scale, crop, fps))
+        super().__init__(frame_function=lambda t: self.reader.get_frame(t), duration=end - start)
+        self.fps = fps
+        if audio:
+            self.audio = AudioFileClip(file_path).subclipped(start, end)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        if self.audio is not None:
+            self.audio.close()
+            self.audio = None
+        super().close()
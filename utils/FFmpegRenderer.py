@@ -0,0 +1,191 @@
+import os
+import subprocess
+import tempfile
+import time
+
+from PIL import Image
+from moviepy.config import FFMPEG_BINARY
+
+from utils.AudioUtils import get_source_gain
+from utils.EncodingProfiles import (DEFAULT_ENCODING_PROFILE, get_ffmpeg_audio_args, get_ffmpeg_video_args,
+                                    get_write_videofile_kwargs)
+from utils.FFmpegReader import build_filter_chain, get_output_size
+from utils.VideoUtils import (CONTENT_VIDEO_FPS, build_content_static_layers, build_info_overlay,
+                              create_video_segment, get_chart_video_layout, get_clip_audio_source,
+                              get_video_rect, normalize_audio_volume)
+
+# 编码参数与moviepy后端使用同一个编码配置，两种后端输出的片段可以直接拼接
+def _video_output_args(video_bitrate, duration, threads=None, encoding_profile=DEFAULT_ENCODING_PROFILE,
+                       keyframes=None):
+    return get_ffmpeg_video_args(encoding_profile, video_bitrate, threads, keyframes) + ['-t', f"{duration:.6f}"]
+
+
+def _fade_filters(duration, fade_time, audio=False):
+    """与 vfx.FadeIn/FadeOut、afx.AudioFadeIn/AudioFadeOut 对应的淡入淡出滤镜"""
+    if not fade_time:
+        return []
+    name = "afade" if audio else "fade"
+    return [f"{name}=t=in:st=0:d={fade_time}",
+            f"{name}=t=out:st={max(duration - fade_time, 0):.6f}:d={fade_time}"]
+
+
+def _audio_chain(input_label, gain, duration, fade_time):
+    filters = []
+    if gain is not None:
+        filters.append(f"volume={gain:.6f}")
+    filters += _fade_filters(duration, fade_time, audio=True)
+    return f"{input_label}{','.join(filters) or 'anull'}[aout]"
+
+
+def _looped_image(input_label, duration, output_label, to_yuv=False):
+    """静态图片只解码一次，用loop滤镜重复为指定时长的视频流"""
+    prefix = "format=yuv420p," if to_yuv else ""
+    return (f"{input_label}{prefix}loop=loop=-1:size=1,fps={CONTENT_VIDEO_FPS},"
+            f"trim=duration={duration:.6f}{output_label}")
+
+
+def build_content_command(clip_config, style_config, resolution, output_file, work_dir,
+                          video_bitrate, fade_time=None, threads=None, encoding_profile=DEFAULT_ENCODING_PROFILE,
+                          keyframes=None):
+    """
+    将谱面确认片段编译为一条ffmpeg命令：静态图层预先合成为PNG，
+    谱面视频的缩放裁剪、各图层叠加、淡入淡出与音量均衡都在一个filter_complex中完成。
+
+    与 create_flattened_clip 相同，视频区域以外的画面预先合成为一张图片，
+    只有谱面视频所在的矩形区域需要逐帧按RGB进行透明度混合。
+    """
+    duration = clip_config['duration']
+    bottom_image, overlay_image = build_content_static_layers(clip_config, style_config, resolution)
+    static_file = os.path.join(work_dir, "static.png")
+    Image.alpha_composite(bottom_image.convert("RGBA"), overlay_image).convert("RGB").save(static_file)
+
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin', '-i', static_file]
+    filters = [_looped_image("[0:v]", duration, "[static]", to_yuv=True)]
+    video_label = "[static]"
+    audio_filter = None
+
+    layout = get_chart_video_layout(clip_config, resolution)
+    rect = None
+    if layout is not None:
+        video_size = get_output_size(layout['source_size'], layout['scale'], layout['crop'])
+        rect = get_video_rect(layout['position'], video_size, bottom_image.size)
+    if rect is not None:
+        x1, y1, x2, y2 = rect
+        bottom_file = os.path.join(work_dir, "bottom_rect.png")
+        overlay_file = os.path.join(work_dir, "overlay_rect.png")
+        bottom_image.crop(rect).convert("RGB").save(bottom_file)
+        overlay_image.crop(rect).save(overlay_file)
+        cmd += ['-i', bottom_file, '-i', overlay_file,
+                '-ss', f"{layout['start']:.6f}", '-t', f"{layout['end'] - layout['start']:.6f}",
+                '-i', layout['path']]
+        chart_chain = build_filter_chain(layout['scale'], layout['crop'], CONTENT_VIDEO_FPS)
+        chart_x, chart_y = int(layout['position'][0]) - x1, int(layout['position'][1]) - y1
+        filters += [
+            _looped_image("[1:v]", duration, "[region_bottom]"),
+            f"[3:v]{chart_chain},setpts=PTS-STARTPTS[chart]",
+            # 谱面视频比片段短时，视频结束后该区域显示底图（与逐帧合成的行为一致）
+            f"[region_bottom][chart]overlay=x={chart_x}:y={chart_y}:eof_action=pass:format=rgb[region_video]",
+            "[region_video][2:v]overlay=0:0:format=rgb[region]",
+            f"[static][region]overlay=x={x1}:y={y1}[composed]",
+        ]
+        video_label = "[composed]"
+        if layout['has_audio']:
+            gain = get_source_gain(layout['path'], layout['start'], layout['end'])
+            audio_filter = _audio_chain("[3:a]", gain, duration, fade_time)
+    video_tail = ",".join(["format=yuv420p"] + _fade_filters(duration, fade_time))
+    filters.append(f"{video_label}{video_tail}[vout]")
+    if audio_filter:
+        filters.append(audio_filter)
+
+    cmd += ['-filter_complex', ";".join(filters), '-map', '[vout]']
+    cmd += ['-map', '[aout]'] + get_ffmpeg_audio_args(encoding_profile) if audio_filter else ['-an']
+    cmd += _video_output_args(video_bitrate, duration, threads, encoding_profile, keyframes) + [output_file]
+    return cmd
+
+
+def build_info_command(clip_config, style_config, resolution, output_file, work_dir,
+                       video_bitrate, fade_time=None, threads=None, encoding_profile=DEFAULT_ENCODING_PROFILE,
+                       keyframes=None):
+    """将开场/结尾片段编译为一条ffmpeg命令：循环背景视频、压暗、叠加预先合成的文字图层并循环bgm"""
+    duration = clip_config['duration']
+    overlay_file = os.path.join(work_dir, "overlay.png")
+    build_info_overlay(clip_config, style_config, resolution).save(overlay_file)
+
+    intro_video_bg_path = style_config['asset_paths']['intro_video_bg']
+    intro_bgm_path = style_config['asset_paths']['intro_bgm']
+    gain = get_source_gain(intro_bgm_path, 0, duration, loop=True)
+
+    width, height = resolution
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+           '-f', 'lavfi', '-i', f"color=c=black:s={width}x{height}:r={CONTENT_VIDEO_FPS}:d={duration:.6f}",
+           '-stream_loop', '-1', '-i', intro_video_bg_path,
+           '-i', overlay_file,
+           '-stream_loop', '-1', '-i', intro_bgm_path]
+    video_tail = ",".join(["format=yuv420p"] + _fade_filters(duration, fade_time))
+    filters = [
+        # 与 vfx.MultiplyColor(0.75) 和 vfx.Resize(width=resolution[0]) 对应
+        f"[1:v]scale={width}:-1:flags=lanczos,colorchannelmixer=rr=0.75:gg=0.75:bb=0.75,"
+        f"fps={CONTENT_VIDEO_FPS}[bgv]",
+        "[0:v][bgv]overlay=0:0:shortest=1:format=rgb[base]",
+        # color源带有1:1的像素宽高比标记，去掉后编码参数与谱面确认片段相同，才能直接拼接
+        f"[base][2:v]overlay=0:0:format=rgb,setsar=0,{video_tail}[vout]",
+        _audio_chain("[3:a]", gain, duration, fade_time),
+    ]
+    cmd += ['-filter_complex', ";".join(filters), '-map', '[vout]', '-map', '[aout]']
+    cmd += get_ffmpeg_audio_args(encoding_profile) + \
+        _video_output_args(video_bitrate, duration, threads, encoding_profile, keyframes) + [output_file]
+    return cmd
+
+
+def render_clip_ffmpeg(clip_config, style_config, resolution, output_file, video_bitrate,
+                       fade_time=None, clip_type="content", threads=None,
+                       encoding_profile=DEFAULT_ENCODING_PROFILE, keyframes=None):
+    """
+    使用ffmpeg的filter_complex渲染单个片段，输出与
+    create_video_segment / create_info_segment + write_videofile 等效的视频文件。
+
+    Args:
+        clip_type (str): "content" 为谱面确认片段，"info" 为开场/结尾片段
+        fade_time (float): 片段首尾的淡入淡出时长，None表示不添加
+        threads (int): 编码线程数，None表示使用编码配置中的设置
+        encoding_profile (str): 编码配置名称，见 ENCODING_PROFILES
+        keyframes (list[int]): 需要强制设为关键帧的帧序号
+    """
+    print(f"正在合成视频片段: {clip_config['id']}")
+    build_command = build_info_command if clip_type == "info" else build_content_command
+    with tempfile.TemporaryDirectory(prefix="ffmpeg_render_") as work_dir:
+        cmd = build_command(clip_config, style_config, resolution, output_file, work_dir,
+                            video_bitrate, fade_time, threads, encoding_profile, keyframes)
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg渲染片段{clip_config['id']}失败：{result.stderr.decode(errors='ignore').strip()}")
+
+
+def benchmark_render_backends(resources, style_config, resolution, output_dir, video_bitrate="5000k", limit=3):
+    """
+    用同一组片段配置分别以moviepy与ffmpeg后端渲染，比较耗时。
+
+    Returns:
+        list[dict]: 每个片段两种后端的渲染耗时（秒）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for clip_config in resources.get('main', [])[:limit]:
+        moviepy_file = os.path.join(output_dir, f"moviepy_{clip_config['id']}.mp4")
+        ffmpeg_file = os.path.join(output_dir, f"ffmpeg_{clip_config['id']}.mp4")
+
+        start = time.perf_counter()
+        clip = normalize_audio_volume(create_video_segment(clip_config, style_config, resolution),
+                                      source=get_clip_audio_source(clip_config, "content", style_config))
+        clip.write_videofile(moviepy_file, logger=None,
+                             **get_write_videofile_kwargs(DEFAULT_ENCODING_PROFILE, video_bitrate))
+        clip.close()
+        moviepy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_clip_ffmpeg(clip_config, style_config, resolution, ffmpeg_file, video_bitrate)
+        ffmpeg_time = time.perf_counter() - start
+
+        results.append({"id": clip_config['id'], "moviepy": round(moviepy_time, 2), "ffmpeg": round(ffmpeg_time, 2)})
+        print(f"Info: {clip_config['id']} moviepy {moviepy_time:.2f}s, ffmpeg {ffmpeg_time:.2f}s")
+    return results
@@ -4,6 +4,7 @@ import traceback
 
 from utils.DataUtils import download_image_data, CHART_TYPE_MAP_MAIMAI
 from utils.PageUtils import load_music_metadata
+from utils.BlobStore import break_link
 from PIL import Image, ImageDraw, ImageFont
 
 class MaiImageGenerater:
@@ -314,7 +315,8 @@ def generate_single_image(style_config, record_detail, output_path, title_text):
         font = ImageFont.truetype(function.font_path, 50)
         draw.text((940, 100), title_text, fill=(255, 255, 255), font=font)
         
-        # 保存图片
+        # 保存图片（先断开与其他存档共享的硬链接）
+        break_link(output_path)
         background.save(output_path)
 
 
@@ -0,0 +1,191 @@
+import json
+import re
+import shutil
+import subprocess
+from statistics import median
+
+from utils.CacheUtils import FileKeyedIndex
+
+MEDIA_PROBE_INDEX_FILE = "./videos/media_probe_index.json"
+# 只扫描开头一段的数据包来估计关键帧间隔，避免读完整个文件
+KEYFRAME_SCAN_SECONDS = 30
+# 探测结果的字段变化时递增，旧版本的缓存条目会被重新探测
+MEDIA_PROBE_VERSION = 3
+# ffmpeg -i 输出中的流描述行，如 "Stream #0:1[0x2](und): Audio: mp3 (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s"
+STREAM_LINE_PATTERN = re.compile(r"^\s*Stream #\d+:\d+.*?: (Video|Audio): (.+)$", re.MULTILINE)
+# 声道布局名称对应的声道数
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "3.0": 3, "quad": 4, "4.0": 4,
+                   "5.0": 5, "5.1": 6, "6.0": 6, "6.1": 7, "7.0": 7, "7.1": 8}
+
+_probe_index = FileKeyedIndex(MEDIA_PROBE_INDEX_FILE)
+
+
+def _parse_frame_rate(rate):
+    """将ffprobe的 "30000/1001" 格式帧率转换为浮点数"""
+    try:
+        num, den = rate.split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def _estimate_keyframe_interval(packets, video_index):
+    keyframe_times = [float(packet["pts_time"]) for packet in packets
+                      if packet.get("stream_index") == video_index
+                      and "K" in packet.get("flags", "") and packet.get("pts_time") not in (None, "N/A")]
+    if len(keyframe_times) < 2:
+        return None
+    keyframe_times.sort()
+    return round(median(b - a for a, b in zip(keyframe_times, keyframe_times[1:])), 3)
+
+
+def _probe_with_ffprobe(file_path):
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-read_intervals', f"%+{KEYFRAME_SCAN_SECONDS}",
+        '-show_entries',
+        'format=duration,bit_rate,format_name'
+        ':stream=index,codec_type,codec_name,profile,width,height,avg_frame_rate,r_frame_rate,pix_fmt,sample_rate,channels'
+        ':packet=stream_index,pts_time,flags',
+        '-of', 'json',
+        str(file_path)
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    data = json.loads(result.stdout)
+
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    fmt = data.get("format", {})
+    fps = _parse_frame_rate(video.get("avg_frame_rate")) or _parse_frame_rate(video.get("r_frame_rate"))
+    return {
+        "duration": float(fmt.get("duration", 0) or 0),
+        "format_name": fmt.get("format_name", ""),
+        "bit_rate": int(fmt.get("bit_rate", 0) or 0),
+        "video_codec": video.get("codec_name", ""),
+        "video_profile": video.get("profile", ""),
+        "width": video.get("width", 0),
+        "height": video.get("height", 0),
+        "fps": round(fps, 3),
+        "pix_fmt": video.get("pix_fmt", ""),
+        "audio_codec": audio.get("codec_name", ""),
+        "sample_rate": int(audio.get("sample_rate", 0) or 0),
+        "channels": audio.get("channels", 0),
+        "keyframe_interval": _estimate_keyframe_interval(data.get("packets", []), video.get("index")),
+    }
+
+
+def _split_stream_details(details):
+    """按不在括号内的逗号切分流描述，如 "yuv420p(tv, bt709, progressive)" 作为一项"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(details):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif char == "," and depth == 0:
+            parts.append(details[start:i].strip())
+            start = i + 1
+    parts.append(details[start:].strip())
+    return parts
+
+
+def _parse_channels(layout):
+    """将 "stereo"、"5.1(side)"、"3 channels" 等声道布局转换为声道数，无法识别时返回None"""
+    match = re.match(r"(\d+) channels", layout)
+    if match:
+        return int(match.group(1))
+    return CHANNEL_LAYOUTS.get(layout.split("(")[0].strip())
+
+
+def _parse_stream_fields(infos_text):
+    """
+    从 ffmpeg -i 的输出中解析moviepy不提供的字段：像素格式、音频编码与声道数。
+    流不存在时为空值（""或0），流存在但无法解析时为None。
+    """
+    fields = {"pix_fmt": "", "audio_codec": "", "channels": 0}
+    seen = set()
+    for stream_type, details in STREAM_LINE_PATTERN.findall(infos_text):
+        if stream_type in seen:
+            continue
+        seen.add(stream_type)
+        parts = _split_stream_details(details)
+        if stream_type == "Video":
+            match = re.match(r"\w+", parts[1]) if len(parts) > 1 else None
+            fields["pix_fmt"] = match.group(0) if match else None
+        else:
+            match = re.match(r"\w+", parts[0])
+            fields["audio_codec"] = match.group(0) if match else None
+            fields["channels"] = _parse_channels(parts[2]) if len(parts) > 2 else None
+    return fields
+
+
+def _probe_with_moviepy(file_path):
+    """未安装ffprobe时，退回到moviepy自带的ffmpeg信息解析（不会打开解码器，没有关键帧间隔）"""
+    from moviepy.config import FFMPEG_BINARY
+    from moviepy.video.io.ffmpeg_reader import FFmpegInfosParser
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-nostdin", "-i", str(file_path)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    infos_text = result.stderr.decode("utf8", errors="ignore")
+    infos = FFmpegInfosParser(infos_text, str(file_path)).parse()
+    width, height = infos.get("video_size", None) or (0, 0)
+    stream_fields = _parse_stream_fields(infos_text)
+    return {
+        "duration": float(infos.get("duration", 0) or 0),
+        "format_name": "",
+        "bit_rate": int(infos.get("bitrate", 0) or 0) * 1000,
+        "video_codec": infos.get("video_codec_name", "") or "",
+        "video_profile": (infos.get("video_profile", "") or "").strip("()"),
+        "width": width,
+        "height": height,
+        "fps": round(float(infos.get("video_fps", 0) or 0), 3),
+        "pix_fmt": stream_fields["pix_fmt"],
+        "audio_codec": stream_fields["audio_codec"],
+        "sample_rate": int(infos.get("audio_fps", 0) or 0),
+        "channels": stream_fields["channels"],
+        "keyframe_interval": None,
+    }
+
+
+def _probe(file_path):
+    info = _probe_with_ffprobe(file_path) if shutil.which("ffprobe") else _probe_with_moviepy(file_path)
+    info["probe_version"] = MEDIA_PROBE_VERSION
+    return info
+
+
+def get_media_info(file_path, refresh=False):
+    """
+    获取媒体文件的时长、编码、分辨率、帧率与关键帧间隔等信息。
+
+    结果按 路径+大小+修改时间 缓存在 MEDIA_PROBE_INDEX_FILE 中，每个文件只需探测一次，
+    编辑页面、转码与渲染共用同一份索引。
+
+    Returns:
+        dict: 媒体信息，文件不存在或探测失败时返回None
+    """
+    try:
+        if not refresh:
+            info = _probe_index.get(file_path)
+            if info is not None and info.get("probe_version") == MEDIA_PROBE_VERSION:
+                return info
+        info = _probe(file_path)
+        _probe_index.set(file_path, info)
+        return info
+    except Exception as e:
+        print(f"获取媒体信息失败 {file_path}: {e}")
+        return None
+
+
+def get_media_duration(file_path):
+    """返回媒体时长（秒），失败时返回-1"""
+    info = get_media_info(file_path)
+    if not info or info["duration"] <= 0:
+        return -1
+    return info["duration"]
+
+
+def prune_media_index():
+    return _probe_index.prune()
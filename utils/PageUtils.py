@@ -7,10 +7,15 @@ import requests
 import yaml
 import subprocess
 import platform
-from moviepy import VideoFileClip
+import threading
+from copy import deepcopy
 from utils.DataUtils import download_metadata, encode_song_id, CHART_TYPE_MAP_MAIMAI
+from utils.StorageUtils import dump_json, load_json, resolve_json_path
+from utils.record_store import RecordStore, replay_journal, discard_journal, get_journal_path
+from utils.MediaProbe import get_media_duration
 
 DEFAULT_STYLE_CONFIG_FILE_PATH = "./static/video_style_config.json"
+GLOBAL_CONFIG_FILE_PATH = "global_config.yaml"
 DATA_CONFIG_VERSION = "0.5"
 LEVEL_LABELS = {
     0: "BASIC",
@@ -83,24 +88,92 @@ def try_update_config_json(content, username=""):
         raise ValueError("无法匹配存档版本，请检查存档文件")
 
 
+################################################
+# Parsed config cache
+################################################
+# streamlit每次交互都会重新运行页面脚本，这里按路径缓存解析结果，
+# 只有文件的mtime或大小变化时才重新读取和解析。
+# 读取函数返回的是缓存中的同一个对象，调用方只能读取；需要修改的调用方自行deepcopy后再修改
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def _load_cached(path, loader):
+    """
+    读取并缓存配置文件，返回缓存的解析结果（只读，修改前需先复制）。
+    path不存在时返回None；对于存档JSON文件，会同时识别已归档的版本。
+    """
+    real_path = resolve_json_path(path)
+    if real_path is None:
+        return None
+    signature = _file_signature(real_path)
+    with _config_cache_lock:
+        cached = _config_cache.get(path, None)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    data = loader(real_path)
+    with _config_cache_lock:
+        _config_cache[path] = (signature, data)
+    return data
+
+
+def _update_cache(path, data):
+    """写入文件后直接更新缓存，下次读取无需重新解析（调用方之后还会继续修改data，因此缓存其副本）"""
+    real_path = resolve_json_path(path)
+    if real_path is None:
+        return
+    with _config_cache_lock:
+        _config_cache[path] = (_file_signature(real_path), deepcopy(data))
+
+
+def invalidate_config_cache(path=None):
+    """
+    丢弃缓存的解析结果：path为文件时丢弃该文件，为目录时丢弃目录中的所有文件，None时全部丢弃。
+    在不经过本模块直接写入或删除配置文件后调用。
+    """
+    with _config_cache_lock:
+        if path is None:
+            _config_cache.clear()
+            return
+        target = os.path.normcase(os.path.abspath(path))
+        for key in list(_config_cache):
+            cached_path = os.path.normcase(os.path.abspath(key))
+            if cached_path == target or cached_path.startswith(os.path.join(target, "")):
+                del _config_cache[key]
+
+
+def _load_yaml(path):
+    with open(path, "r", encoding='utf-8') as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
+
+
+def _load_plain_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
 def load_full_config_safe(config_file, username):
     # 尝试读取存档文件，如果不存在则返回None
-    if os.path.exists(config_file):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
-    else:
+    content = _load_cached(config_file, load_json)
+    if content is None:
         raise FileNotFoundError(f"存档文件不存在：{config_file}")
     # 检查版本号是否存在或过期
     if "version" not in content or content["version"] != DATA_CONFIG_VERSION:
         print(f"存档版本号不匹配，当前最新版本：{DATA_CONFIG_VERSION}，文件版本：{content.get('version', 'None') if type(content) == dict else 'None'}")
-        # 尝试修复存档
-        content = try_update_config_json(content, username)
+        # 尝试修复存档（缓存的内容只读，在副本上修改）
+        content = try_update_config_json(deepcopy(content), username)
         # 保存更新后的存档
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False, indent=4)
-        return content
-    else:
-        return content
+        dump_json(config_file, content)
+        _update_cache(config_file, content)
+    # 应用上次中断时尚未合并的记录更新（只在副本上应用，缓存保持与文件一致）
+    if os.path.exists(get_journal_path(config_file)):
+        content = replay_journal(config_file, deepcopy(content))
+    return content
 
 
 def update_music_metadata():
@@ -136,60 +209,56 @@ def load_record_config(config_file, username=""):
 
 
 def save_record_config(config_file, config_data):
-    if os.path.exists(config_file):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
-            content["records"] = config_data
+    content = _load_cached(config_file, load_json)
+    if content is not None:
+        # 只替换顶层的records字段，浅复制即可不影响缓存的内容
+        content = dict(content)
+        content["records"] = config_data
     else:
         content = {"records": config_data}
-    
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(content, f, ensure_ascii=False, indent=4)
+    dump_json(config_file, content)
+    _update_cache(config_file, content)
+    # 完整写入后，日志中的旧更新已经过时
+    discard_journal(config_file)
+
+
+def open_record_store(config_file, username=""):
+    """打开存档的记录日志，用于逐条保存记录的频繁更新（如视频搜索）"""
+    return RecordStore(config_file, deepcopy(load_full_config_safe(config_file, username)))
 
 # r/w video_configs.json
 def load_video_config(config_file):
-    if os.path.exists(config_file):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return _load_cached(config_file, load_json)
 
 
 def save_video_config(config_file, config_data):
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config_data, f, ensure_ascii=False, indent=4)
+    dump_json(config_file, config_data)
+    _update_cache(config_file, config_data)
 
 # r/w video_style_config.json
 def load_style_config(config_file=DEFAULT_STYLE_CONFIG_FILE_PATH):
-    if os.path.exists(config_file):
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return _load_cached(config_file, _load_plain_json)
 
 # r/w gloabl_config.yaml
 def read_global_config():
-    if os.path.exists("global_config.yaml"):
-        with open("global_config.yaml", "r", encoding='utf-8') as f:
-            return yaml.load(f, Loader=yaml.FullLoader)
-    else:
+    config = _load_cached(GLOBAL_CONFIG_FILE_PATH, _load_yaml)
+    if config is None:
         raise FileNotFoundError("global_config.yaml not found")
+    return config
 
 
 def write_global_config(config):
     try:
-        with open("global_config.yaml", "w", encoding='utf-8') as f:
+        with open(GLOBAL_CONFIG_FILE_PATH, "w", encoding='utf-8') as f:
             yaml.dump(config, f)
+        _update_cache(GLOBAL_CONFIG_FILE_PATH, config)
     except Exception as e:
         print(f"Error writing global config: {e}")
 
 
 def get_video_duration(video_path):
-    """Returns the duration of a video file in seconds"""
-    try:
-        with VideoFileClip(video_path) as clip:
-            return clip.duration
-    except Exception as e:
-        print(f"Error getting video duration: {e}")
-        return -1
+    """Returns the duration of a video file in seconds, or -1 on failure (cached in the media probe index)"""
+    return get_media_duration(video_path)
 
 
 def open_file_explorer(path):
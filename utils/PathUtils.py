@@ -26,7 +26,16 @@ def get_data_paths(username, timestamp=None):
     }
 
 def get_user_versions(username):
-    """Get all available versions for a user"""
+    """Get all available versions for a user (read from the save catalog, falls back to a directory scan)"""
+    # SaveCatalog 依赖本模块，因此在函数内导入
+    from utils.SaveCatalog import list_user_versions
+    versions = list_user_versions(username)
+    if versions is None:
+        return scan_user_versions(username)
+    return versions
+
+def scan_user_versions(username):
+    """List all versions for a user by scanning the save directory"""
     base_dir = get_user_base_dir(username)
     if not os.path.exists(base_dir):
         return []
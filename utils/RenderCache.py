@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+from utils.CacheUtils import FileKeyedIndex, file_signature
+from utils.EncodingProfiles import DEFAULT_ENCODING_PROFILE, get_encoding_profile, get_split_keyframes
+
+# 渲染缓存索引：记录每个已渲染片段的配置指纹，保存在存档目录中（与videos输出目录并列）
+RENDER_CACHE_FILE_NAME = "render_cache.json"
+# 渲染逻辑变化导致旧片段不再等价时递增，使所有缓存失效
+RENDER_CACHE_VERSION = 5
+
+# 各类片段的渲染结果依赖的样式配置字段
+STYLE_FIELDS = {
+    "content": {
+        "asset_paths": ["content_bg", "comment_font"],
+        "text_style": "content_text_style",
+        "options": ["override_content_default_bg"],
+    },
+    "info": {
+        "asset_paths": ["intro_video_bg", "intro_text_bg", "intro_bgm", "comment_font"],
+        "text_style": "intro_text_style",
+        "options": [],
+    },
+}
+# 片段配置中指向输入文件的字段
+CLIP_FILE_FIELDS = ["video", "main_image"]
+# 不影响渲染画面的片段配置字段：id只决定输出文件名，输入文件的路径因存档而异，以文件签名代替
+CLIP_IGNORED_FIELDS = ["id"] + CLIP_FILE_FIELDS
+
+
+def get_render_cache_file(video_output_path):
+    return os.path.join(os.path.dirname(os.path.abspath(video_output_path)), RENDER_CACHE_FILE_NAME)
+
+
+def _input_file_signature(path):
+    """
+    输入文件以 (大小, 修改时间) 参与指纹计算，不含路径，文件不存在时记为None。
+    增量存档硬链接的成绩图与片段签名不变，在新旧存档中得到相同的指纹。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    return file_signature(path)
+
+
+def compute_clip_fingerprint(clip_config, clip_type, style_config, video_res, video_bitrate,
+                             auto_add_transition, trans_time, backend, encoding_profile=DEFAULT_ENCODING_PROFILE,
+                             split_keyframes=False):
+    """
+    计算片段渲染结果的指纹：片段配置、相关的样式字段、分辨率、码率、编码配置的各项参数、转场设置、
+    渲染后端、强制关键帧以及所有输入文件的大小与修改时间，任一变化都会得到不同的指纹。
+    指纹与片段id及输入文件所在的路径无关，可以在存档之间沿用。
+    """
+    fields = STYLE_FIELDS[clip_type]
+    asset_paths = style_config.get('asset_paths', {})
+    style = {
+        "asset_paths": {key: asset_paths.get(key) for key in fields["asset_paths"]},
+        "text_style": style_config.get(fields["text_style"], {}),
+        "options": {key: style_config.get('options', {}).get(key) for key in fields["options"]},
+    }
+    clip = {key: value for key, value in clip_config.items() if key not in CLIP_IGNORED_FIELDS}
+    inputs = {key: _input_file_signature(clip_config.get(key)) for key in CLIP_FILE_FIELDS}
+    inputs.update({key: _input_file_signature(asset_paths.get(key)) for key in fields["asset_paths"]})
+    payload = {
+        "version": RENDER_CACHE_VERSION,
+        "clip_type": clip_type,
+        "clip": clip,
+        "style": style,
+        "inputs": inputs,
+        "resolution": list(video_res),
+        "bitrate": str(video_bitrate),
+        "transition": trans_time if auto_add_transition else None,
+        "backend": backend,
+        "encoding": get_encoding_profile(encoding_profile),
+        "keyframes": get_split_keyframes(clip_config['duration'], trans_time) if split_keyframes else None,
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    以输出文件为键保存渲染指纹。输出文件被替换或修改后，FileKeyedIndex 的签名校验会使条目自动失效。
+    只应在主进程中读写，并行渲染的子进程不直接访问索引。
+    """
+    def __init__(self, video_output_path):
+        self.index = FileKeyedIndex(get_render_cache_file(video_output_path))
+
+    def is_fresh(self, output_file, fingerprint):
+        """输出文件存在且由相同指纹的配置渲染而成"""
+        entry = self.index.get(output_file)
+        return entry is not None and entry.get("fingerprint") == fingerprint
+
+    def get_fingerprint(self, output_file):
+        """输出文件的渲染指纹，文件不存在、未记录或已变化时返回None"""
+        entry = self.index.get(output_file)
+        return entry.get("fingerprint") if entry is not None else None
+
+    def record(self, output_file, fingerprint):
+        self.index.set(output_file, {"fingerprint": fingerprint})
+
+    def prune(self):
+        return self.index.prune()
@@ -0,0 +1,258 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from utils.PathUtils import get_data_paths, get_user_base_dir, get_user_version_dir, scan_user_versions
+from utils.StorageUtils import json_file_exists, load_json
+
+# 存档目录索引：记录每个存档的用户、时间戳、记录数、rating与各步骤的完成情况，
+# 列出与筛选存档时只需一次索引查询，不再遍历 b50_datas 目录
+DATA_ROOT = "b50_datas"
+CATALOG_DB_FILE = os.path.join(DATA_ROOT, "catalog.db")
+CATALOG_SCHEMA_VERSION = 1
+
+SAVE_FIELDS = (
+    "record_count", "rating", "type", "sub_type",
+    "has_data", "has_config_yt", "has_config_bi", "searched_count",
+    "image_count", "has_video_config", "rendered_clip_count", "has_full_video",
+)
+# 渲染片段的文件名为 {序号}_{id}.mp4；完整视频 {username}_FULL_VIDEO.mp4 也输出在同一目录，
+# 用户名为纯数字时同样以数字开头，需要显式排除
+RENDERED_CLIP_PATTERN = re.compile(r"^\d+_(?!(?:.*_)?FULL_VIDEO\.mp4$).+\.mp4$", re.IGNORECASE)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    dir_mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS saves (
+    username TEXT NOT NULL,
+    save_id TEXT NOT NULL,
+    record_count INTEGER DEFAULT 0,
+    rating INTEGER DEFAULT 0,
+    type TEXT DEFAULT '',
+    sub_type TEXT DEFAULT '',
+    has_data INTEGER DEFAULT 0,
+    has_config_yt INTEGER DEFAULT 0,
+    has_config_bi INTEGER DEFAULT 0,
+    searched_count INTEGER DEFAULT 0,
+    image_count INTEGER DEFAULT 0,
+    has_video_config INTEGER DEFAULT 0,
+    rendered_clip_count INTEGER DEFAULT 0,
+    has_full_video INTEGER DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (username, save_id)
+);
+CREATE INDEX IF NOT EXISTS idx_saves_user_save ON saves (username, save_id DESC);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', '{CATALOG_SCHEMA_VERSION}');
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    os.makedirs(DATA_ROOT, exist_ok=True)
+    # 索引文件被删除后需要重新建表
+    db_exists = os.path.exists(CATALOG_DB_FILE)
+    conn = sqlite3.connect(CATALOG_DB_FILE, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready or not db_exists:
+        with _schema_lock:
+            conn.executescript(_SCHEMA)
+            _schema_ready = True
+    return conn
+
+
+################################################
+# Scan save directories
+################################################
+def _count_files(dir_path, pattern=None, ext=None):
+    if not os.path.isdir(dir_path):
+        return 0
+    count = 0
+    for file_name in os.listdir(dir_path):
+        if ext and not file_name.lower().endswith(ext):
+            continue
+        if pattern and not pattern.match(file_name):
+            continue
+        count += 1
+    return count
+
+
+def scan_save(username, save_id):
+    """从存档目录读取存档信息与各步骤完成情况"""
+    paths = get_data_paths(username, save_id)
+    info = {field: 0 for field in SAVE_FIELDS}
+    info["type"] = ""
+    info["sub_type"] = ""
+    if json_file_exists(paths['data_file']):
+        info["has_data"] = 1
+        try:
+            content = load_json(paths['data_file'])
+            if isinstance(content, dict):
+                info["record_count"] = len(content.get("records", []) or [])
+                info["rating"] = content.get("rating", 0) or 0
+                info["type"] = content.get("type", "") or ""
+                info["sub_type"] = content.get("sub_type", "") or ""
+            elif isinstance(content, list):
+                info["record_count"] = len(content)
+        except Exception as e:
+            print(f"Warning: 读取存档 {paths['data_file']} 失败：{e}")
+    info["has_config_yt"] = int(json_file_exists(paths['config_yt']))
+    info["has_config_bi"] = int(json_file_exists(paths['config_bi']))
+    for config_key in ('config_yt', 'config_bi'):
+        if json_file_exists(paths[config_key]):
+            try:
+                records = load_json(paths[config_key]).get("records", []) or []
+                info["searched_count"] = max(info["searched_count"],
+                                             sum(1 for record in records if record.get("video_info_match")))
+            except Exception as e:
+                print(f"Warning: 读取存档 {paths[config_key]} 失败：{e}")
+    info["image_count"] = _count_files(paths['image_dir'], ext=".png")
+    info["has_video_config"] = int(json_file_exists(paths['video_config']))
+    info["rendered_clip_count"] = _count_files(paths['output_video_dir'], pattern=RENDERED_CLIP_PATTERN)
+    output_dir = paths['output_video_dir']
+    info["has_full_video"] = int(os.path.isdir(output_dir) and any(
+        file_name == "final_output.mp4" or file_name.endswith("_FULL_VIDEO.mp4")
+        for file_name in os.listdir(output_dir)))
+    return info
+
+
+def _upsert_save(conn, username, save_id, info):
+    columns = ", ".join(SAVE_FIELDS)
+    placeholders = ", ".join("?" for _ in SAVE_FIELDS)
+    updates = ", ".join(f"{field} = excluded.{field}" for field in SAVE_FIELDS)
+    conn.execute(
+        f"INSERT INTO saves (username, save_id, {columns}, updated_at) VALUES (?, ?, {placeholders}, ?) "
+        f"ON CONFLICT (username, save_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+        (username, save_id, *(info[field] for field in SAVE_FIELDS), time.time()))
+
+
+def _sync_user(conn, username, dir_mtime_ns):
+    """目录有变化时，补充新出现的存档并移除已删除的存档"""
+    on_disk = set(scan_user_versions(username))
+    in_catalog = {row["save_id"] for row in
+                  conn.execute("SELECT save_id FROM saves WHERE username = ?", (username,))}
+    for save_id in on_disk - in_catalog:
+        _upsert_save(conn, username, save_id, scan_save(username, save_id))
+    for save_id in in_catalog - on_disk:
+        conn.execute("DELETE FROM saves WHERE username = ? AND save_id = ?", (username, save_id))
+    conn.execute("INSERT INTO users (username, dir_mtime_ns) VALUES (?, ?) "
+                 "ON CONFLICT (username) DO UPDATE SET dir_mtime_ns = excluded.dir_mtime_ns",
+                 (username, dir_mtime_ns))
+
+
+################################################
+# Public API
+################################################
+def refresh_save(username, save_id):
+    """重新扫描一个存档并在同一事务中更新索引，由创建存档、生成资源与渲染的函数在完成后调用"""
+    try:
+        with closing(_connect()) as conn, conn:
+            if os.path.isdir(get_user_version_dir(username, save_id)):
+                _upsert_save(conn, username, save_id, scan_save(username, save_id))
+            else:
+                conn.execute("DELETE FROM saves WHERE username = ? AND save_id = ?", (username, save_id))
+    except sqlite3.Error as e:
+        print(f"Warning: 更新存档索引失败：{e}")
+
+
+def refresh_save_at(path):
+    """根据存档目录（或其中的文件、子目录）定位存档并更新索引，路径不在 b50_datas 下时忽略"""
+    try:
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(DATA_ROOT))
+    except ValueError:
+        # Windows下位于不同磁盘
+        return
+    parts = relative.split(os.sep)
+    if relative.startswith(os.pardir) or len(parts) < 2:
+        return
+    refresh_save(parts[0], parts[1])
+
+
+def remove_save(username, save_id):
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute("DELETE FROM saves WHERE username = ? AND save_id = ?", (username, save_id))
+    except sqlite3.Error as e:
+        print(f"Warning: 更新存档索引失败：{e}")
+
+
+def list_user_versions(username):
+    """
+    返回用户的全部存档时间戳（降序）。
+    只比较用户目录的修改时间，目录未变化时直接读取索引，否则先与磁盘同步。
+    索引不可用时返回None，由调用方回退到遍历目录。
+    """
+    base_dir = get_user_base_dir(username)
+    if not os.path.exists(base_dir):
+        return []
+    try:
+        dir_mtime_ns = os.stat(base_dir).st_mtime_ns
+        with closing(_connect()) as conn, conn:
+            row = conn.execute("SELECT dir_mtime_ns FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None or row["dir_mtime_ns"] != dir_mtime_ns:
+                _sync_user(conn, username, dir_mtime_ns)
+            return [row["save_id"] for row in conn.execute(
+                "SELECT save_id FROM saves WHERE username = ? ORDER BY save_id DESC", (username,))]
+    except sqlite3.Error as e:
+        print(f"Warning: 读取存档索引失败，将直接遍历存档目录：{e}")
+        return None
+
+
+def query_saves(username=None, sub_type=None, min_records=None, stage=None):
+    """
+    按条件查询存档信息。
+
+    Args:
+        username (str): 用户名，None表示全部用户
+        sub_type (str): 存档类型，如 "best" / "ap"
+        min_records (int): 最少记录数
+        stage (str): 要求已完成的步骤字段，如 "has_video_config"
+
+    Returns:
+        list[dict]: 按用户名、时间戳降序排列的存档信息
+    """
+    conditions, params = [], []
+    if username is not None:
+        list_user_versions(username)
+        conditions.append("username = ?")
+        params.append(username)
+    if sub_type is not None:
+        conditions.append("sub_type = ?")
+        params.append(sub_type)
+    if min_records is not None:
+        conditions.append("record_count >= ?")
+        params.append(min_records)
+    if stage is not None:
+        if stage not in SAVE_FIELDS:
+            raise ValueError(f"不支持的步骤字段 {stage}，可选值：{list(SAVE_FIELDS)}")
+        conditions.append(f"{stage} > 0")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        with closing(_connect()) as conn:
+            rows = conn.execute(f"SELECT * FROM saves {where} ORDER BY username, save_id DESC", params)
+            return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Warning: 读取存档索引失败：{e}")
+        return []
+
+
+def rebuild_catalog():
+    """丢弃现有索引，按 b50_datas 目录重新建立（在一个事务中完成）"""
+    usernames = [name for name in os.listdir(DATA_ROOT)
+                 if not name.startswith(".") and os.path.isdir(os.path.join(DATA_ROOT, name))] \
+        if os.path.isdir(DATA_ROOT) else []
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM saves")
+        conn.execute("DELETE FROM users")
+        for username in usernames:
+            _sync_user(conn, username, os.stat(get_user_base_dir(username)).st_mtime_ns)
+    print(f"Info: 已重建存档索引，共{len(usernames)}个用户。")
+    return len(usernames)
@@ -0,0 +1,347 @@
+import os
+import subprocess
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+from utils.BlobStore import break_link
+from utils.ConcatUtils import concat_videos, mux_video_audio, read_video_sample_layout
+from utils.EncodingProfiles import (AUDIO_SAMPLE_RATE, DEFAULT_ENCODING_PROFILE, OUTPUT_FPS,
+                                    get_ffmpeg_audio_args, get_ffmpeg_video_args)
+from utils.MediaProbe import get_media_info
+from utils.SaveCatalog import refresh_save_at
+from utils.VideoUtils import get_encoder_threads, render_all_video_clips
+
+# 页面上可选的转场名称（与ffmpeg-concat使用的gl-transitions同名）对应的ffmpeg xfade转场，
+# xfade没有完全相同的效果时取观感最接近的一种
+XFADE_TRANSITIONS = {
+    "fade": "fade",
+    "circleOpen": "circleopen",
+    "crossWarp": "smoothleft",
+    "directionalWarp": "smoothup",
+    "directionalWipe": "wipeleft",
+    "crossZoom": "zoomin",
+    "dreamy": "hblur",
+    "squaresWire": "pixelize",
+}
+
+def get_crossfade_weight(progress):
+    """
+    转场进度为progress（0到1）时后一片段在画面中的权重。
+
+    create_full_video 中前一片段带有 CrossFadeOut（不透明度 1-progress），在透明背景上合成；
+    后一片段带有 CrossFadeIn（不透明度 progress）盖在上面，最后去掉alpha通道。
+    alpha合成后颜色为两者按 progress : (1-progress)^2 加权的平均。
+    """
+    remaining = (1 - progress) ** 2
+    return progress / (progress + remaining)
+
+
+def plan_smart_render(layouts, trans_frames):
+    """
+    将完整视频的时间线划分为可以流复制的片段主体与需要重新编码的转场窗口。
+
+    片段i的主体为 [start, end) 帧：start是片头转场结束后的第一个关键帧，end是片尾转场开始前的最后一个关键帧，
+    两者之间的画面与完整视频中完全相同，可以直接流复制。相邻两个主体之间的部分（前一片段的结尾与后一片段的开头）
+    作为一个转场窗口重新编码；片段太短没有主体时，整个片段并入转场窗口。
+
+    Args:
+        layouts (list[dict]): 按顺序排列的各片段的 read_video_sample_layout 结果
+        trans_frames (int): 转场帧数，0表示不添加转场
+
+    Returns:
+        list[tuple]: ("copy", (片段序号, 开始帧, 结束帧)) 或 ("blend", [(片段序号, 开始帧, 结束帧), ...])
+    """
+    pieces = []
+    pending = []
+    last = len(layouts) - 1
+
+    def flush():
+        sources = [source for source in pending if source[2] > source[1]]
+        if sources:
+            pieces.append(("blend", sources))
+
+    for i, layout in enumerate(layouts):
+        frame_count = layout['frame_count']
+        cuts = layout['keyframes'] + [frame_count]
+        head = 0 if i == 0 else trans_frames
+        tail = frame_count if i == last else frame_count - trans_frames
+        start = min((c for c in cuts if c >= head), default=frame_count)
+        end = max((c for c in cuts if c <= tail), default=0)
+        if start < end:
+            pending.append((i, 0, start))
+            flush()
+            pieces.append(("copy", (i, start, end)))
+            pending = [(i, end, frame_count)]
+        else:
+            pending.append((i, 0, frame_count))
+    flush()
+
+    for kind, sources in pieces:
+        if kind != "blend":
+            continue
+        for k, (i, start, end) in enumerate(sources):
+            needed = trans_frames * ((k > 0) + (k < len(sources) - 1))
+            if end - start < needed:
+                raise ValueError(f"第{i + 1}个片段的时长不足两倍转场时长，无法分段渲染，请使用完整合成模式")
+    return pieces
+
+
+def _extract_body(clip_file, start, end, frame_count, output_file):
+    """用segment muxer在关键帧处切分片段，流复制出 [start, end) 帧的视频（不含音频）"""
+    cuts = [c for c in (start, end) if 0 < c < frame_count]
+    pattern = output_file[:-len(".mp4")] + "_%d.mp4"
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin', '-i', clip_file, '-map', '0:v:0', '-c', 'copy']
+    if cuts:
+        cmd += ['-f', 'segment', '-segment_frames', ",".join(str(c) for c in cuts),
+                '-reset_timestamps', '1', '-segment_format', 'mp4', pattern]
+    else:
+        cmd += [output_file]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"切分片段 {clip_file} 失败：{result.stderr.decode(errors='ignore').strip()}")
+    if cuts:
+        os.replace(pattern % (1 if start > 0 else 0), output_file)
+
+
+def _open_frame_reader(clip_file, start, count):
+    """从第start帧开始按顺序解码count帧RGB画面"""
+    cmd = [FFMPEG_BINARY, '-loglevel', 'error', '-nostdin']
+    if start > 0:
+        # 定位到两帧之间，start之前的帧在解码后被丢弃，避免时间取整误差多取或少取一帧
+        cmd += ['-ss', f"{(start - 0.5) / OUTPUT_FPS:.6f}"]
+    cmd += ['-i', clip_file, '-map', '0:v:0', '-frames:v', str(count), '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def _read_frames(proc, size, count):
+    w, h = size
+    nbytes = w * h * 3
+    frame = None
+    for _ in range(count):
+        data = proc.stdout.read(nbytes)
+        # 片段实际帧数比容器中记录的少时，与moviepy一致地重复最后一帧
+        if len(data) == nbytes:
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+        if frame is None:
+            raise IOError("无法从片段中读取画面")
+        yield frame
+
+
+def _render_window(sources, clip_files, trans_frames, size, output_file, video_bitrate, encoding_profile, threads):
+    """
+    重新编码一个转场窗口：依次输出各片段的帧范围，相邻片段交叠的trans_frames帧按 get_crossfade_weight 混合。
+    画面与moviepy相同地以RGB解码、混合后再编码。
+    """
+    w, h = size
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin',
+           '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{w}x{h}", '-r', str(OUTPUT_FPS), '-i', '-', '-an']
+    cmd += get_ffmpeg_video_args(encoding_profile, video_bitrate, threads) + [output_file]
+    encoder = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    readers = []
+    try:
+        previous_tail = None
+        for k, (i, start, end) in enumerate(sources):
+            reader = _open_frame_reader(clip_files[i], start, end - start)
+            readers.append(reader)
+            frames = _read_frames(reader, size, end - start)
+            # 与前一片段交叠的部分
+            if previous_tail is not None:
+                for m, tail_frame in enumerate(previous_tail):
+                    weight = get_crossfade_weight(m / trans_frames)
+                    head_frame = next(frames).astype(np.float32)
+                    blended = tail_frame + (head_frame - tail_frame) * weight
+                    encoder.stdin.write(np.clip(blended + 0.5, 0, 255).astype(np.uint8).tobytes())
+            # 与后一片段交叠的部分留到读取后一片段时再混合
+            body_count = (end - start) - (trans_frames if previous_tail is not None else 0) \
+                - (trans_frames if k < len(sources) - 1 else 0)
+            for _ in range(body_count):
+                encoder.stdin.write(next(frames).tobytes())
+            previous_tail = [frame.astype(np.float32) for frame in frames] if k < len(sources) - 1 else None
+        encoder.stdin.close()
+        stderr = encoder.stderr.read()
+        if encoder.wait() != 0:
+            raise RuntimeError(f"渲染转场失败：{stderr.decode(errors='ignore').strip()}")
+    finally:
+        for reader in readers:
+            if reader.poll() is None:
+                reader.terminate()
+            reader.stdout.close()
+            reader.wait()
+        if encoder.poll() is None:
+            encoder.kill()
+            encoder.wait()
+
+
+def _render_xfade_window(sources, clip_files, trans_frames, output_file, video_bitrate, encoding_profile, threads,
+                         transition):
+    """重新编码一个转场窗口，相邻片段之间使用ffmpeg xfade滤镜的transition转场"""
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin']
+    filters = []
+    for k, (i, start, end) in enumerate(sources):
+        if start > 0:
+            cmd += ['-ss', f"{(start - 0.5) / OUTPUT_FPS:.6f}"]
+        cmd += ['-i', clip_files[i]]
+        # xfade按时间戳计算转场进度，统一为以帧为单位的时间戳
+        filters.append(f"[{k}:v]trim=end_frame={end - start},settb=1/{OUTPUT_FPS},setpts=N,fps={OUTPUT_FPS}[s{k}]")
+
+    label, length = "[s0]", sources[0][2] - sources[0][1]
+    for k, (i, start, end) in enumerate(sources[1:], start=1):
+        filters.append(f"{label}[s{k}]xfade=transition={transition}:duration={trans_frames / OUTPUT_FPS:.6f}"
+                       f":offset={(length - trans_frames) / OUTPUT_FPS:.6f}[x{k}]")
+        label, length = f"[x{k}]", length + (end - start) - trans_frames
+    filters.append(f"{label}format=yuv420p[vout]")
+
+    cmd += ['-filter_complex', ";".join(filters), '-map', '[vout]', '-an', '-frames:v', str(length)]
+    cmd += get_ffmpeg_video_args(encoding_profile, video_bitrate, threads) + [output_file]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"渲染转场失败：{result.stderr.decode(errors='ignore').strip()}")
+
+
+def _render_timeline_audio(clip_files, layouts, trans_frames, output_file, encoding_profile):
+    """
+    一次生成完整时间线的音频：各片段的音频裁剪或补齐到视频时长，相邻片段以线性交叉淡化重叠，
+    与 create_full_video 中 AudioFadeOut + AudioFadeIn 叠加的结果相同。没有音频的片段以静音代替。
+    """
+    cmd = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-nostdin']
+    filters = []
+    audio_format = f"aformat=sample_rates={AUDIO_SAMPLE_RATE}:channel_layouts=stereo"
+    for k, (clip_file, layout) in enumerate(zip(clip_files, layouts)):
+        duration = layout['frame_count'] / OUTPUT_FPS
+        if layout['has_audio']:
+            cmd += ['-i', clip_file]
+        else:
+            cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={AUDIO_SAMPLE_RATE}:cl=stereo:d={duration:.6f}"]
+        filters.append(f"[{k}:a]{audio_format},atrim=end={duration:.6f},apad=whole_dur={duration:.6f}[a{k}]")
+
+    if trans_frames:
+        label = "[a0]"
+        for k in range(1, len(clip_files)):
+            filters.append(f"{label}[a{k}]acrossfade=d={trans_frames / OUTPUT_FPS:.6f}:c1=tri:c2=tri[c{k}]")
+            label = f"[c{k}]"
+        filters.append(f"{label}anull[aout]")
+    else:
+        filters.append("".join(f"[a{k}]" for k in range(len(clip_files)))
+                       + f"concat=n={len(clip_files)}:v=0:a=1[aout]")
+
+    cmd += ['-filter_complex', ";".join(filters), '-map', '[aout]', '-vn']
+    cmd += get_ffmpeg_audio_args(encoding_profile) + [output_file]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"合成完整视频的音频失败：{result.stderr.decode(errors='ignore').strip()}")
+
+
+def assemble_full_video(clip_files, output_file, video_bitrate, trans_time=1, video_trans_enable=True,
+                        workers=1, encoding_profile=DEFAULT_ENCODING_PROFILE, transition=None):
+    """
+    由已渲染的（无淡入淡出的）片段组装完整视频：片段主体流复制，只重新编码转场窗口，
+    音频单独合成后与拼接好的视频合并。
+
+    Args:
+        transition (str): ffmpeg xfade的转场名称，None表示与 create_full_video 相同的交叉淡化
+
+    Returns:
+        dict: {"copied_frames", "encoded_frames", "windows"}，用于统计重新编码的比例
+    """
+    trans_frames = round(trans_time * OUTPUT_FPS) if video_trans_enable else 0
+    layouts = [read_video_sample_layout(clip_file) for clip_file in clip_files]
+    for clip_file, layout in zip(clip_files, layouts):
+        if layout is None:
+            raise IOError(f"无法读取片段 {clip_file} 的关键帧信息")
+    pieces = plan_smart_render(layouts, trans_frames)
+    info = get_media_info(clip_files[0])
+    if info is None:
+        raise IOError(f"无法读取片段 {clip_files[0]} 的视频信息")
+    size = (info['width'], info['height'])
+    threads = get_encoder_threads(workers) if workers > 1 else None
+
+    with tempfile.TemporaryDirectory(prefix="smart_render_", dir=os.path.dirname(os.path.abspath(output_file))) as work_dir:
+        piece_files = [os.path.join(work_dir, f"{n:04d}.mp4") for n in range(len(pieces))]
+        audio_file = os.path.join(work_dir, "audio.mp4")
+
+        def run(n):
+            if n == len(pieces):
+                return _render_timeline_audio(clip_files, layouts, trans_frames, audio_file, encoding_profile)
+            kind, spec = pieces[n]
+            if kind == "copy":
+                i, start, end = spec
+                return _extract_body(clip_files[i], start, end, layouts[i]['frame_count'], piece_files[n])
+            if transition:
+                return _render_xfade_window(spec, clip_files, trans_frames, piece_files[n],
+                                            video_bitrate, encoding_profile, threads, transition)
+            return _render_window(spec, clip_files, trans_frames, size, piece_files[n],
+                                  video_bitrate, encoding_profile, threads)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(run, range(len(pieces) + 1)))
+
+        video_file = os.path.join(work_dir, "video.mp4")
+        concat_videos(piece_files, video_file)
+        break_link(output_file)
+        mux_video_audio(video_file, audio_file, output_file)
+
+    windows = [spec for kind, spec in pieces if kind == "blend"]
+    return {"copied_frames": sum(spec[2] - spec[1] for kind, spec in pieces if kind == "copy"),
+            "encoded_frames": sum(end - start for sources in windows for i, start, end in sources),
+            "windows": len(windows)}
+
+
+def render_full_video_smart(configs, style_config, username,
+                            video_output_path, video_res, video_bitrate,
+                            video_trans_enable, video_trans_time,
+                            backend="moviepy", workers=1, force_render=False,
+                            encoding_profile=DEFAULT_ENCODING_PROFILE):
+    """
+    分段渲染完整视频，输出与 render_complete_full_video 相同的 {username}_FULL_VIDEO.mp4。
+
+    各片段先按普通片段渲染（复用渲染缓存，可以并行，并在转场边界强制插入关键帧），
+    片段主体直接流复制，只有相邻片段交叠的转场窗口需要解码并重新编码。
+    不支持 FULL_LAST_CLIP（B1片段与结尾合并），需要时请使用完整合成模式。
+    """
+    print("正在分段合成完整视频")
+    try:
+        results = render_all_video_clips(configs, style_config, video_output_path, video_res, video_bitrate,
+                                         auto_add_transition=False, trans_time=video_trans_time,
+                                         force_render=force_render, backend=backend, workers=workers,
+                                         encoding_profile=encoding_profile, split_keyframes=video_trans_enable)
+        if not results:
+            return {"status": "error", "info": "没有找到主视频片段的配置！"}
+        failed = [r for r in results if r['status'] == "error"]
+        if failed:
+            return {"status": "error", "info": "\n".join(r['info'] for r in failed)}
+
+        output_file = os.path.join(video_output_path, f"{username}_FULL_VIDEO.mp4")
+        stats = assemble_full_video([os.path.join(video_output_path, r['file']) for r in results], output_file,
+                                    video_bitrate, video_trans_time, video_trans_enable, workers, encoding_profile)
+        total = stats['copied_frames'] + stats['encoded_frames']
+        print(f"Info: 完整视频分段合成完成，{stats['windows']}个转场窗口，"
+              f"重新编码 {stats['encoded_frames']}/{total} 帧")
+        refresh_save_at(video_output_path)
+        return {"status": "success", "info": "合成完整视频成功"}
+    except Exception as e:
+        traceback.print_exc()
+        return {"status": "error", "info": f"合成完整视频时发生异常: {e}"}
+
+
+def combine_full_video_xfade(clip_files, video_clip_path, video_bitrate, trans_name="fade", trans_time=1,
+                             workers=1, encoding_profile=DEFAULT_ENCODING_PROFILE):
+    """
+    快速模式的转场拼接：将已渲染的片段（无淡入淡出，带有转场边界的关键帧）以xfade转场拼接为 final_output.mp4，
+    只重新编码转场窗口，不需要Node.js与ffmpeg-concat。
+
+    Args:
+        clip_files (list[str]): 按顺序排列的片段文件路径
+        trans_name (str): 页面上的转场名称，见 XFADE_TRANSITIONS
+    """
+    if trans_name not in XFADE_TRANSITIONS:
+        print(f"Warning: 不支持的转场 {trans_name}，将使用淡化转场")
+    output_path = os.path.join(os.path.abspath(video_clip_path), "final_output.mp4")
+    stats = assemble_full_video(clip_files, output_path, video_bitrate, trans_time, True, workers,
+                                encoding_profile, transition=XFADE_TRANSITIONS.get(trans_name, "fade"))
+    print(f"视频拼接完成（{len(clip_files)}个片段，{stats['windows']}个{trans_name}转场）")
+    refresh_save_at(video_clip_path)
+    return output_path
@@ -0,0 +1,177 @@
+import gzip
+import json
+import os
+
+from utils.PathUtils import get_user_version_dir, get_user_versions
+
+# 可选依赖：orjson 序列化更快，zstandard 压缩率与速度更好；未安装时分别回退到 json 与 gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_CODECS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+# 机器读写的存档文件，归档旧存档时只处理这些文件
+SAVE_JSON_FILES = (
+    "b50_raw.json",
+    "b50_config.json",
+    "b50_config_youtube.json",
+    "b50_config_bilibili.json",
+    "video_configs.json",
+)
+
+
+def dumps_json(data, compact=True):
+    """序列化为UTF-8字节串，compact=False 时使用便于人工阅读的缩进格式"""
+    if compact and orjson is not None:
+        return orjson.dumps(data)
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+
+def loads_json(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def resolve_json_path(path):
+    """返回path实际存在的文件（未压缩或已归档的版本），均不存在时返回None"""
+    if os.path.exists(path):
+        return path
+    for suffix in ARCHIVE_CODECS.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+
+def json_file_exists(path):
+    return resolve_json_path(path) is not None
+
+
+def _read_bytes(path):
+    if path.endswith(ARCHIVE_CODECS["gzip"]):
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    if path.endswith(ARCHIVE_CODECS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"读取 {path} 需要安装 zstandard 库")
+        with open(path, "rb") as f:
+            return zstandard.ZstdDecompressor().stream_reader(f).read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_json(path):
+    """读取JSON文件，自动识别未压缩、gzip与zstd归档格式"""
+    real_path = resolve_json_path(path)
+    if real_path is None:
+        raise FileNotFoundError(f"文件不存在：{path}")
+    return loads_json(_read_bytes(real_path))
+
+
+def atomic_write_bytes(path, content):
+    """先写入同目录下的临时文件并落盘，再原子替换目标文件，中途崩溃不会留下写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def dump_json(path, data, compact=True):
+    """原子地写入未压缩的JSON文件，并移除同名的旧归档，避免读取到过期数据"""
+    atomic_write_bytes(path, dumps_json(data, compact=compact))
+    for suffix in ARCHIVE_CODECS.values():
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def remove_json_file(path):
+    """删除JSON文件及其所有归档版本"""
+    for candidate in [path] + [path + suffix for suffix in ARCHIVE_CODECS.values()]:
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def copy_json_file(src, dst, compact=True):
+    dump_json(dst, load_json(src), compact=compact)
+
+
+def _resolve_codec(codec):
+    if codec not in ARCHIVE_CODECS:
+        raise ValueError(f"不支持的压缩格式 {codec}，可选值：{list(ARCHIVE_CODECS.keys())}")
+    if codec == "zstd" and zstandard is None:
+        print("Warning: 未安装 zstandard 库，改用 gzip 归档。")
+        return "gzip"
+    return codec
+
+
+def archive_json_file(path, codec="gzip"):
+    """
+    将JSON文件压缩归档为 path.gz / path.zst 并删除原文件。
+
+    Returns:
+        int: 节省的字节数，文件不存在或已归档时为0
+    """
+    codec = _resolve_codec(codec)
+    if not os.path.exists(path):
+        return 0
+
+    raw = _read_bytes(path)
+    # 归档前顺便转为紧凑格式
+    compact = dumps_json(loads_json(raw), compact=True)
+    archive_path = path + ARCHIVE_CODECS[codec]
+    temp_path = archive_path + ".tmp"
+    if codec == "gzip":
+        with gzip.open(temp_path, "wb", compresslevel=6) as f:
+            f.write(compact)
+    else:
+        with open(temp_path, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(compact))
+    os.replace(temp_path, archive_path)
+    os.remove(path)
+    return len(raw) - os.path.getsize(archive_path)
+
+
+def archive_save_dir(version_dir, codec="gzip"):
+    """归档单个存档目录下的JSON文件，返回节省的字节数"""
+    codec = _resolve_codec(codec)
+    saved_bytes = 0
+    for file_name in SAVE_JSON_FILES:
+        saved_bytes += archive_json_file(os.path.join(version_dir, file_name), codec=codec)
+    return saved_bytes
+
+
+def archive_old_versions(username, keep_latest=3, codec="gzip"):
+    """
+    归档某个用户除最新keep_latest个存档以外的全部存档。归档后的存档仍可正常读取，
+    再次写入时会自动恢复为未压缩格式。
+
+    Returns:
+        dict: {"archived": 归档的存档列表, "saved_bytes": 节省的字节数}
+    """
+    codec = _resolve_codec(codec)
+    archived = []
+    saved_bytes = 0
+    for version in get_user_versions(username)[keep_latest:]:
+        saved = archive_save_dir(get_user_version_dir(username, version), codec=codec)
+        if saved:
+            archived.append(version)
+        saved_bytes += saved
+    print(f"Info: 已归档{len(archived)}个旧存档，节省空间{saved_bytes / 1024:.1f}KB")
+    return {"archived": archived, "saved_bytes": saved_bytes}
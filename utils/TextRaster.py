@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+from moviepy import ImageClip, TextClip
+from moviepy import __version__ as MOVIEPY_VERSION
+
+from utils.CacheUtils import file_signature
+
+# 文字图层缓存：以文字与全部排版参数为键，保存TextClip栅格化后的RGBA图像，
+# 相同的文字（如固定的页脚、未修改的评论）在重复渲染与预览时不必重新栅格化
+TEXT_RASTER_CACHE_DIR = "./videos/text_raster_cache"
+# 栅格化方式变化时递增，使旧的缓存文件失效
+TEXT_RASTER_VERSION = 1
+# 进程内保留的最近使用的文字图层数量
+MEMORY_CACHE_SIZE = 64
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def get_char_width(char):
+    """排版时一个字符占用的宽度：中日文为2，其他为1"""
+    if '\u4e00' <= char <= '\u9fff' or '\u3040' <= char <= '\u30ff':
+        return 2
+    return 1
+
+
+def get_text_raster_key(text, font_path, font_size, color, stroke_color, stroke_width,
+                        interline, text_align, vertical_align, margin):
+    """文字图层的缓存键：文字、字体文件（路径、大小与修改时间）与全部排版参数"""
+    font_signature = file_signature(font_path) if os.path.exists(font_path) else None
+    payload = {
+        "version": TEXT_RASTER_VERSION,
+        "moviepy": MOVIEPY_VERSION,
+        "text": text,
+        "font": [os.path.normcase(os.path.abspath(font_path)), font_signature],
+        "font_size": font_size,
+        "color": color,
+        "stroke": [stroke_color, stroke_width],
+        "interline": interline,
+        "align": [text_align, vertical_align],
+        "margin": list(margin),
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _remember(key, raster):
+    with _memory_lock:
+        _memory_cache[key] = raster
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _load_raster(cache_file):
+    try:
+        with Image.open(cache_file) as image:
+            return np.array(image.convert("RGBA"))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Warning: 文字图层缓存 {cache_file} 读取失败，将重新栅格化：{e}")
+        return None
+
+
+def _touch(cache_file):
+    # 命中时更新修改时间，prune_text_raster_cache 按修改时间保留最近使用的文件（访问时间在许多系统上不更新）
+    try:
+        os.utime(cache_file)
+    except OSError:
+        pass
+
+
+def _save_raster(cache_file, raster):
+    # 先写入临时文件再替换，并行渲染的多个进程同时写入同一缓存时不会读到不完整的文件
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        Image.fromarray(raster, "RGBA").save(temp_file, format="PNG", compress_level=1)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: 文字图层缓存 {cache_file} 写入失败：{e}")
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def rasterize_text(text, font_path, font_size, color="black", stroke_color=None, stroke_width=0,
+                   interline=4, text_align="left", vertical_align="center", margin=(None, None)):
+    """
+    栅格化文字，返回与 TextClip(method="label") 完全相同的RGBA图像（非预乘的alpha，与合成时使用的Pillow一致）。
+    结果依次从进程内缓存、磁盘缓存中查找，都未命中时才调用TextClip。
+
+    Returns:
+        numpy.ndarray: 形状为 (高, 宽, 4) 的uint8数组，调用方不应修改
+    """
+    key = get_text_raster_key(text, font_path, font_size, color, stroke_color, stroke_width,
+                              interline, text_align, vertical_align, margin)
+    with _memory_lock:
+        raster = _memory_cache.get(key)
+    if raster is not None:
+        _remember(key, raster)
+        return raster
+
+    cache_file = os.path.join(TEXT_RASTER_CACHE_DIR, f"{key}.png")
+    raster = _load_raster(cache_file)
+    if raster is not None:
+        _touch(cache_file)
+    else:
+        clip = TextClip(font=font_path, text=text, method="label", font_size=font_size,
+                        margin=margin, interline=interline, text_align=text_align,
+                        vertical_align=vertical_align, color=color,
+                        stroke_color=stroke_color, stroke_width=stroke_width)
+        # TextClip的蒙版由图像的alpha通道除以255得到，乘回255即可无损还原
+        alpha = np.round(clip.mask.img * 255).astype(np.uint8)
+        raster = np.dstack([clip.img.astype(np.uint8), alpha])
+        clip.close()
+        _save_raster(cache_file, raster)
+    raster.setflags(write=False)
+    _remember(key, raster)
+    return raster
+
+
+def create_text_clip(text, font_path, font_size, duration=None, **text_style):
+    """
+    替代 TextClip(method="label", ...) 的文字图层，栅格化结果来自 rasterize_text 的缓存。
+    text_style 为 rasterize_text 的排版参数（color、stroke_color、stroke_width、interline、
+    text_align、vertical_align、margin）。
+    """
+    raster = rasterize_text(text, font_path, font_size, **text_style)
+    return ImageClip(raster, transparent=True, duration=duration)
+
+
+def prune_text_raster_cache(max_files=2000):
+    """只保留最近使用（修改时间最新）的max_files个缓存文件，返回删除的文件数"""
+    if not os.path.isdir(TEXT_RASTER_CACHE_DIR):
+        return 0
+    entries = [entry for entry in os.scandir(TEXT_RASTER_CACHE_DIR) if entry.name.endswith(".png")]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    removed = 0
+    for entry in entries[max_files:]:
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
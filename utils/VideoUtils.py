@@ -1,13 +1,38 @@
 import os
+import hashlib
+import json
+import multiprocessing
 import numpy as np
 import subprocess
 import traceback
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image, ImageFilter
-from moviepy import VideoFileClip, ImageClip, TextClip, AudioFileClip, CompositeVideoClip, CompositeAudioClip, concatenate_videoclips
+from moviepy import VideoClip, VideoFileClip, ImageClip, AudioFileClip, CompositeVideoClip, CompositeAudioClip, concatenate_videoclips
 from moviepy import vfx, afx
 from utils.ImageUtils import load_music_jacket
 from utils.PageUtils import load_style_config
-from utils.VisionUtils import find_circle_center, draw_center_marker
+from utils.MediaProbe import get_media_duration, get_media_info
+from utils.AudioUtils import get_source_gain
+from utils.FFmpegReader import FilteredVideoClip, read_frame_at
+from utils.CacheUtils import file_signature
+from utils.BlobStore import break_link
+from utils.EncodingProfiles import (DEFAULT_ENCODING_PROFILE, OUTPUT_FPS, get_split_keyframes,
+                                    get_write_videofile_kwargs)
+from utils.TextRaster import create_text_clip, get_char_width
+from utils.SaveCatalog import RENDERED_CLIP_PATTERN, refresh_save_at
+from utils.ConcatUtils import concat_videos
+from utils.CheckpointRender import get_checkpoint_progress, render_clip_checkpointed
+from utils.RenderCache import RenderCache, compute_clip_fingerprint
+from utils.VisionUtils import get_video_circle, draw_center_marker
+
+# 片段输出帧率，与编码配置的输出帧率一致
+CONTENT_VIDEO_FPS = OUTPUT_FPS
+# 片段渲染后端：moviepy逐帧合成，或编译为ffmpeg的filter_complex（见 utils/FFmpegRenderer.py）
+RENDER_BACKENDS = ["moviepy", "ffmpeg"]
+# 样式预览截取的画面时刻（秒），以及预览图的默认最大宽度
+PREVIEW_FRAME_TIME = 1
+PREVIEW_MAX_WIDTH = 960
 
 
 def get_splited_text(text, text_max_bytes=60):
@@ -19,37 +44,37 @@ def get_splited_text(text, text_max_bytes=60):
         text_max_bytes (int): 每行最大字节数限制（utf-8编码）
         
     Returns:
-        str: 按规则切割并用换行符连接的文本
+        list[str]: 按规则切割后的各行文本
     """
+    return list(_split_text_lines(text, text_max_bytes))
+
+
+@lru_cache(maxsize=256)
+def _split_text_lines(text, text_max_bytes):
+    # 预览与渲染会对同一段文本反复切割，结果按 (文本, 字节数限制) 缓存
     lines = []
-    current_line = ""
     
     # 按现有换行符先分割
     for line in text.split('\n'):
         current_length = 0
-        current_line = ""
+        line_start = 0
         
-        for char in line:
-            # 计算字符长度：中日文为2，其他为1
-            if '\u4e00' <= char <= '\u9fff' or '\u3040' <= char <= '\u30ff':
-                char_length = 2
-            else:
-                char_length = 1
+        for i, char in enumerate(line):
+            char_length = get_char_width(char)
             
             # 如果添加这个字符会超出限制，保存当前行并重新开始
             if current_length + char_length > text_max_bytes:
-                lines.append(current_line)
-                current_line = char
+                lines.append(line[line_start:i])
+                line_start = i
                 current_length = char_length
             else:
-                current_line += char
                 current_length += char_length
         
         # 处理剩余的字符
-        if current_line:
-            lines.append(current_line)
+        if line_start < len(line):
+            lines.append(line[line_start:])
     
-    return lines
+    return tuple(lines)
 
 
 def blur_image(pil_image, blur_radius=5):
@@ -72,6 +97,27 @@ def blur_image(pil_image, blur_radius=5):
         return pil_image
 
 
+@lru_cache(maxsize=64)
+def _load_blurred_jacket(music_tag):
+    jacket_raw = load_music_jacket(music_tag)
+    if not jacket_raw:
+        # 抛出异常使获取失败的结果不被缓存，下次仍会重新下载
+        raise FileNotFoundError(music_tag)
+    # 高斯模糊处理图片
+    jacket_array = blur_image(jacket_raw, blur_radius=5)
+    if isinstance(jacket_array, np.ndarray):
+        jacket_array.setflags(write=False)
+    return jacket_array
+
+
+def load_blurred_jacket(music_tag):
+    """获取高斯模糊处理后的乐曲封面，结果在进程内缓存，获取失败时返回None"""
+    try:
+        return _load_blurred_jacket(music_tag)
+    except FileNotFoundError:
+        return None
+
+
 def create_blank_image(width, height, color=(0, 0, 0, 0)):
     """
     创建一个透明的图片
@@ -82,39 +128,69 @@ def create_blank_image(width, height, color=(0, 0, 0, 0)):
     return np.array(image)
 
 
-def normalize_audio_volume(clip, target_dbfs=-20):
-    """均衡化音频响度到指定的分贝值"""
+def get_volume_gain(audio, duration, target_dbfs=-20):
+    """计算将音频响度均衡到指定分贝值所需的增益，无法计算时返回None"""
+    # 采样音频的多个点来计算平均音量
+    sample_times = np.linspace(0, duration, num=100)
+    samples = []
+
+    for t in sample_times:
+        frame = audio.get_frame(t)
+        if isinstance(frame, (list, tuple, np.ndarray)):
+            samples.append(np.array(frame))
+
+    if not samples:
+        return None
+
+    # 将样本堆叠成数组
+    audio_array = np.stack(samples)
+
+    # 计算当前音频的均方根值
+    current_rms = np.sqrt(np.mean(audio_array**2))
+
+    # 计算需要的增益
+    target_rms = 10**(target_dbfs/20)
+    gain = target_rms / (current_rms + 1e-8)  # 添加小值避免除零
+
+    # 限制增益范围，避免过度放大或减弱
+    return float(np.clip(gain, 0.1, 3.0))
+
+
+def get_clip_audio_source(clip_config, clip_type, style_config):
+    """
+    片段音频的来源，用于按源文件分析并缓存响度。
+
+    Returns:
+        dict: {"file_path", "start", "end", "loop"}，片段没有可分析的音频来源时返回None
+    """
+    if clip_type == "info":
+        return {"file_path": style_config['asset_paths']['intro_bgm'],
+                "start": 0, "end": clip_config['duration'], "loop": True}
+    if 'video' in clip_config and os.path.exists(clip_config['video']):
+        return {"file_path": clip_config['video'],
+                "start": clip_config['start'], "end": clip_config['end'], "loop": False}
+    return None
+
+
+def normalize_audio_volume(clip, target_dbfs=-20, source=None):
+    """
+    均衡化音频响度到指定的分贝值
+
+    Args:
+        source (dict): 片段音频的来源（见 get_clip_audio_source），提供时直接读取源文件对应区间的全部样本
+            计算响度，结果按源文件缓存；未提供时在片段音频上取样估计
+    """
     if clip.audio is None:
         return clip
     
     try:
-        # 获取音频数据
-        audio = clip.audio
-        
-        # 采样音频的多个点来计算平均音量
-        sample_times = np.linspace(0, clip.duration, num=100)
-        samples = []
-        
-        for t in sample_times:
-            frame = audio.get_frame(t)
-            if isinstance(frame, (list, tuple, np.ndarray)):
-                samples.append(np.array(frame))
-        
-        if not samples:
+        if source is not None:
+            gain = get_source_gain(source['file_path'], source['start'], source['end'],
+                                   target_dbfs=target_dbfs, loop=source['loop'])
+        else:
+            gain = get_volume_gain(clip.audio, clip.duration, target_dbfs)
+        if gain is None:
             return clip
-            
-        # 将样本堆叠成数组
-        audio_array = np.stack(samples)
-        
-        # 计算当前音频的均方根值
-        current_rms = np.sqrt(np.mean(audio_array**2))
-        
-        # 计算需要的增益
-        target_rms = 10**(target_dbfs/20)
-        gain = target_rms / (current_rms + 1e-8)  # 添加小值避免除零
-        
-        # 限制增益范围，避免过度放大或减弱
-        gain = np.clip(gain, 0.1, 3.0)
         
         # print(f"Applying volume gain: {gain:.2f}")
         
@@ -125,13 +201,10 @@ def normalize_audio_volume(clip, target_dbfs=-20):
         return clip
 
 
-def create_info_segment(clip_config, style_config, resolution):
-    print(f"正在合成视频片段: {clip_config['id']}")
-
+def build_info_overlay(clip_config, style_config, resolution):
+    """将开场/结尾片段中不随时间变化的图层（文字背景图与文字）合成为一张RGBA图像"""
     font_path = style_config['asset_paths']['comment_font']
-    intro_video_bg_path = style_config['asset_paths']['intro_video_bg']
     intro_text_bg_path = style_config['asset_paths']['intro_text_bg']
-    intro_bgm_path = style_config['asset_paths']['intro_bgm']
 
     base_text_size = style_config['intro_text_style']['font_size']
     text_size = max(12, int(base_text_size * 0.85))
@@ -147,41 +220,50 @@ def create_info_segment(clip_config, style_config, resolution):
     bg_image = ImageClip(intro_text_bg_path).with_duration(clip_config['duration'])
     bg_image = bg_image.with_effects([vfx.Resize(width=resolution[0])])
 
-    bg_video = VideoFileClip(intro_video_bg_path)
-    bg_video = bg_video.with_effects([vfx.Loop(duration=clip_config['duration']), 
-                                      vfx.MultiplyColor(0.75),
-                                      vfx.Resize(width=resolution[0])])
-
     # 创建文字
     text_list = get_splited_text(clip_config['text'], text_max_bytes=inline_max_len)
-    txt_clip = TextClip(font=font_path, text="\n".join(text_list),
-                        method = "label",
-                        font_size=text_size,
-                        margin=(20, 20),
-                        interline=interline_size,
-                        text_align=horizontal_align,
-                        vertical_align="top",
-                        color=text_color,
-                        stroke_color = None if not enable_stroke else stroke_color,
-                        stroke_width = 0 if not enable_stroke else stroke_width,
-                        duration=clip_config['duration'])
+    txt_clip = create_text_clip("\n".join(text_list), font_path, text_size,
+                                duration=clip_config['duration'],
+                                margin=(20, 20),
+                                interline=interline_size,
+                                text_align=horizontal_align,
+                                vertical_align="top",
+                                color=text_color,
+                                stroke_color = None if not enable_stroke else stroke_color,
+                                stroke_width = 0 if not enable_stroke else stroke_width)
     
     addtional_text = "【本视频由mai-genVb50视频生成器生成】"
-    addtional_txt_clip = TextClip(font=font_path, text=addtional_text,
-                        method = "label",
-                        font_size=18,
-                        vertical_align="bottom",
-                        color="white",
-                        duration=clip_config['duration']
-    )
+    addtional_txt_clip = create_text_clip(addtional_text, font_path, 18,
+                                          duration=clip_config['duration'],
+                                          vertical_align="bottom",
+                                          color="white")
     
     text_pos = (int(0.16 * resolution[0]), int(0.18 * resolution[1]))
     addtional_text_pos = (int(0.2 * resolution[0]), int(0.88 * resolution[1]))
-    composite_clip = CompositeVideoClip([
-            bg_video.with_position((0, 0)),
+    return flatten_static_layers([
             bg_image.with_position((0, 0)),
             txt_clip.with_position((text_pos[0], text_pos[1])),
             addtional_txt_clip.with_position((addtional_text_pos[0], addtional_text_pos[1]))
+        ], resolution)
+
+
+def create_info_segment(clip_config, style_config, resolution):
+    print(f"正在合成视频片段: {clip_config['id']}")
+
+    intro_video_bg_path = style_config['asset_paths']['intro_video_bg']
+    intro_bgm_path = style_config['asset_paths']['intro_bgm']
+
+    bg_video = VideoFileClip(intro_video_bg_path)
+    bg_video = bg_video.with_effects([vfx.Loop(duration=clip_config['duration']), 
+                                      vfx.MultiplyColor(0.75),
+                                      vfx.Resize(width=resolution[0])])
+
+    # 背景图与文字不随时间变化，预先合成为一个图层
+    overlay_clip = ImageClip(np.array(build_info_overlay(clip_config, style_config, resolution)))
+    overlay_clip = overlay_clip.with_duration(clip_config['duration'])
+    composite_clip = CompositeVideoClip([
+            bg_video.with_position((0, 0)),
+            overlay_clip.with_position((0, 0))
         ],
         size=resolution,
         use_bgclip=True
@@ -195,9 +277,104 @@ def create_info_segment(clip_config, style_config, resolution):
     return composite_clip.with_duration(clip_config['duration'])
 
 
-def create_video_segment(clip_config, style_config, resolution):
-    print(f"正在合成视频片段: {clip_config['id']}")
-    
+def flatten_static_layers(layers, resolution, background=None):
+    """
+    将不随时间变化的图层（ImageClip、TextClip等）按顺序叠加为一张PIL图像。
+    使用各图层自身的compose_on，位置、缩放与透明度的处理与CompositeVideoClip逐帧合成时一致。
+    """
+    canvas = background if background is not None else Image.new("RGBA", resolution, (0, 0, 0, 0))
+    for layer in layers:
+        canvas = layer.compose_on(canvas, 0)
+    return canvas
+
+
+def get_video_rect(video_pos, video_size, frame_size):
+    """谱面视频在画面内可见的矩形区域 (x1, y1, x2, y2)，完全位于画面外时返回None"""
+    x1, y1 = max(int(video_pos[0]), 0), max(int(video_pos[1]), 0)
+    x2 = min(int(video_pos[0]) + int(video_size[0]), frame_size[0])
+    y2 = min(int(video_pos[1]) + int(video_size[1]), frame_size[1])
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def create_flattened_clip(bottom_image, overlay_image, video_clip, video_pos, duration):
+    """
+    用预先合成的静态底图与前景遮罩生成视频片段，效果等同于
+    CompositeVideoClip([底图, video_clip, 前景])，但每帧只需处理谱面视频所在的矩形区域。
+
+    Args:
+        bottom_image (PIL.Image): 位于视频下方的静态底图
+        overlay_image (PIL.Image): 位于视频上方的RGBA前景（成绩图与文字）
+        video_clip: 谱面视频片段，为None时输出静态画面
+        video_pos (tuple): 视频左上角在画面中的位置
+        duration (float): 片段时长
+    """
+    bottom = np.array(bottom_image.convert("RGB"))
+    # 视频区域以外的画面在整个片段中保持不变，预先完成前景的合成
+    static_frame = np.array(Image.alpha_composite(bottom_image.convert("RGBA"), overlay_image).convert("RGB"))
+    if video_clip is None:
+        return ImageClip(static_frame).with_duration(duration)
+
+    rect = get_video_rect(video_pos, video_clip.size, bottom_image.size)
+    if rect is None:
+        return ImageClip(static_frame).with_duration(duration).with_audio(video_clip.audio)
+    x1, y1, x2, y2 = rect
+    vx, vy = x1 - int(video_pos[0]), y1 - int(video_pos[1])
+
+    # 视频区域内的前景：预乘透明度的颜色与剩余透明度
+    overlay = np.array(overlay_image)[y1:y2, x1:x2].astype(np.float32)
+    overlay_alpha = overlay[:, :, 3:4] / 255.0
+    overlay_premultiplied = overlay[:, :, :3] * overlay_alpha
+    overlay_remaining = 1.0 - overlay_alpha
+    has_overlay = bool(overlay_alpha.any())
+    bottom_region = bottom[y1:y2, x1:x2].astype(np.float32)
+
+    def frame_function(t):
+        frame = static_frame.copy()
+        if not video_clip.is_playing(t):
+            return frame
+        region = video_clip.get_frame(t - video_clip.start)[vy:vy + (y2 - y1), vx:vx + (x2 - x1), :3].astype(np.float32)
+        if video_clip.mask is not None:
+            mask = video_clip.mask.get_frame(t - video_clip.start)[vy:vy + (y2 - y1), vx:vx + (x2 - x1), np.newaxis]
+            region = region * mask + bottom_region * (1.0 - mask)
+        if has_overlay:
+            region = region * overlay_remaining + overlay_premultiplied
+        frame[y1:y2, x1:x2] = np.clip(region + 0.5, 0, 255).astype(np.uint8)
+        return frame
+
+    flattened = VideoClip(frame_function, duration=duration)
+    flattened.fps = getattr(video_clip, "fps", None)
+    return flattened.with_audio(video_clip.audio)
+
+
+def get_square_crop_x(center_x, video_width, video_height):
+    """
+    计算将谱面视频裁剪为正方形时的左边界，视频已是正方形（或宽度不足）时返回None。
+    center_x为检测到的视觉中心，用于处理原始视频存在中心偏移的情况，为None时使用几何中心。
+    """
+    if video_width <= video_height:
+        return None
+    if center_x is None:
+        center_x = video_width / 2
+
+    # 计算方形宽度范围并处理边界
+    x1 = center_x - (video_height / 2)
+    x2 = center_x + (video_height / 2)
+    if x1 < 0:
+        x1 = 0
+    elif x2 > video_width:
+        x1 = video_width - video_height
+    return int(x1)
+
+
+def build_content_static_layers(clip_config, style_config, resolution):
+    """
+    合成谱面确认片段中不随时间变化的图层。
+
+    Returns:
+        tuple: (位于谱面视频下方的RGB底图, 位于谱面视频上方的RGBA前景)
+    """
     # 配置文字样式选项
     font_path = style_config['asset_paths']['comment_font']
     base_text_size = style_config['content_text_style']['font_size']
@@ -215,10 +392,6 @@ def create_video_segment(clip_config, style_config, resolution):
     default_bg_path = style_config['asset_paths']['content_bg']
     override_content_bg = style_config['options'].get('override_content_default_bg', False)
 
-    bg_video = VideoFileClip("./static/assets/bg_clips/black_bg.mp4")
-    bg_video = bg_video.with_effects([vfx.Loop(duration=clip_config['duration']), 
-                                      vfx.Resize(width=resolution[0])])
-    
     # 检查成绩图片是否存在
     if 'main_image' in clip_config and os.path.exists(clip_config['main_image']):
         main_image = ImageClip(clip_config['main_image']).with_duration(clip_config['duration'])
@@ -233,13 +406,10 @@ def create_video_segment(clip_config, style_config, resolution):
         jacket_image = ImageClip(default_bg_path).with_duration(clip_config['duration'])
         jacket_image = jacket_image.with_effects([vfx.Resize(width=resolution[0])])
     else:
-        # 读取song_id，并获取预览图jacket
-        music_tag = clip_config['song_id']
-        jacket_raw = load_music_jacket(music_tag)
+        # 读取song_id，并获取模糊处理后的预览图jacket
+        jacket_array = load_blurred_jacket(clip_config['song_id'])
         
-        if jacket_raw:
-            # 高斯模糊处理图片
-            jacket_array = blur_image(jacket_raw, blur_radius=5)
+        if jacket_array is not None:
             # 创建 ImageClip
             jacket_image = ImageClip(jacket_array).with_duration(clip_config['duration'])
             # 将jacket图片按视频分辨率宽度等比例缩放，以填充整个背景
@@ -252,104 +422,171 @@ def create_video_segment(clip_config, style_config, resolution):
 
     jacket_image = jacket_image.with_effects([vfx.MultiplyColor(0.8)])
 
-    # 检查视频是否存在
-    if 'video' in clip_config and os.path.exists(clip_config['video']):
-        video_clip = VideoFileClip(clip_config['video'])
-        
-        # 添加调试信息
-        print(f"Start time: {clip_config['start']}, Clip duration: {video_clip.duration}, End time: {clip_config['end']}")
-        # 等比例缩放
-        video_clip = video_clip.with_effects([vfx.Resize(height=0.5 * resolution[1])])
-        # 从未剪裁的视频中提取中间一帧用于分析
-        analysis_frame = video_clip.get_frame(t=(video_clip.duration / 2))
-
-        # 检查 start_time 和 end_time 是否超出 clip 的持续时间
-        if clip_config['start'] < 0 or clip_config['start'] >= video_clip.duration:
-            raise ValueError(f"片段开始时间 {clip_config['start']} 超出视频{clip_config['video']}的长度. 请检查该片段的时间配置.")
-        
-        if clip_config['end'] <= clip_config['start'] or clip_config['end'] > video_clip.duration:
-            raise ValueError(f"片段结束时间 {clip_config['end']} 超出视频{clip_config['video']}的长度. 请检查该片段的时间配置.")
-        # 裁剪目标视频片段
-        video_clip = video_clip.subclipped(start_time=clip_config['start'],
-                                            end_time=clip_config['end'])
-        
-        video_height = video_clip.h
-        video_width = video_clip.w
-        if video_height != video_width:  # 仅当视频不是正方形时才进行裁剪
-            # 检测传入谱面确认视频的视觉中心，此操作的目的是为了识别原始视频存在中心偏移的情况
-            visual_center = find_circle_center(analysis_frame, debug=False, name=clip_config['id'])
-
-            # 确定裁剪中心（优先使用视觉中心，未识别到时使用几何中心）
-            center_x = visual_center[0] if visual_center else video_width / 2
-            
-            # 计算方形宽度范围
-            x1 = center_x - (video_height / 2)
-            x2 = center_x + (video_height / 2)
-            
-            # 处理边界
-            if x1 < 0:
-                x1 = 0
-                x2 = video_height
-            elif x2 > video_width:
-                x2 = video_width
-                x1 = video_width - video_height
-
-            # 裁剪成正方形
-            video_clip = video_clip.cropped(x1=x1, y1=0, x2=x2, y2=video_height)
-    else:
-        print(f"Video Generator Warning:{clip_config['id']} 没有对应的视频, 请检查本地资源")
-        # 创建一个透明的视频片段
-        blank_frame = create_blank_image(
-            int(540/1080 * resolution[1]),  # 使用相同的尺寸计算
-            int(540/1080 * resolution[1])   
-        )
-        video_clip = ImageClip(blank_frame).with_duration(clip_config['duration'])
-
-    # 计算位置
-    video_pos = (int(0.092 * resolution[0]), int(0.328 * resolution[1]))
     text_pos = (int(0.54 * resolution[0]), int(0.54 * resolution[1]))
 
     # 创建文字
     text_list = get_splited_text(clip_config['text'], text_max_bytes=inline_max_len)
-    txt_clip = TextClip(font=font_path, text="\n".join(text_list),
-                        method = "label",
-                        font_size=text_size,
-                        margin=(20, 20),
-                        interline=interline_size,
-                        text_align=horizontal_align,
-                        vertical_align="top",
-                        color=text_color,
-                        stroke_color = None if not enable_stroke else stroke_color,
-                        stroke_width = 0 if not enable_stroke else stroke_width,
-                        duration=clip_config['duration'])
-
-    # 视频叠放顺序，从下往上：背景底图，谱面预览，图片（带有透明通道），文字
-    composite_clip = CompositeVideoClip([
-            bg_video.with_position((0, 0)),  # 使用一个pure black的视频作为背景（此背景用于避免透明素材的通道的bug问题）
-            jacket_image.with_position(jacket_image_offset, relative=True),
-            video_clip.with_position((video_pos[0], video_pos[1])),
-            main_image.with_position((0, 0)),
-            txt_clip.with_position((text_pos[0], text_pos[1]))
-        ],
-        size=resolution,
-        use_bgclip=True  # 必须设置为true，否则其上透明素材的通道会失效（疑似为moviepy2.0的bug）
-    )
+    txt_clip = create_text_clip("\n".join(text_list), font_path, text_size,
+                                duration=clip_config['duration'],
+                                margin=(20, 20),
+                                interline=interline_size,
+                                text_align=horizontal_align,
+                                vertical_align="top",
+                                color=text_color,
+                                stroke_color = None if not enable_stroke else stroke_color,
+                                stroke_width = 0 if not enable_stroke else stroke_width)
+
+    # 叠放顺序，从下往上：纯黑底色，曲绘背景，谱面预览，图片（带有透明通道），文字
+    # 除谱面预览外的图层都不随时间变化，只在这里合成一次，逐帧渲染时仅需处理视频区域
+    bottom_image = flatten_static_layers([jacket_image.with_position(jacket_image_offset, relative=True)],
+                                         resolution, background=Image.new("RGB", resolution, (0, 0, 0)))
+    overlay_image = flatten_static_layers([main_image.with_position((0, 0)),
+                                           txt_clip.with_position((text_pos[0], text_pos[1]))],
+                                          resolution)
+    return bottom_image, overlay_image
+
+
+def get_chart_video_layout(clip_config, resolution):
+    """
+    校验片段的时间配置，并计算谱面视频的缩放、裁剪参数与在画面中的位置。
 
-    return composite_clip.with_duration(clip_config['duration'])
+    Returns:
+        dict: 谱面视频的布局信息，没有对应的视频时返回None
+    """
+    if not ('video' in clip_config and os.path.exists(clip_config['video'])):
+        print(f"Video Generator Warning:{clip_config['id']} 没有对应的视频, 请检查本地资源")
+        return None
+
+    # 先用探测索引中的信息检查时间配置，避免为无效配置打开视频
+    media_info = get_media_info(clip_config['video'])
+    if not media_info or not media_info['width'] or not media_info['height']:
+        raise IOError(f"无法读取视频{clip_config['video']}的信息，请检查文件是否完整.")
+    source_duration = media_info['duration']
+    # 添加调试信息
+    print(f"Start time: {clip_config['start']}, Clip duration: {source_duration}, End time: {clip_config['end']}")
+
+    # 检查 start_time 和 end_time 是否超出 clip 的持续时间
+    if clip_config['start'] < 0 or clip_config['start'] >= source_duration:
+        raise ValueError(f"片段开始时间 {clip_config['start']} 超出视频{clip_config['video']}的长度. 请检查该片段的时间配置.")
+    
+    if clip_config['end'] <= clip_config['start'] or clip_config['end'] > source_duration:
+        raise ValueError(f"片段结束时间 {clip_config['end']} 超出视频{clip_config['video']}的长度. 请检查该片段的时间配置.")
+
+    # 等比例缩放到画面高度的一半
+    video_height = int(0.5 * resolution[1])
+    video_width = int(media_info['width'] * video_height / media_info['height'])
+    # 检测谱面确认视频的视觉中心（每个视频只检测一次，结果保存在索引中）
+    circle = get_video_circle(clip_config['video'])
+    center_x = circle['center'][0] * video_width if circle and circle['detected'] else None
+    if center_x is None:
+        print("[Vision] Warning: 未能自动检测到谱面确认视频的中心，将使用默认的几何中心。")
+    crop_x = get_square_crop_x(center_x, video_width, video_height)
+    return {
+        "path": clip_config['video'],
+        "start": clip_config['start'],
+        "end": clip_config['end'],
+        "source_size": (media_info['width'], media_info['height']),
+        "scale": (video_width, video_height),
+        "crop": None if crop_x is None else (crop_x, 0, video_height, video_height),
+        "position": (int(0.092 * resolution[0]), int(0.328 * resolution[1])),
+        "has_audio": bool(media_info['sample_rate']),
+    }
 
 
-def get_video_preview_frame(clip_config, style_config, resolution, type="maimai", part="intro"):
-    if type == "maimai":
-        if part == "intro":
-            preview_clip = create_info_segment(clip_config, style_config, resolution)
-        elif part == "content":
-            preview_clip = create_video_segment(clip_config, style_config, resolution)
-        
-        frame = preview_clip.get_frame(t=1)
-        pil_img = Image.fromarray(frame.astype("uint8"))
-        return pil_img
-    else:
+def create_video_segment(clip_config, style_config, resolution):
+    print(f"正在合成视频片段: {clip_config['id']}")
+    bottom_image, overlay_image = build_content_static_layers(clip_config, style_config, resolution)
+
+    layout = get_chart_video_layout(clip_config, resolution)
+    if layout is None:
+        # 没有谱面视频时，视频区域保持为背景
+        return create_flattened_clip(bottom_image, overlay_image, None, (0, 0), clip_config['duration'])
+
+    # 缩放、裁剪与帧率转换交给ffmpeg完成，Python中只处理最终尺寸的画面
+    video_clip = FilteredVideoClip(layout['path'], layout['start'], layout['end'],
+                                   source_size=layout['source_size'],
+                                   scale=layout['scale'],
+                                   crop=layout['crop'],
+                                   fps=CONTENT_VIDEO_FPS,
+                                   audio=layout['has_audio'])
+    return create_flattened_clip(bottom_image, overlay_image, video_clip, layout['position'], clip_config['duration'])
+
+
+@lru_cache(maxsize=16)
+def _read_cached_frame(file_path, signature, t, size):
+    # signature参与缓存键，文件被替换后不会返回旧的画面
+    return read_frame_at(file_path, t, size)
+
+
+def read_preview_frame(file_path, t, size):
+    """读取视频t时刻缩放到size的画面，按文件签名在进程内缓存，返回的数组只读"""
+    return _read_cached_frame(os.path.abspath(file_path), tuple(file_signature(file_path)),
+                              round(t, 3), (int(size[0]), int(size[1])))
+
+
+def get_preview_resolution(resolution, max_width=PREVIEW_MAX_WIDTH):
+    """按比例缩小到宽度不超过max_width的预览分辨率"""
+    if resolution[0] <= max_width:
+        return tuple(resolution)
+    return max_width, int(resolution[1] * max_width / resolution[0])
+
+
+def compose_info_preview_frame(clip_config, style_config, resolution):
+    """合成开场/结尾片段在 PREVIEW_FRAME_TIME 时刻的画面，与 create_info_segment 的画面一致"""
+    intro_video_bg_path = style_config['asset_paths']['intro_video_bg']
+    media_info = get_media_info(intro_video_bg_path)
+    if not media_info or not media_info['width'] or not media_info['height']:
+        raise IOError(f"无法读取视频{intro_video_bg_path}的信息，请检查文件是否完整.")
+
+    # 背景视频循环播放，按宽度等比例缩放并调暗
+    t = PREVIEW_FRAME_TIME % media_info['duration'] if media_info['duration'] else 0
+    bg_size = (resolution[0], int(media_info['height'] * resolution[0] / media_info['width']))
+    bg_frame = np.minimum(255, 0.75 * read_preview_frame(intro_video_bg_path, t, bg_size)).astype(np.uint8)
+    frame = Image.new("RGB", resolution, (0, 0, 0))
+    frame.paste(Image.fromarray(bg_frame), (0, 0))
+
+    overlay_image = build_info_overlay(clip_config, style_config, resolution)
+    return Image.alpha_composite(frame.convert("RGBA"), overlay_image).convert("RGB")
+
+
+def compose_content_preview_frame(clip_config, style_config, resolution):
+    """合成谱面确认片段在 PREVIEW_FRAME_TIME 时刻的画面，与 create_video_segment 的画面一致"""
+    bottom_image, overlay_image = build_content_static_layers(clip_config, style_config, resolution)
+    frame = bottom_image.convert("RGB")
+
+    layout = get_chart_video_layout(clip_config, resolution)
+    if layout is not None:
+        t = min(layout['start'] + PREVIEW_FRAME_TIME, layout['end'] - 1 / CONTENT_VIDEO_FPS)
+        video_frame = read_preview_frame(layout['path'], t, layout['scale'])
+        if layout['crop']:
+            x, y, w, h = layout['crop']
+            video_frame = video_frame[y:y + h, x:x + w]
+        frame.paste(Image.fromarray(video_frame), layout['position'])
+
+    return Image.alpha_composite(frame.convert("RGBA"), overlay_image).convert("RGB")
+
+
+def get_video_preview_frame(clip_config, style_config, resolution, type="maimai", part="intro",
+                            preview_resolution=None):
+    """
+    生成样式预览图。直接用缓存的背景画面、乐曲封面与文字图层合成单帧，
+    不构建完整的视频片段，也不打开背景音乐。
+
+    画面先按输出分辨率合成，文字大小与排版与实际渲染的结果一致；
+    preview_resolution不为None时再缩小到该分辨率。
+    """
+    if type != "maimai":
         raise ValueError(f"Unsupported video type: {type}. Currently only 'maimai' is supported.")
+    if part == "intro":
+        pil_img = compose_info_preview_frame(clip_config, style_config, resolution)
+    elif part == "content":
+        pil_img = compose_content_preview_frame(clip_config, style_config, resolution)
+    else:
+        raise ValueError(f"Unsupported preview part: {part}")
+
+    if preview_resolution and tuple(preview_resolution) != pil_img.size:
+        pil_img = pil_img.resize(tuple(preview_resolution), Image.BILINEAR)
+    return pil_img
 
 
 def add_clip_with_transition(clips, new_clip, set_start=False, trans_time=1):
@@ -394,7 +631,7 @@ def create_full_video(resources, style_config, resolution,
     if 'intro' in resources:
         for clip_config in resources['intro']:
             clip = create_info_segment(clip_config, style_config, resolution)
-            clip = normalize_audio_volume(clip)
+            clip = normalize_audio_volume(clip, source=get_clip_audio_source(clip_config, "info", style_config))
             add_clip_with_transition(clips, clip, 
                                     set_start=True, 
                                     trans_time=trans_time)
@@ -411,19 +648,18 @@ def create_full_video(resources, style_config, resolution,
         if clip_config['id'] == main_resources[-1]['id'] and full_last_clip:
             start_time = clip_config['start']
             # 获取原始视频的长度（不是配置文件中配置的duration）
-            full_clip_duration = VideoFileClip(clip_config['video']).duration - 5
-            # 修改配置文件中的duration，因此下面创建视频片段时，会使用加长版duration
-            clip_config['duration'] = full_clip_duration - start_time
-            clip_config['end'] = full_clip_duration
+            full_clip_duration = get_media_duration(clip_config['video']) - 5
+            # 使用加长版duration创建视频片段（在副本上修改，不改动调用方的配置）
+            clip_config = dict(clip_config, duration=full_clip_duration - start_time, end=full_clip_duration)
 
             clip = create_video_segment(clip_config, style_config, resolution)  
-            clip = normalize_audio_volume(clip)
+            clip = normalize_audio_volume(clip, source=get_clip_audio_source(clip_config, "content", style_config))
 
             combined_start_time = clips[-1].end - trans_time
             ending_clips.append(clip)     
         else:
             clip = create_video_segment(clip_config, style_config, resolution)  
-            clip = normalize_audio_volume(clip)
+            clip = normalize_audio_volume(clip, source=get_clip_audio_source(clip_config, "content", style_config))
 
             add_clip_with_transition(clips, clip, 
                                     set_start=True, 
@@ -433,7 +669,7 @@ def create_full_video(resources, style_config, resolution,
     if 'ending' in resources:
         for clip_config in resources['ending']:
             clip = create_info_segment(clip_config, style_config, resolution)
-            clip = normalize_audio_volume(clip)
+            clip = normalize_audio_volume(clip, source=get_clip_audio_source(clip_config, "info", style_config))
             if full_last_clip:
                 ending_clips.append(clip)
             else:
@@ -481,7 +717,8 @@ def combine_full_video_from_existing_clips(video_clip_path, resolution, trans_ti
 
     for file in sorted_files:
         clip = VideoFileClip(os.path.join(video_clip_path, file))
-        clip = normalize_audio_volume(clip)
+        clip = normalize_audio_volume(clip, source={"file_path": os.path.join(video_clip_path, file),
+                                                    "start": 0, "end": None, "loop": False})
         
         if len(clips) == 0:
             clips.append(clip)
@@ -570,164 +807,280 @@ def get_combined_ending_clip(ending_clips, combined_start_time, trans_time):
     return combined_clip
 
 
-def render_all_video_clips(resources, style_config,
-                           video_output_path, video_res, video_bitrate,
-                           auto_add_transition=True, trans_time=1, force_render=False):
-    vfile_prefix = 0
+def get_default_render_workers():
+    """按CPU核心数确定并行渲染的进程数：逐帧合成为单线程，每个进程另外保留一个核心给编码器"""
+    return max(1, (os.cpu_count() or 1) // 2)
 
-    def modify_and_rend_clip(clip, config, prefix, auto_add_transition, trans_time):
-        output_file = os.path.join(video_output_path, f"{prefix}_{config['id']}.mp4")
-        
-        # 检查文件是否已经存在
-        if os.path.exists(output_file) and not force_render:
-            print(f"视频文件{output_file}已存在，跳过渲染。如果需要强制覆盖已存在的文件，请设置勾选force_render")
-            clip.close()
-            del clip
-            return
-        
-        clip = normalize_audio_volume(clip)
-        # 如果启用了自动添加转场效果，则在头尾加入淡入淡出
-        if auto_add_transition:
-            clip = clip.with_effects([
-                vfx.FadeIn(duration=trans_time),
-                vfx.FadeOut(duration=trans_time),
-                afx.AudioFadeIn(duration=trans_time),
-                afx.AudioFadeOut(duration=trans_time)
-            ])
-        # 直接渲染clip为视频文件
-        print(f"正在合成视频片段: {prefix}_{config['id']}.mp4")
-        clip.write_videofile(output_file, fps=30, threads=4, preset='ultrafast', bitrate=video_bitrate)
-        clip.close()
-        # 强制垃圾回收
-        del clip
 
-    if not 'main' in resources:
-        print("Error: 没有找到主视频片段的配置！请检查配置文件！")
-        return
+def get_encoder_threads(workers):
+    """将CPU核心平均分配给各渲染进程的编码器"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
 
-    if 'intro' in resources:
-        for clip_config in resources['intro']:
-            clip = create_info_segment(clip_config, style_config, video_res)
-            clip = modify_and_rend_clip(clip, clip_config, vfile_prefix, auto_add_transition, trans_time)
-            vfile_prefix += 1
 
-    main_resources = list(reversed(resources['main']))
-    for clip_config in main_resources:
-        clip = create_video_segment(clip_config, style_config, video_res)
-        clip = modify_and_rend_clip(clip, clip_config, vfile_prefix, auto_add_transition, trans_time)
+def build_render_jobs(resources):
+    """
+    按渲染顺序生成片段任务列表，文件名前缀依次为开场、倒序的主要片段与结尾。
 
-        vfile_prefix += 1
+    Returns:
+        list[tuple]: (文件名前缀, 片段配置, 片段类型 "info"/"content")
+    """
+    jobs = []
+    for clip_config in resources.get('intro', []):
+        jobs.append((len(jobs), clip_config, "info"))
+    for clip_config in reversed(resources['main']):
+        jobs.append((len(jobs), clip_config, "content"))
+    for clip_config in resources.get('ending', []):
+        jobs.append((len(jobs), clip_config, "info"))
+    return jobs
+
+
+def render_clip_job(job, style_config, video_output_path, video_res, video_bitrate,
+                    auto_add_transition=True, trans_time=1, force_render=False,
+                    backend="moviepy", encoder_threads=None, logger="bar",
+                    encoding_profile=DEFAULT_ENCODING_PROFILE, split_keyframes=False):
+    """
+    渲染单个片段任务，供顺序渲染与进程池并行渲染共用（需为模块级函数以便在子进程中调用）。
+    encoder_threads为None时使用编码配置中的线程数；split_keyframes为True时在片头与片尾的转场边界强制插入关键帧。
 
-    if 'ending' in resources:
-        for clip_config in resources['ending']:
-            clip = create_info_segment(clip_config, style_config, video_res)
-            clip = modify_and_rend_clip(clip, clip_config, vfile_prefix, auto_add_transition, trans_time)
-            vfile_prefix += 1
+    Returns:
+        dict: {"status": "success"/"skipped"/"error", "file": 输出文件名, "info": 说明}
+    """
+    prefix, config, clip_type = job
+    file_name = f"{prefix}_{config['id']}.mp4"
+    output_file = os.path.join(video_output_path, file_name)
 
+    # 检查文件是否已经存在
+    if os.path.exists(output_file) and not force_render:
+        print(f"视频文件{output_file}已存在，跳过渲染。如果需要强制覆盖已存在的文件，请设置勾选force_render")
+        return {"status": "skipped", "file": file_name, "info": f"视频片段{file_name}已存在，跳过渲染"}
 
-def render_one_video_clip(config, style_config, video_file_name, video_output_path, video_res, video_bitrate):
+    keyframes = get_split_keyframes(config['duration'], trans_time) if split_keyframes else None
+    try:
+        break_link(output_file)
+        if backend == "ffmpeg":
+            from utils.FFmpegRenderer import render_clip_ffmpeg
+            render_clip_ffmpeg(config, style_config, video_res, output_file, video_bitrate,
+                               fade_time=trans_time if auto_add_transition else None,
+                               clip_type=clip_type, threads=encoder_threads,
+                               encoding_profile=encoding_profile, keyframes=keyframes)
+        else:
+            if clip_type == "info":
+                clip = create_info_segment(config, style_config, video_res)
+            else:
+                clip = create_video_segment(config, style_config, video_res)
+            clip = normalize_audio_volume(clip, source=get_clip_audio_source(config, clip_type, style_config))
+            # 如果启用了自动添加转场效果，则在头尾加入淡入淡出
+            if auto_add_transition:
+                clip = clip.with_effects([
+                    vfx.FadeIn(duration=trans_time),
+                    vfx.FadeOut(duration=trans_time),
+                    afx.AudioFadeIn(duration=trans_time),
+                    afx.AudioFadeOut(duration=trans_time)
+                ])
+            # 直接渲染clip为视频文件
+            print(f"正在合成视频片段: {file_name}")
+            clip.write_videofile(output_file, logger=logger,
+                                 **get_write_videofile_kwargs(encoding_profile, video_bitrate, encoder_threads, keyframes))
+            clip.close()
+            # 强制垃圾回收
+            del clip
+        return {"status": "success", "file": file_name, "info": f"合成视频片段{file_name}成功"}
+    except Exception as e:
+        traceback.print_exc()
+        return {"status": "error", "file": file_name, "info": f"合成视频片段{file_name}时发生异常: {e}"}
+
+
+def render_all_video_clips(resources, style_config,
+                           video_output_path, video_res, video_bitrate,
+                           auto_add_transition=True, trans_time=1, force_render=False, backend="moviepy",
+                           workers=1, on_result=None, encoding_profile=DEFAULT_ENCODING_PROFILE,
+                           split_keyframes=False):
+    """
+    渲染全部片段，文件命名为 {prefix}_{id}.mp4。
+
+    每个片段的渲染指纹（配置、样式、分辨率、码率、编码配置、转场设置与输入文件）记录在渲染缓存索引中，
+    指纹未变化的已有片段直接复用，配置有变化的片段自动重新渲染；force_render为True时全部重新渲染。
+
+    Args:
+        workers (int): 并行渲染的进程数，1为在当前进程中依次渲染；
+            各进程的编码线程数按CPU核心数平均分配
+        on_result (callable): 每个片段完成后调用 on_result(file_name, result)
+        encoding_profile (str): 编码配置名称，见 ENCODING_PROFILES
+        split_keyframes (bool): 在转场边界强制插入关键帧，供 render_full_video_smart 流复制片段的中间部分
+
+    Returns:
+        list[dict]: 按渲染顺序排列的各片段结果，见 render_clip_job
+    """
+    if not 'main' in resources:
+        print("Error: 没有找到主视频片段的配置！请检查配置文件！")
+        return []
+
+    jobs = build_render_jobs(resources)
+    results = [None] * len(jobs)
+    render_cache = RenderCache(video_output_path)
+    fingerprints = {}
+
+    def report(index, result):
+        results[index] = result
+        if result['status'] == "success":
+            render_cache.record(os.path.join(video_output_path, result['file']), fingerprints[index])
+        print(f"[Render] ({sum(r is not None for r in results)}/{len(jobs)}) {result['info']}")
+        if on_result:
+            on_result(result['file'], result)
+
+    # 在主进程中检查渲染缓存，只将需要渲染的片段交给渲染进程
+    pending = []
+    for index, (prefix, config, clip_type) in enumerate(jobs):
+        file_name = f"{prefix}_{config['id']}.mp4"
+        fingerprints[index] = compute_clip_fingerprint(config, clip_type, style_config, video_res, video_bitrate,
+                                                       auto_add_transition, trans_time, backend,
+                                                       encoding_profile, split_keyframes)
+        if not force_render and render_cache.is_fresh(os.path.join(video_output_path, file_name), fingerprints[index]):
+            report(index, {"status": "skipped", "file": file_name, "info": f"视频片段{file_name}的配置未变化，复用已渲染的文件"})
+        else:
+            pending.append(index)
+
+    workers = max(1, min(workers, len(pending)))
+    # 未命中缓存的片段即使文件已存在也是过期的，需要覆盖
+    job_kwargs = dict(style_config=style_config, video_output_path=video_output_path,
+                      video_res=video_res, video_bitrate=video_bitrate,
+                      auto_add_transition=auto_add_transition, trans_time=trans_time,
+                      force_render=True, backend=backend, encoding_profile=encoding_profile,
+                      split_keyframes=split_keyframes,
+                      encoder_threads=get_encoder_threads(workers) if workers > 1 else None)
+
+    if workers == 1:
+        for index in pending:
+            report(index, render_clip_job(jobs[index], **job_kwargs))
+    else:
+        print(f"Info: 使用{workers}个进程并行渲染{len(pending)}个片段，每个进程{job_kwargs['encoder_threads']}个编码线程，"
+              f"编码配置：{encoding_profile}")
+        # 使用spawn启动子进程，避免在多线程的streamlit进程中fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(render_clip_job, jobs[index], logger=None, **job_kwargs): index
+                       for index in pending}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 子进程异常退出（如内存不足）
+                    file_name = f"{jobs[index][0]}_{jobs[index][1]['id']}.mp4"
+                    result = {"status": "error", "file": file_name, "info": f"合成视频片段{file_name}时发生异常: {e}"}
+                report(index, result)
+
+    refresh_save_at(video_output_path)
+    return results
+
+
+def render_one_video_clip(config, style_config, video_file_name, video_output_path, video_res, video_bitrate,
+                          backend="moviepy", encoding_profile=DEFAULT_ENCODING_PROFILE):
     print(f"正在合成视频片段: {video_file_name}")
     try:
-        clip = create_video_segment(config, style_config, video_res)
-        clip.write_videofile(os.path.join(video_output_path, video_file_name), 
-                             fps=30, threads=4, preset='ultrafast', bitrate=video_bitrate)
-        clip.close()
+        output_file = os.path.join(video_output_path, video_file_name)
+        break_link(output_file)
+        if backend == "ffmpeg":
+            from utils.FFmpegRenderer import render_clip_ffmpeg
+            render_clip_ffmpeg(config, style_config, video_res, output_file, video_bitrate,
+                               encoding_profile=encoding_profile)
+        else:
+            clip = create_video_segment(config, style_config, video_res)
+            clip.write_videofile(output_file, **get_write_videofile_kwargs(encoding_profile, video_bitrate))
+            clip.close()
+        refresh_save_at(video_output_path)
         return {"status": "success", "info": f"合成视频片段{video_file_name}成功"}
     except Exception as e:
         print(f"Error: 合成视频片段{video_file_name}时发生异常: {traceback.print_exc()}")
         return {"status": "error", "info": f"合成视频片段{video_file_name}时发生异常: {traceback.print_exc()}"}
    
     
+def get_full_video_checkpoint_dir(video_output_path, username):
+    """完整视频分段渲染的检查点目录"""
+    return os.path.join(video_output_path, f"{username}_FULL_VIDEO_checkpoints")
+
+
+def get_full_video_progress(video_output_path, username):
+    """
+    查询完整视频的渲染进度，可以在渲染进行中查询，也可以在中断后查询已完成的部分。
+
+    Returns:
+        dict: 见 summarize_checkpoint_progress，没有进行中或已完成的渲染时返回None
+    """
+    return get_checkpoint_progress(get_full_video_checkpoint_dir(video_output_path, username))
+
+
+def compute_full_video_fingerprint(configs, style_config, video_res, video_bitrate,
+                                   video_trans_enable, video_trans_time, full_last_clip, encoding_profile):
+    """完整视频的渲染指纹：按合成顺序组合各片段的指纹，以及是否将B1片段与结尾合并"""
+    clip_fingerprints = [compute_clip_fingerprint(config, clip_type, style_config, video_res, video_bitrate,
+                                                  video_trans_enable, video_trans_time, "moviepy", encoding_profile)
+                         for _, config, clip_type in build_render_jobs(configs)]
+    payload = {"clips": clip_fingerprints, "full_last_clip": full_last_clip}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def render_complete_full_video(configs, style_config, username,
                             video_output_path, video_res, video_bitrate,
-                            video_trans_enable, video_trans_time, full_last_clip):
-    print(f"正在合成完整视频")
+                            video_trans_enable, video_trans_time, full_last_clip,
+                            encoding_profile=DEFAULT_ENCODING_PROFILE, force_render=False,
+                            progress_callback=None):
+    """
+    一次合成完整视频，按 CHECKPOINT_SEGMENT_SECONDS 分段编码并记录检查点。
+    渲染中断（崩溃、内存不足或关闭页面）后以相同的配置再次调用，会从第一个未完成的段继续，
+    最后以流复制的方式拼接各段，输出与一次性渲染相同。渲染进度见 get_full_video_progress。
+    """
+    print("正在合成完整视频")
+    if not 'main' in configs:
+        print("Error: 没有找到主视频片段的合成！请检查配置文件！")
+        return {"status": "error", "info": "没有找到主视频片段的配置！"}
     try:
-        final_video = create_full_video(configs, 
-                                        style_config,
-                                        resolution=video_res, 
-                                        auto_add_transition=video_trans_enable, 
-                                        trans_time=video_trans_time, 
-                                        full_last_clip=full_last_clip)
-        final_video.write_videofile(os.path.join(video_output_path, f"{username}_FULL_VIDEO.mp4"), 
-                                    fps=30, threads=4, preset='ultrafast', bitrate=video_bitrate)
-        final_video.close()
-        return {"status": "success", "info": f"合成完整视频成功"}
+        fingerprint = compute_full_video_fingerprint(configs, style_config, video_res, video_bitrate,
+                                                     video_trans_enable, video_trans_time, full_last_clip,
+                                                     encoding_profile)
+        progress = render_clip_checkpointed(
+            lambda: create_full_video(configs,
+                                      style_config,
+                                      resolution=video_res,
+                                      auto_add_transition=video_trans_enable,
+                                      trans_time=video_trans_time,
+                                      full_last_clip=full_last_clip),
+            os.path.join(video_output_path, f"{username}_FULL_VIDEO.mp4"),
+            get_full_video_checkpoint_dir(video_output_path, username),
+            fingerprint,
+            get_write_videofile_kwargs(encoding_profile, video_bitrate),
+            force_render=force_render,
+            progress_callback=progress_callback)
+        refresh_save_at(video_output_path)
+        if progress['reused_output']:
+            return {"status": "success", "info": "完整视频的配置未变化，复用已渲染的文件"}
+        if progress['rendered_segments'] < progress['total_segments']:
+            resumed = progress['total_segments'] - progress['rendered_segments']
+            return {"status": "success", "info": f"合成完整视频成功（复用了{resumed}/{progress['total_segments']}段已渲染的内容）"}
+        return {"status": "success", "info": "合成完整视频成功"}
     except Exception as e:
-        print(f"Error: 合成完整视频时发生异常: {traceback.print_exc()}")
-        return {"status": "error", "info": f"合成完整视频时发生异常: {traceback.print_exc()}"}
+        traceback.print_exc()
+        return {"status": "error", "info": f"合成完整视频时发生异常: {e}"}
 
 
 def combine_full_video_direct(video_clip_path):
+    """
+    以流复制的方式按文件名序号拼接全部已渲染的片段，输出为 final_output.mp4。
+    只拼接 {序号}_{id}.mp4 格式的片段文件，之前输出的完整视频不会被包含在内。
+    """
     print("[Info] --------------------开始拼接视频-------------------")
-    video_files = [f for f in os.listdir(video_clip_path) if f.endswith(".mp4")]
+    video_clip_path = os.path.abspath(video_clip_path)
+    video_files = [f for f in os.listdir(video_clip_path) if RENDERED_CLIP_PATTERN.match(f)]
     sorted_files = sort_video_files(video_files)
     
     if not sorted_files:
         raise ValueError("Error: 没有有效的视频片段文件！")
 
-    # 创建临时目录存放 ts 文件
-    temp_dir = os.path.join(video_clip_path, "temp_ts")
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    try:
-        # 1. 创建MP4文件列表
-        mp4_list_file = os.path.join(video_clip_path, "mp4_files.txt")
-        with open(mp4_list_file, 'w', encoding='utf-8') as f:
-            for file in sorted_files:
-                # 使用正斜杠替换反斜杠，并使用相对路径
-                full_path = os.path.join(video_clip_path, file).replace('\\', '/')
-                f.write(f"file '{full_path}'\n")
-
-        # 2. 创建TS文件列表并转换视频
-        ts_list_file = os.path.join(video_clip_path, "ts_files.txt")
-        with open(ts_list_file, 'w', encoding='utf-8') as f:
-            for i, file in enumerate(sorted_files):
-                ts_name = f"{i:04d}.ts"
-                ts_path = os.path.join(temp_dir, ts_name)
-                
-                # 转换MP4为TS
-                cmd = [
-                    'ffmpeg', '-y',
-                    '-i', os.path.join(video_clip_path, file),
-                    '-c', 'copy',
-                    '-bsf:v', 'h264_mp4toannexb',
-                    '-f', 'mpegts',
-                    ts_path
-                ]
-                subprocess.run(cmd, check=True)
-                
-                # 写入TS文件相对路径，使用正斜杠
-                relative_ts_path = os.path.join('temp_ts', ts_name).replace('\\', '/')
-                f.write(f"file '{relative_ts_path}'\n")
-
-        # 3. 拼接TS文件并输出为MP4
-        output_path = os.path.join(video_clip_path, "final_output.mp4")
-        
-        # 切换到视频目录执行拼接命令
-        current_dir = os.getcwd()
-        os.chdir(video_clip_path)
-        
-        cmd = [
-            'ffmpeg', '-y',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', 'ts_files.txt',  # 使用相对路径
-            '-c', 'copy',
-            'final_output.mp4'  # 使用相对路径
-        ]
-        
-        subprocess.run(cmd, check=True)
-        os.chdir(current_dir)  # 恢复原始工作目录
-        print("视频拼接完成")
-        
-    finally:
-        # 清理临时文件
-        if os.path.exists(temp_dir):
-            for file in os.listdir(temp_dir):
-                os.remove(os.path.join(temp_dir, file))
-            os.rmdir(temp_dir)
+    output_path = os.path.join(video_clip_path, "final_output.mp4")
+    break_link(output_path)
+    mode = concat_videos([os.path.join(video_clip_path, f) for f in sorted_files], output_path)
+    print(f"视频拼接完成（{len(sorted_files)}个片段，{'直接拼接MP4' if mode == 'mp4' else '转封装为NUT后拼接'}）")
 
+    refresh_save_at(video_clip_path)
     return output_path
 
 
@@ -757,5 +1110,6 @@ def combine_full_video_ffmpeg_concat_gl(video_clip_path, resolution, trans_name=
 
     os.system(cmd)
 
+    refresh_save_at(video_clip_path)
     return output_path
 
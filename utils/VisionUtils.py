@@ -1,7 +1,63 @@
+import time
 import cv2
 import numpy as np
 import traceback
 
+from utils.CacheUtils import FileKeyedIndex
+from utils.FFmpegReader import read_frame_at, read_frames_at
+from utils.MediaProbe import get_media_info
+
+CIRCLE_CENTER_INDEX_FILE = "./videos/circle_center_index.json"
+# 检测统一在该高度的帧上进行，结果以相对坐标保存，与渲染分辨率无关
+CIRCLE_ANALYSIS_HEIGHT = 540
+# 计算置信度时在圆周上采样的点数，以及允许的边缘偏差（像素）
+CONFIDENCE_SAMPLES = 180
+CONFIDENCE_TOLERANCE = 2
+# 谱面确认画面中圆形半径占帧高的范围
+CIRCLE_RADIUS_RANGE = (0.4, 0.52)
+# 多帧检测：采样帧数与采样位置（占视频时长的比例），在低分辨率帧上粗检测，再在分析分辨率上精修
+MULTI_FRAME_SAMPLES = 5
+MULTI_FRAME_SPAN = (0.15, 0.85)
+COARSE_ANALYSIS_HEIGHT = 180
+# 圆心的合理范围：纵向偏离中线不超过帧高的该比例，横向需保证整个圆都在画面内
+CENTER_Y_TOLERANCE = 0.12
+# 圆心偏差超过半径的该比例时视为不同的结果，与多数帧不一致的结果（如转场画面中的误检）被排除
+OUTLIER_TOLERANCE = 0.05
+# 至少有该数量的采样帧给出一致的圆心才采用多帧检测的结果
+MIN_VOTES = 2
+# 低分辨率下半径的估计误差较大，精修时在该比例范围内重新搜索半径，并在霍夫圆心附近逐像素搜索圆心
+REFINE_RADIUS_MARGIN = 0.1
+REFINE_CENTER_RANGE = 3
+CIRCLE_DETECTION_METHODS = ["multi_frame", "single_frame"]
+
+_circle_index = FileKeyedIndex(CIRCLE_CENTER_INDEX_FILE)
+
+
+def get_edge_map(gray):
+    """Canny边缘按允许的偏差膨胀后的图像"""
+    edges = cv2.Canny(gray, 50, 150)
+    return cv2.dilate(edges, np.ones((2 * CONFIDENCE_TOLERANCE + 1,) * 2, np.uint8))
+
+
+def get_circle_confidence(gray, x, y, r, edges=None):
+    """圆周上落在图像边缘附近的采样点比例（0~1），用于衡量检测结果的可信度"""
+    if edges is None:
+        edges = get_edge_map(gray)
+    return float(get_ring_scores(edges, x, y, [r])[0])
+
+
+def get_ring_scores(edges, x, y, radii):
+    """同一圆心、多个半径的置信度（与 get_circle_confidence 相同的计算），返回与radii对应的数组"""
+    angles = np.linspace(0, 2 * np.pi, CONFIDENCE_SAMPLES, endpoint=False)
+    radii = np.asarray(radii, dtype=float)[:, None]
+    xs = np.round(x + radii * np.cos(angles)).astype(int)
+    ys = np.round(y + radii * np.sin(angles)).astype(int)
+    inside = (xs >= 0) & (xs < edges.shape[1]) & (ys >= 0) & (ys < edges.shape[0])
+    hits = np.zeros(xs.shape, dtype=bool)
+    hits[inside] = edges[ys[inside], xs[inside]] > 0
+    return hits.sum(axis=1) / CONFIDENCE_SAMPLES
+
+
 def find_circle_center(frame, debug=False, name="video"):
     """
     使用霍夫圆变换检测视频帧中圆形区域的中心。
@@ -12,6 +68,20 @@ def find_circle_center(frame, debug=False, name="video"):
     Returns:
         tuple: (x, y) 格式的圆形中心坐标。如果未检测到，则返回None。
     """
+    circle = detect_circle(frame, debug=debug, name=name)
+    return None if circle is None else circle[:2]
+
+
+def detect_circle(frame, debug=False, name="video"):
+    """
+    使用霍夫圆变换检测视频帧中的圆形区域。
+
+    Args:
+        frame (numpy.ndarray): 视频帧 (RGB格式)。
+
+    Returns:
+        tuple: (x, y, 半径, 置信度)。如果未检测到，则返回None。
+    """
     video_height = frame.shape[0]
     print(f"[Vision] 视频帧高度: {video_height}px")
     try:
@@ -21,6 +91,7 @@ def find_circle_center(frame, debug=False, name="video"):
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         # 使用中值滤波降噪
         gray = cv2.medianBlur(gray, 5)
+        blurred = gray
         # 二值化处理，增强边缘轮廓的对比度
         gray = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                      cv2.THRESH_BINARY, 11, 2)
@@ -41,8 +112,8 @@ def find_circle_center(frame, debug=False, name="video"):
         circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1, 
                                    minDist=video_height, # 假设屏幕上只有一个主圆形
                                    param1=100, param2=30, 
-                                   minRadius=int(video_height * 0.4), # 防止识别出bga中过小的圆
-                                   maxRadius=int(video_height * 0.52))
+                                   minRadius=int(video_height * CIRCLE_RADIUS_RANGE[0]), # 防止识别出bga中过小的圆
+                                   maxRadius=int(video_height * CIRCLE_RADIUS_RANGE[1]))
         
         if circles is not None:
 
@@ -60,8 +131,9 @@ def find_circle_center(frame, debug=False, name="video"):
             # 提取第一个被检测到的圆的中心坐标 (x, y)
             (x, y, r) = circles[0]
 
-            print(f"检测到圆形中心: ({x}, {y}), 半径: {r}")
-            return (x, y)
+            confidence = get_circle_confidence(blurred, x, y, r)
+            print(f"检测到圆形中心: ({x}, {y}), 半径: {r}, 置信度: {confidence:.2f}")
+            return (x, y, r, confidence)
             
     except Exception as e:
         print(f"[Vision] Warning: 自动检测谱面确认视频的中心失败 ，错误详情： {str(e)}")
@@ -71,6 +143,235 @@ def find_circle_center(frame, debug=False, name="video"):
     return None
 
 
+def _preprocess_frame(frame, blur_size=5, block_size=11):
+    """
+    返回 (中值滤波后的灰度图, 自适应二值化图)，前者用于计算置信度，后者用于霍夫圆变换。
+    低分辨率帧上使用更小的滤波核，与分析分辨率上的处理效果相当。
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    blurred = cv2.medianBlur(gray, blur_size)
+    binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, block_size, 2)
+    return blurred, binary
+
+
+def detect_circle_coarse(frame):
+    """
+    在低分辨率帧上检测圆形，只保留圆心位于合理区域内的候选：纵向接近画面中线、横向整个圆都在画面内。
+
+    Returns:
+        tuple: (x, y, 半径, 置信度)，以该帧的像素为单位。未检测到时返回None
+    """
+    h, w = frame.shape[:2]
+    blurred, binary = _preprocess_frame(frame, blur_size=3, block_size=5)
+    min_radius = int(h * CIRCLE_RADIUS_RANGE[0])
+    max_radius = int(np.ceil(h * CIRCLE_RADIUS_RANGE[1]))
+    # 降低圆心间距与累加器阈值以获得多个候选，再按合理区域与置信度筛选
+    circles = cv2.HoughCircles(binary, cv2.HOUGH_GRADIENT, dp=1, minDist=h * 0.1,
+                               param1=100, param2=15, minRadius=min_radius, maxRadius=max_radius)
+    if circles is None:
+        return None
+    best = None
+    for x, y, r in circles[0, :]:
+        if abs(y - h / 2) > h * CENTER_Y_TOLERANCE or x - r < -CONFIDENCE_TOLERANCE \
+                or x + r > w + CONFIDENCE_TOLERANCE:
+            continue
+        confidence = get_circle_confidence(blurred, x, y, r)
+        if best is None or confidence > best[3]:
+            best = (float(x), float(y), float(r), confidence)
+    return best
+
+
+def _refine_circle(frame, x, y, r):
+    """
+    在分析分辨率的帧上精修候选圆：只在候选圆附近裁剪出的区域内做霍夫圆变换确定圆心，
+    再在该圆心与粗检测半径附近逐像素搜索圆周与边缘重合最多的组合。
+
+    Returns:
+        tuple: (x, y, 半径, 置信度)，精修失败时返回None
+    """
+    h, w = frame.shape[:2]
+    margin = r * (1 + REFINE_RADIUS_MARGIN) + 4 * CONFIDENCE_TOLERANCE
+    x1, y1 = max(int(x - margin), 0), max(int(y - margin), 0)
+    x2, y2 = min(int(np.ceil(x + margin)), w), min(int(np.ceil(y + margin)), h)
+    blurred, binary = _preprocess_frame(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+    min_radius = int(r * (1 - REFINE_RADIUS_MARGIN))
+    max_radius = int(np.ceil(r * (1 + REFINE_RADIUS_MARGIN)))
+    circles = cv2.HoughCircles(binary, cv2.HOUGH_GRADIENT, dp=1, minDist=max(y2 - y1, x2 - x1),
+                               param1=100, param2=30, minRadius=min_radius, maxRadius=max_radius)
+    if circles is None:
+        return None
+    cx, cy = (float(v) for v in circles[0, 0, :2])
+    if np.hypot(cx + x1 - x, cy + y1 - y) > r * REFINE_RADIUS_MARGIN:
+        return None
+
+    # 在霍夫圆心附近逐像素搜索圆心与半径，取圆周与边缘重合最多的组合；
+    # 边缘膨胀后相邻的几个位置得分相同，取得分最高的各组合的中位数
+    edges = get_edge_map(blurred)
+    radii = np.arange(min_radius, max_radius + 1)
+    offsets = range(-REFINE_CENTER_RANGE, REFINE_CENTER_RANGE + 1)
+    results = [(cx + dx, cy + dy, radius, score)
+               for dx in offsets for dy in offsets
+               for radius, score in zip(radii, get_ring_scores(edges, cx + dx, cy + dy, radii))]
+    best_score = max(result[3] for result in results)
+    bx, by, br = np.median([result[:3] for result in results if result[3] >= best_score], axis=0)
+    return float(bx) + x1, float(by) + y1, float(br), float(best_score)
+
+
+def detect_circle_multi_frame(video_path, media_info, samples=MULTI_FRAME_SAMPLES):
+    """
+    在多个低分辨率采样帧上检测圆形，取多数帧一致的圆心的中位数，再在分析分辨率上围绕候选位置精修。
+    单帧检测遇到转场、闪白等画面时容易失败或误检，多帧取中位数可以排除这些帧的影响。
+
+    采样帧取各采样时刻之前最近的关键帧，由一个ffmpeg进程解码并直接缩放到低分辨率；
+    关键帧稀疏的视频中多个时刻可能取到同一帧，重复的帧只计一次。
+
+    Returns:
+        dict: {"center": [x/宽, y/高], "radius": r/高, "confidence", "frame_time", "votes"}，
+              votes为与结果一致的采样帧比例。未检测到时返回None
+    """
+    width, height, duration = media_info['width'], media_info['height'], media_info['duration']
+    coarse_height = COARSE_ANALYSIS_HEIGHT
+    coarse_width = int(round(width * coarse_height / height / 2)) * 2
+    times = np.linspace(duration * MULTI_FRAME_SPAN[0], duration * MULTI_FRAME_SPAN[1], samples)
+    frames = read_frames_at(video_path, times, (coarse_width, coarse_height), accurate=False)
+
+    # 统一换算为以帧高为单位的坐标，横纵方向的偏差可以直接比较
+    candidates = []
+    unique_frames = []
+    for t, frame in zip(times, frames):
+        if any(np.array_equal(frame, seen) for seen in unique_frames):
+            continue
+        unique_frames.append(frame)
+        circle = detect_circle_coarse(frame)
+        if circle is not None:
+            x, y, r, confidence = circle
+            candidates.append((float(t), x / coarse_height, y / coarse_height, r / coarse_height, confidence))
+    if len(candidates) < min(MIN_VOTES, len(unique_frames)):
+        return None
+
+    # 低分辨率下的半径误差较大，只按圆心判断各帧结果是否一致，取一致帧数最多的一组
+    centers = np.array([c[1:3] for c in candidates])
+    tolerance = OUTLIER_TOLERANCE * np.median([c[3] for c in candidates])
+    neighbours = np.hypot(*(centers[:, None, :] - centers[None, :, :]).transpose(2, 0, 1)) <= tolerance
+    anchor = max(range(len(candidates)),
+                 key=lambda i: (neighbours[i].sum(), sum(c[4] for c, n in zip(candidates, neighbours[i]) if n)))
+    inliers = [c for c, n in zip(candidates, neighbours[anchor]) if n]
+    if len(inliers) < min(MIN_VOTES, len(unique_frames)):
+        return None
+    x, y, r = np.median(np.array([c[1:4] for c in inliers]), axis=0)
+    confidence = float(np.median([c[4] for c in inliers]))
+    frame_time = max(inliers, key=lambda c: c[4])[0]
+
+    # 在分析分辨率上精修：只处理候选圆附近的区域，失败时保留粗检测的结果
+    analysis_height = CIRCLE_ANALYSIS_HEIGHT
+    analysis_width = int(round(width * analysis_height / height / 2)) * 2
+    try:
+        frame = read_frames_at(video_path, [frame_time], (analysis_width, analysis_height), accurate=False)[0]
+        refined = _refine_circle(frame, x * analysis_height, y * analysis_height, r * analysis_height)
+    except Exception as e:
+        print(f"[Vision] Warning: 精修圆形位置失败，将使用低分辨率检测结果：{e}")
+        refined = None
+    if refined is not None:
+        rx, ry, rr, confidence = refined
+        x, y, r = rx / analysis_height, ry / analysis_height, rr / analysis_height
+
+    return {"center": [float(x) * height / width, float(y)], "radius": float(r),
+            "confidence": round(confidence, 3), "frame_time": round(frame_time, 3),
+            "votes": round(len(inliers) / len(unique_frames), 3)}
+
+
+def detect_circle_single_frame(video_path, media_info):
+    """在分析分辨率下检测视频中间一帧，返回值与 detect_circle_multi_frame 相同（不含votes）"""
+    analysis_height = CIRCLE_ANALYSIS_HEIGHT
+    analysis_width = int(media_info['width'] * analysis_height / media_info['height'])
+    # 从视频中间提取一帧用于分析
+    frame_time = media_info['duration'] / 2
+    frame = read_frame_at(video_path, frame_time, (analysis_width, analysis_height))
+    circle = detect_circle(frame)
+    if circle is None:
+        return None
+    x, y, r, confidence = circle
+    return {"center": [float(x) / analysis_width, float(y) / analysis_height],
+            "radius": float(r) / analysis_height,
+            "confidence": round(confidence, 3), "frame_time": round(frame_time, 3)}
+
+
+def get_video_circle(video_path, refresh=False, method="multi_frame"):
+    """
+    获取谱面确认视频中圆形区域的位置，每个视频只检测一次。
+
+    结果按 路径+大小+修改时间 保存在 CIRCLE_CENTER_INDEX_FILE 中，坐标与半径以帧宽高的比例表示；
+    未检测到圆形的视频同样会被记录，之后不再重复检测。缓存的结果由其他检测方式得到时会重新检测。
+
+    Args:
+        method (str): "multi_frame" 为多帧低分辨率检测，"single_frame" 为只检测中间一帧
+
+    Returns:
+        dict: {"detected", "method", "center": [x/宽, y/高], "radius": r/高, "confidence", "frame_time"}，
+              无法读取视频时返回None
+    """
+    if method not in CIRCLE_DETECTION_METHODS:
+        raise ValueError(f"不支持的检测方式 {method}，可选值：{CIRCLE_DETECTION_METHODS}")
+    if not refresh:
+        entry = _circle_index.get(video_path)
+        # 未记录检测方式的条目由早期的单帧检测得到
+        if entry is not None and entry.get("method", "single_frame") == method:
+            return entry
+
+    media_info = get_media_info(video_path)
+    if not media_info or not media_info['width'] or not media_info['height'] or media_info['duration'] <= 0:
+        return None
+    detect = detect_circle_multi_frame if method == "multi_frame" else detect_circle_single_frame
+    try:
+        circle = detect(video_path, media_info)
+    except Exception as e:
+        print(f"[Vision] Warning: 读取视频 {video_path} 的画面失败：{e}")
+        return None
+
+    entry = {"detected": circle is not None, "method": method, "center": None, "radius": None,
+             "confidence": 0.0, "frame_time": None}
+    if circle is not None:
+        entry.update(circle)
+    _circle_index.set(video_path, entry)
+    return entry
+
+
+def benchmark_circle_detection(video_paths):
+    """
+    对同一组视频分别用单帧与多帧方式检测圆形（不读写缓存），比较耗时与结果。
+
+    Returns:
+        list[dict]: 每个视频两种方式的耗时（秒）、检测结果，以及两者圆心的偏差（以帧高为单位）
+    """
+    results = []
+    for video_path in video_paths:
+        media_info = get_media_info(video_path)
+        if not media_info or not media_info['width'] or not media_info['height']:
+            print(f"[Vision] Warning: 无法读取视频信息，跳过 {video_path}")
+            continue
+        row = {"video": video_path}
+        for method, detect in (("single_frame", detect_circle_single_frame),
+                               ("multi_frame", detect_circle_multi_frame)):
+            start = time.perf_counter()
+            row[method] = detect(video_path, media_info)
+            row[f"{method}_time"] = round(time.perf_counter() - start, 3)
+        single, multi = row["single_frame"], row["multi_frame"]
+        row["center_offset"] = None
+        if single and multi:
+            aspect = media_info['width'] / media_info['height']
+            row["center_offset"] = round(float(np.hypot((single["center"][0] - multi["center"][0]) * aspect,
+                                                        single["center"][1] - multi["center"][1])), 4)
+        results.append(row)
+        print(f"Info: {video_path} single_frame {row['single_frame_time']:.3f}s, "
+              f"multi_frame {row['multi_frame_time']:.3f}s, center offset {row['center_offset']}")
+    return results
+
+
+def prune_circle_index():
+    return _circle_index.prune()
+
+
 def draw_center_marker(frame, center_point, crop_box=None):
     """
     在视频帧上绘制中心标记和裁剪框以供调试。
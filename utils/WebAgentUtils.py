@@ -1,8 +1,12 @@
-import json
 import os
 import random
 
 from utils.video_crawler import PurePytubefixDownloader, BilibiliDownloader
+from utils.record_filters import FILTER_PRESETS
+from utils.StorageUtils import dump_json
+from utils.MediaProbe import get_media_info
+from utils.VisionUtils import get_video_circle
+from utils.SaveCatalog import refresh_save_at
 
 def get_keyword(downloader_type, title_name, level_index, type):
     match level_index:
@@ -82,6 +86,10 @@ def download_one_video(downloader, song, video_download_path, high_res=False):
                               video_download_path, 
                               high_res=high_res,
                               p_index=video_info.get('p_index', 0))
+    # 下载完成后立即写入媒体探测与圆心检测索引，后续编辑、预览与渲染无需再次探测
+    if os.path.exists(video_path):
+        get_media_info(video_path)
+        get_video_circle(video_path)
     return {"status": "success", "info": f"下载{clip_name}完成"}
 
 
@@ -168,7 +176,7 @@ def st_gene_resource_config(records, config_sub_type,
     match config_sub_type:
         case "best":
             main_clips.reverse()
-        case "ap":
+        case _ if config_sub_type in FILTER_PRESETS:
             main_clips.reverse()
         case "custom":
             pass
@@ -178,7 +186,7 @@ def st_gene_resource_config(records, config_sub_type,
 
     video_config_data["main"] = main_clips
 
-    with open(output_file, 'w', encoding="utf-8") as file:
-        json.dump(video_config_data, file, ensure_ascii=False, indent=4)
+    dump_json(output_file, video_config_data)
+    refresh_save_at(output_file)
 
     return video_config_data
@@ -1,10 +1,10 @@
 import subprocess
-import json
 from pathlib import Path
+from utils.MediaProbe import get_media_info
 
 def get_video_codec(file_path: str) -> str:
     """
-    使用 ffprobe 获取视频的编码格式
+    获取视频的编码格式（读取媒体探测索引，新文件只会调用一次ffprobe）
     
     Args:
         file_path (str): 视频文件路径
@@ -12,26 +12,11 @@ def get_video_codec(file_path: str) -> str:
     Returns:
         str: 视频编码格式，如果获取失败则返回空字符串
     """
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',  # 只显示错误信息
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name',
-            '-of', 'json',
-            str(file_path)
-        ]
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        data = json.loads(result.stdout)
-        return data['streams'][0]['codec_name']
-    except Exception as e:
-        print(f"获取视频编码信息失败: {str(e)}")
+    info = get_media_info(file_path)
+    if not info:
+        print(f"获取视频编码信息失败: {file_path}")
         return ""
+    return info['video_codec']
 
 def needs_conversion(file_path: Path) -> bool:
     """
@@ -0,0 +1,197 @@
+import codecs
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class RecordStreamParser:
+    """
+    增量解析形如 {"username": ..., "records": [{...}, {...}, ...], ...} 的JSON文档。
+
+    数据可以按任意大小的分块传入，顶层字段与records数组中的每条记录在完整到达后立即回调，
+    内存中只保留尚未解析完的分块与顶层的非records字段。
+    如果提供了snapshot_file，会同时按原字段顺序写出一份紧凑格式的JSON快照。
+    """
+    def __init__(self, on_record=None, on_field=None, records_key="records", snapshot_file=None):
+        self.on_record = on_record
+        self.on_field = on_field
+        self.records_key = records_key
+        self.snapshot_file = snapshot_file
+        self.fields = {}
+        self.record_count = 0
+
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # 状态: start -> key -> colon -> value -> comma -> ... -> end
+        # 进入records数组后: array_start -> item -> item_comma -> ... -> comma
+        self._state = "start"
+        self._current_key = None
+        self._fields_written = 0
+        self._finished = False
+
+    def feed_bytes(self, chunk):
+        self.feed(self._text_decoder.decode(chunk))
+
+    def feed(self, text):
+        if self._finished:
+            if text.strip(_WHITESPACE):
+                self._error("顶层对象结束后仍有多余数据")
+            return
+        self._buffer += text
+        self._parse(final=False)
+        # 丢弃已解析的部分，避免缓冲区随文档增长
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+    def close(self):
+        """结束输入，检查文档是否完整"""
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        self._parse(final=True)
+        if not self._finished:
+            self._error("JSON文档不完整")
+        if self._buffer[self._pos:].strip(_WHITESPACE):
+            self._error("顶层对象结束后仍有多余数据")
+        return self.fields
+
+    def _error(self, msg):
+        raise json.JSONDecodeError(f"流式解析失败：{msg}", self._buffer, self._pos)
+
+    def _skip_whitespace(self):
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return pos < len(buffer)
+
+    def _decode_value(self, final):
+        """尝试从当前位置解析一个完整的JSON值，数据不足时返回(False, None)"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return False, None
+        # 数字等标量位于缓冲区末尾时可能尚未接收完整，需要等待后续数据
+        if end == len(self._buffer) and not final:
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _write(self, text):
+        if self.snapshot_file is not None:
+            self.snapshot_file.write(text)
+
+    def _write_field_prefix(self, key):
+        if self._fields_written:
+            self._write(",")
+        self._write(json.dumps(key, ensure_ascii=False) + ":")
+        self._fields_written += 1
+
+    def _parse(self, final):
+        while not self._finished and self._skip_whitespace():
+            char = self._buffer[self._pos]
+            state = self._state
+
+            if state == "start":
+                if char != "{":
+                    self._error("顶层数据不是JSON对象")
+                self._pos += 1
+                self._write("{")
+                self._state = "key"
+
+            elif state == "key":
+                if char == "}" and not self.fields and not self._fields_written:
+                    self._pos += 1
+                    self._end_document()
+                    continue
+                if char != '"':
+                    self._error("期望字段名")
+                ok, key = self._decode_value(final)
+                if not ok:
+                    return
+                self._current_key = key
+                self._state = "colon"
+
+            elif state == "colon":
+                if char != ":":
+                    self._error("期望 ':'")
+                self._pos += 1
+                self._state = "value"
+
+            elif state == "value":
+                if self._current_key == self.records_key and char == "[":
+                    self._pos += 1
+                    self._write_field_prefix(self._current_key)
+                    self._write("[")
+                    self._state = "array_start"
+                    continue
+                ok, value = self._decode_value(final)
+                if not ok:
+                    return
+                self.fields[self._current_key] = value
+                self._write_field_prefix(self._current_key)
+                self._write(json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+                if self.on_field:
+                    self.on_field(self._current_key, value)
+                self._state = "comma"
+
+            elif state == "comma":
+                self._pos += 1
+                if char == ",":
+                    self._state = "key"
+                elif char == "}":
+                    self._end_document()
+                else:
+                    self._error("期望 ',' 或 '}'")
+
+            elif state in ("array_start", "item"):
+                if char == "]" and state == "array_start":
+                    self._pos += 1
+                    self._end_records()
+                    continue
+                ok, record = self._decode_value(final)
+                if not ok:
+                    return
+                if self.record_count:
+                    self._write(",")
+                self._write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                self.record_count += 1
+                if self.on_record:
+                    self.on_record(record)
+                self._state = "item_comma"
+
+            elif state == "item_comma":
+                self._pos += 1
+                if char == ",":
+                    self._state = "item"
+                elif char == "]":
+                    self._end_records()
+                else:
+                    self._error("期望 ',' 或 ']'")
+
+    def _end_records(self):
+        self._write("]")
+        self._state = "comma"
+
+    def _end_document(self):
+        self._write("}")
+        self._finished = True
+
+
+def stream_json_records(chunks, on_record=None, snapshot_file=None, records_key="records"):
+    """
+    从字节分块的可迭代对象（如 response.iter_content()）中流式解析记录。
+
+    Returns:
+        RecordStreamParser: 解析完成的解析器，fields 为除records外的顶层字段
+    """
+    parser = RecordStreamParser(on_record=on_record, records_key=records_key, snapshot_file=snapshot_file)
+    for chunk in chunks:
+        if chunk:
+            parser.feed_bytes(chunk)
+    parser.close()
+    return parser
@@ -0,0 +1,257 @@
+import heapq
+from itertools import count
+
+################################################
+# Record status ranks
+################################################
+# fc/fs 字段的强弱排序，用于"达到某种状态及以上"的筛选
+FC_STATUS_RANK = {
+    "": 0,
+    "fc": 1,
+    "fcp": 2,
+    "ap": 3,
+    "app": 4,
+}
+
+FS_STATUS_RANK = {
+    "": 0,
+    "sync": 1,
+    "fs": 2,
+    "fsp": 3,
+    "fsd": 4,
+    "fsdp": 5,
+}
+
+# 排序字段：主键降序，相同时依次比较后续字段
+SORT_KEYS = {
+    "ra": ("ra", "ds", "achievements"),
+    "ds": ("ds", "achievements", "ra"),
+    "achievements": ("achievements", "ds", "ra"),
+}
+
+# 各筛选标签的预设参数，clip_prefix 用于生成 clip_name
+FILTER_PRESETS = {
+    "ap": {"clip_prefix": "APBest", "fc": "ap"},
+    "fc": {"clip_prefix": "FCBest", "fc": "fc"},
+    "fs": {"clip_prefix": "FSBest", "fs": "fs"},
+    "fdx": {"clip_prefix": "FDXBest", "fs": "fsd"},
+    "level": {"clip_prefix": "LevelBest"},
+    "ds": {"clip_prefix": "DsBest", "sort_by": "ds"},
+}
+
+
+################################################
+# Composable predicates
+################################################
+def status_at_least(field, min_status, rank_table):
+    """记录的fc/fs状态不低于min_status"""
+    min_rank = rank_table[min_status.lower()]
+
+    def predicate(record):
+        status = (record.get(field) or "").lower()
+        return rank_table.get(status, 0) >= min_rank
+    return predicate
+
+
+def ds_in_range(min_ds=None, max_ds=None):
+    """定数位于 [min_ds, max_ds] 闭区间内，任一端为None表示不限制"""
+    def predicate(record):
+        ds = record.get("ds", 0)
+        if min_ds is not None and ds < min_ds:
+            return False
+        if max_ds is not None and ds > max_ds:
+            return False
+        return True
+    return predicate
+
+
+def level_in(levels):
+    """等级标签（如 "14", "14+"）属于给定集合"""
+    level_set = {str(level) for level in levels}
+
+    def predicate(record):
+        return str(record.get("level", "")) in level_set
+    return predicate
+
+
+def level_index_in(level_indexes):
+    """难度（0~4: Basic ~ Re:MASTER）属于给定集合"""
+    index_set = set(level_indexes)
+
+    def predicate(record):
+        return record.get("level_index", -1) in index_set
+    return predicate
+
+
+def chart_type_is(chart_types):
+    """谱面类型（SD/DX）属于给定集合"""
+    type_set = {t.upper() for t in chart_types}
+
+    def predicate(record):
+        return (record.get("type") or "").upper() in type_set
+    return predicate
+
+
+def version_in(versions, version_map=None):
+    """
+    乐曲版本属于给定集合。
+
+    Args:
+        versions (iterable): 允许的版本名称
+        version_map (dict): 可选，str(song_id) -> 版本名称，用于记录中不含版本字段的情况
+    """
+    version_set = set(versions)
+    version_map = version_map or {}
+
+    def predicate(record):
+        version = record.get("version", None)
+        if version is None:
+            version = version_map.get(str(record.get("song_id")), None)
+        return version in version_set
+    return predicate
+
+
+def build_version_map(music_metadata, version_key="version"):
+    """从乐曲元数据构建 str(song_id) -> 版本 的映射，缺失版本信息的乐曲将被忽略"""
+    version_map = {}
+    for music in music_metadata:
+        if music.get("id") is not None and music.get(version_key):
+            version_map[str(music["id"])] = music[version_key]
+    return version_map
+
+
+def requires_version_map(filter_params):
+    """filter参数中是否包含version筛选（需要提供乐曲版本映射）"""
+    return bool(filter_params and filter_params.get("version"))
+
+
+def build_predicates(filter_params, version_map=None):
+    """
+    将filter参数字典转换为谓词列表，所有谓词需同时满足。
+
+    filter_params 支持的字段（均为可选）:
+        - tag (str): 预设标签，见 FILTER_PRESETS
+        - fc (str): 最低FC状态，如 "fc" / "ap"
+        - fs (str): 最低FS状态，如 "fs" / "fsd"
+        - ds_range (list): [min_ds, max_ds]
+        - level (str | list): 等级标签，如 "14+"
+        - level_index (list): 难度索引
+        - chart_type (str | list): "SD" / "DX"
+        - version (str | list): 乐曲版本，需同时提供 version_map
+    """
+    params = dict(FILTER_PRESETS.get(filter_params.get("tag"), {}))
+    params.update(filter_params)
+
+    predicates = []
+    if params.get("fc"):
+        predicates.append(status_at_least("fc", params["fc"], FC_STATUS_RANK))
+    if params.get("fs"):
+        predicates.append(status_at_least("fs", params["fs"], FS_STATUS_RANK))
+    if params.get("ds_range"):
+        min_ds, max_ds = params["ds_range"]
+        predicates.append(ds_in_range(min_ds, max_ds))
+    if params.get("level"):
+        levels = params["level"]
+        predicates.append(level_in([levels] if isinstance(levels, str) else levels))
+    if params.get("level_index") is not None:
+        level_indexes = params["level_index"]
+        predicates.append(level_index_in([level_indexes] if isinstance(level_indexes, int) else level_indexes))
+    if params.get("chart_type"):
+        chart_types = params["chart_type"]
+        predicates.append(chart_type_is([chart_types] if isinstance(chart_types, str) else chart_types))
+    if params.get("version"):
+        # 水鱼的成绩记录不含版本字段，没有映射时所有记录都会被筛掉
+        if not version_map:
+            raise ValueError("Error: 按版本筛选需要乐曲版本映射，请先更新乐曲元数据。")
+        versions = params["version"]
+        predicates.append(version_in([versions] if isinstance(versions, str) else versions, version_map))
+    return predicates
+
+
+################################################
+# Heap-based top-k ranking
+################################################
+class TopKCollector:
+    """
+    以小顶堆维护前k条记录，每条记录只需一次O(log k)的入堆操作，
+    因此可以在记录逐条到达时（如流式解析）直接使用。
+    """
+    def __init__(self, top_len=50, sort_by="ra", predicates=None):
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Error: 不支持的排序字段 {sort_by}，可选值：{list(SORT_KEYS.keys())}")
+        self.top_len = top_len
+        self.sort_fields = SORT_KEYS[sort_by]
+        self.predicates = predicates or []
+        self.matched_count = 0
+        self._heap = []
+        # 先到达的记录在排序值相同时优先，与稳定排序的结果一致
+        self._order = count()
+
+    def _sort_key(self, record):
+        return tuple(record.get(field, 0) or 0 for field in self.sort_fields)
+
+    def push(self, record):
+        if not all(predicate(record) for predicate in self.predicates):
+            return
+        self.matched_count += 1
+        if self.top_len <= 0:
+            return
+        entry = (self._sort_key(record), -next(self._order), record)
+        if len(self._heap) < self.top_len:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, records):
+        for record in records:
+            self.push(record)
+
+    def result(self):
+        """按排序字段降序返回前k条记录"""
+        return [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+def label_filtered_records(records, clip_prefix):
+    """为筛选结果添加 clip_name / clip_id，并规范 level_label"""
+    for index, song in enumerate(records, start=1):
+        song["level_label"] = song.get("level_label", "").upper()
+        song["clip_name"] = f"{clip_prefix}_{index}"
+        song["clip_id"] = f"clip_{index}"
+    return records
+
+
+def get_clip_prefix(filter_params):
+    if filter_params.get("clip_prefix"):
+        return filter_params["clip_prefix"]
+    tag = filter_params.get("tag", None)
+    if tag == "level" and filter_params.get("level"):
+        level = filter_params["level"]
+        level_text = level if isinstance(level, str) else "_".join(str(l) for l in level)
+        return f"Lv{level_text.replace('+', 'p')}Best"
+    return FILTER_PRESETS.get(tag, {}).get("clip_prefix", "Best")
+
+
+def create_collector(filter_params, version_map=None):
+    """根据filter参数创建TopKCollector"""
+    params = dict(FILTER_PRESETS.get(filter_params.get("tag"), {}))
+    params.update(filter_params)
+    return TopKCollector(top_len=params.get("top", 50),
+                         sort_by=params.get("sort_by", "ra"),
+                         predicates=build_predicates(filter_params, version_map))
+
+
+def filter_records(records, filter_params, version_map=None):
+    """
+    按filter参数筛选全部成绩记录，并取排序后的前k条。
+
+    Args:
+        records (iterable): query=all 返回的全部成绩记录
+        filter_params (dict): 筛选参数，见 build_predicates，另支持 top / sort_by / clip_prefix
+        version_map (dict): 供version筛选使用的 str(song_id) -> 版本 映射，使用version筛选时必须提供
+
+    Returns:
+        list: 已添加 clip_name / clip_id 的前k条记录
+    """
+    collector = create_collector(filter_params, version_map)
+    collector.extend(records)
+    return label_filtered_records(collector.result(), get_clip_prefix(filter_params))
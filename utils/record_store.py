@@ -0,0 +1,126 @@
+import os
+
+from utils.StorageUtils import dump_json, dumps_json, loads_json
+
+JOURNAL_SUFFIX = ".journal"
+# 累计多少条单记录更新后合并回存档文件
+JOURNAL_COMPACT_INTERVAL = 10
+
+
+def get_journal_path(config_file):
+    return config_file + JOURNAL_SUFFIX
+
+
+def read_journal(config_file):
+    """
+    读取存档的日志文件，返回按写入顺序排列的更新条目。
+    最后一行可能因写入中途崩溃而不完整，此时忽略该行。
+    """
+    journal_path = get_journal_path(config_file)
+    if not os.path.exists(journal_path):
+        return []
+    entries = []
+    with open(journal_path, "rb") as f:
+        lines = [line for line in f.read().split(b"\n") if line.strip()]
+    for line_no, line in enumerate(lines, start=1):
+        try:
+            entries.append(loads_json(line))
+        except ValueError:
+            if line_no == len(lines):
+                print(f"Warning: 日志文件 {journal_path} 末尾存在未写完的更新，已忽略。")
+            else:
+                print(f"Warning: 日志文件 {journal_path} 第{line_no}条更新已损坏，已跳过。")
+    return entries
+
+
+def apply_journal_entries(records, entries):
+    """
+    将日志中的更新应用到records上，返回实际应用的条目数。
+    条目按序号定位记录，并用clip_id校验，序号不匹配时按clip_id查找。
+    """
+    applied = 0
+    for entry in entries:
+        index = entry.get("index", -1)
+        clip_id = entry.get("clip_id", None)
+        if not (0 <= index < len(records) and records[index].get("clip_id") == clip_id):
+            index = next((i for i, record in enumerate(records) if record.get("clip_id") == clip_id), -1)
+        if index < 0:
+            print(f"Warning: 日志中的记录 {clip_id} 在存档中不存在，已跳过。")
+            continue
+        records[index] = entry["record"]
+        applied += 1
+    return applied
+
+
+def replay_journal(config_file, content):
+    """将存档日志中尚未合并的更新应用到已读取的存档内容上（只修改内存中的content）"""
+    entries = read_journal(config_file)
+    if entries and isinstance(content, dict) and "records" in content:
+        applied = apply_journal_entries(content["records"], entries)
+        print(f"Info: 从日志中恢复了{applied}条未合并的记录更新：{config_file}")
+    return content
+
+
+def discard_journal(config_file):
+    journal_path = get_journal_path(config_file)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+
+class RecordStore:
+    """
+    以追加日志的方式保存单条记录的更新。
+
+    每次更新只向 <config_file>.journal 追加一行并落盘，代价与存档大小无关；
+    累计 compact_every 条更新或关闭时，才将完整内容原子地写回存档文件并清空日志。
+    进程中途退出时，下次读取存档会自动重放日志中的更新（见 replay_journal）。
+    """
+    def __init__(self, config_file, content, compact_every=JOURNAL_COMPACT_INTERVAL):
+        self.config_file = config_file
+        self.content = content
+        self.compact_every = compact_every
+        self.pending = 0
+        self._journal = None
+        # content 已重放过遗留的日志，先合并一次，避免新的更新追加在未写完的行之后
+        if os.path.exists(get_journal_path(config_file)):
+            self.compact()
+
+    @property
+    def records(self):
+        return self.content["records"]
+
+    def update_record(self, index, record=None):
+        """记录第index条记录的最新内容，record为None时使用records[index]"""
+        if record is None:
+            record = self.records[index]
+        else:
+            self.records[index] = record
+        if self._journal is None:
+            self._journal = open(get_journal_path(self.config_file), "ab")
+        entry = {"index": index, "clip_id": record.get("clip_id"), "record": record}
+        self._journal.write(dumps_json(entry) + b"\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.pending += 1
+        if self.pending >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """将内存中的完整内容写回存档文件，并清空已合并的日志"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        dump_json(self.config_file, self.content)
+        discard_journal(self.config_file)
+        self.pending = 0
+
+    def close(self):
+        if self.pending or self._journal is not None:
+            self.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
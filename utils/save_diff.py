@@ -0,0 +1,232 @@
+import os
+from copy import deepcopy
+
+from utils.PageUtils import load_full_config_safe, load_video_config, save_record_config, save_video_config
+from utils.PathUtils import get_data_paths, get_user_versions
+from utils.StorageUtils import copy_json_file, json_file_exists
+from utils.BlobStore import link_or_copy
+from utils.CacheUtils import file_signature
+from utils.RenderCache import RenderCache
+from utils.SaveCatalog import refresh_save
+from utils.WebAgentUtils import st_gene_resource_config
+
+# 视频搜索与下载只与谱面有关，成绩图与渲染片段还与成绩有关
+CHART_KEY_FIELDS = ("song_id", "level_index", "type")
+RECORD_KEY_FIELDS = ("song_id", "level_index", "type", "achievements", "fc", "fs")
+# 影响渲染结果的片段配置字段
+CLIP_CONTENT_FIELDS = ("text", "start", "end", "duration")
+
+
+def chart_key(record):
+    return tuple(record.get(field) for field in CHART_KEY_FIELDS)
+
+
+def record_key(record):
+    return tuple(record.get(field) for field in RECORD_KEY_FIELDS)
+
+
+def diff_save_records(old_records, new_records):
+    """
+    按 (song_id, level_index, type, achievements, fc, fs) 比较新旧存档的成绩记录。
+
+    Returns:
+        dict: {
+            "unchanged": [(old_record, new_record), ...],  # 成绩完全相同
+            "changed": [(old_record, new_record), ...],    # 同一谱面，成绩有变化
+            "added": [new_record, ...],                    # 新进入列表的谱面
+            "removed": [old_record, ...],                  # 已离开列表的谱面
+        }
+    """
+    old_by_chart = {chart_key(record): record for record in old_records}
+    new_charts = set()
+    result = {"unchanged": [], "changed": [], "added": [], "removed": []}
+    for new_record in new_records:
+        key = chart_key(new_record)
+        new_charts.add(key)
+        old_record = old_by_chart.get(key, None)
+        if old_record is None:
+            result["added"].append(new_record)
+        elif record_key(old_record) == record_key(new_record):
+            result["unchanged"].append((old_record, new_record))
+        else:
+            result["changed"].append((old_record, new_record))
+    result["removed"] = [record for key, record in old_by_chart.items() if key not in new_charts]
+    return result
+
+
+def find_previous_save(username, save_id):
+    """返回早于save_id的最近一个有效存档的时间戳，不存在时返回None"""
+    for version in get_user_versions(username):
+        if version >= save_id:
+            continue
+        if json_file_exists(get_data_paths(username, version)['data_file']):
+            return version
+    return None
+
+
+def _copy_if_exists(src, dst):
+    if not src or not os.path.exists(src) or os.path.exists(dst):
+        return False
+    # 通过资源仓库硬链接，新旧存档共享同一份数据
+    link_or_copy(src, dst)
+    return True
+
+
+def _carry_rendered_clip(old_cache, new_cache, old_file, new_file):
+    """
+    将旧存档中已渲染的片段链接到新存档，并在新存档的渲染缓存中记录其指纹。
+    只有旧片段的指纹有效且链接后的文件与旧文件相同（硬链接或完整复制）时才算复用成功，
+    否则下次渲染时该片段会被重新渲染。
+    """
+    fingerprint = old_cache.get_fingerprint(old_file)
+    if fingerprint is None:
+        return False
+    _copy_if_exists(old_file, new_file)
+    if not os.path.exists(new_file) or file_signature(new_file) != file_signature(old_file):
+        return False
+    new_cache.record(new_file, fingerprint)
+    return True
+
+
+def _rendered_clip_names(video_config):
+    """按render_all_video_clips的顺序，返回 片段id -> 渲染输出文件名 的映射"""
+    names = {}
+    prefix = 0
+    ordered = video_config.get('intro', []) + list(reversed(video_config.get('main', []))) + video_config.get('ending', [])
+    for clip_config in ordered:
+        names[clip_config['id']] = f"{prefix}_{clip_config['id']}.mp4"
+        prefix += 1
+    return names
+
+
+def _clip_content(clip_config):
+    return tuple(clip_config.get(field) for field in CLIP_CONTENT_FIELDS)
+
+
+def create_delta_save(username, new_save_id, base_save_id=None, global_config=None):
+    """
+    以上一个存档为基础增量创建新存档：沿用未变化记录的视频搜索结果、成绩图、片段配置与已渲染片段，
+    并报告需要重新处理的记录。新存档的 b50_config.json 必须已经生成。
+
+    Args:
+        username (str): 用户名
+        new_save_id (str): 新存档的时间戳
+        base_save_id (str): 作为基础的旧存档时间戳，默认为新存档之前最近的一个存档
+        global_config (dict): 全局配置，用于生成新的片段配置（CLIP_START_INTERVAL等）
+
+    Returns:
+        dict: 增量报告，不存在可用的旧存档时返回None
+    """
+    if base_save_id is None:
+        base_save_id = find_previous_save(username, new_save_id)
+    if base_save_id is None:
+        print("Info: 没有找到可用的旧存档，跳过增量复用。")
+        return None
+
+    old_paths = get_data_paths(username, base_save_id)
+    new_paths = get_data_paths(username, new_save_id)
+    old_config = load_full_config_safe(old_paths['data_file'], username)
+    new_config = load_full_config_safe(new_paths['data_file'], username)
+    new_records = new_config.get('records', [])
+
+    diff = diff_save_records(old_config.get('records', []), new_records)
+    # 成绩图上绘制了clip_name（如 "PastBest 3"），排名变化的记录即使成绩不变也需要重新生成
+    reusable = [(old, new) for old, new in diff["unchanged"] if old.get('clip_name') == new.get('clip_name')]
+    reusable_new_ids = {new['clip_id'] for _, new in reusable}
+    old_id_of = {new['clip_id']: old['clip_id'] for old, new in reusable}
+
+    report = {
+        "base_save_id": base_save_id,
+        "unchanged": [new['clip_name'] for _, new in diff["unchanged"]],
+        "changed": [new['clip_name'] for _, new in diff["changed"]],
+        "added": [new['clip_name'] for new in diff["added"]],
+        "removed": [old['title'] for old in diff["removed"]],
+        "needs_search": [],
+        "needs_image": [],
+        "needs_render": [],
+        "reused_images": 0,
+        "reused_clips": 0,
+    }
+
+    # 1. 沿用视频搜索结果（按谱面匹配）
+    for config_key in ('config_bi', 'config_yt'):
+        if not json_file_exists(old_paths[config_key]):
+            continue
+        old_platform_records = load_full_config_safe(old_paths[config_key], username).get('records', [])
+        video_info_of = {chart_key(record): record for record in old_platform_records
+                         if record.get('video_info_match')}
+        platform_records = deepcopy(new_records)
+        for record in platform_records:
+            cached = video_info_of.get(chart_key(record), None)
+            if cached is not None:
+                record['video_info_list'] = cached.get('video_info_list', [])
+                record['video_info_match'] = cached['video_info_match']
+            elif record['clip_name'] not in report["needs_search"]:
+                report["needs_search"].append(record['clip_name'])
+        copy_json_file(new_paths['data_file'], new_paths[config_key])
+        save_record_config(new_paths[config_key], platform_records)
+
+    # 2. 沿用成绩图
+    for record in new_records:
+        new_image = os.path.join(new_paths['image_dir'], f"{record['clip_id']}.png")
+        if record['clip_id'] in reusable_new_ids:
+            old_image = os.path.join(old_paths['image_dir'], f"{old_id_of[record['clip_id']]}.png")
+            if _copy_if_exists(old_image, new_image) or os.path.exists(new_image):
+                report["reused_images"] += 1
+                continue
+        report["needs_image"].append(record['clip_name'])
+
+    # 3. 沿用片段配置（评论、起止时间）与已渲染的片段
+    old_video_config = load_video_config(old_paths['video_config'])
+    if old_video_config and 'main' in old_video_config and global_config is not None:
+        new_video_config = st_gene_resource_config(new_records, new_config.get('sub_type', 'best'),
+                                                   new_paths['image_dir'], "./videos/downloads",
+                                                   new_paths['video_config'],
+                                                   global_config['CLIP_START_INTERVAL'],
+                                                   global_config['CLIP_PLAY_TIME'],
+                                                   global_config['DEFAULT_COMMENT_PLACEHOLDERS'])
+        new_video_config['intro'] = deepcopy(old_video_config.get('intro', new_video_config['intro']))
+        new_video_config['ending'] = deepcopy(old_video_config.get('ending', new_video_config['ending']))
+
+        old_main_of = {clip['id']: clip for clip in old_video_config['main']}
+        carried_ids = set()
+        for clip in new_video_config['main']:
+            # 成绩图在本步骤之后才会生成，这里统一写入确定的路径
+            clip['main_image'] = os.path.normpath(os.path.join(new_paths['image_dir'], f"{clip['id']}.png"))
+            old_clip = old_main_of.get(old_id_of.get(clip['id']), None)
+            if old_clip is not None:
+                for field in CLIP_CONTENT_FIELDS:
+                    if field in old_clip:
+                        clip[field] = old_clip[field]
+                carried_ids.add(clip['id'])
+        save_video_config(new_paths['video_config'], new_video_config)
+
+        old_render_cache = RenderCache(old_paths['output_video_dir'])
+        new_render_cache = RenderCache(new_paths['output_video_dir'])
+        old_clip_names = _rendered_clip_names(old_video_config)
+        new_clip_names = _rendered_clip_names(new_video_config)
+        old_all = {clip['id']: clip for clip in
+                   old_video_config.get('intro', []) + old_video_config['main'] + old_video_config.get('ending', [])}
+        for clip in new_video_config['intro'] + new_video_config['ending']:
+            old_file = os.path.join(old_paths['output_video_dir'], old_clip_names.get(clip['id'], ""))
+            new_file = os.path.join(new_paths['output_video_dir'], new_clip_names[clip['id']])
+            if clip['id'] in old_all and _clip_content(old_all[clip['id']]) == _clip_content(clip) \
+                    and _carry_rendered_clip(old_render_cache, new_render_cache, old_file, new_file):
+                report["reused_clips"] += 1
+        for clip in new_video_config['main']:
+            if clip['id'] in carried_ids:
+                old_id = old_id_of[clip['id']]
+                old_file = os.path.join(old_paths['output_video_dir'], old_clip_names[old_id])
+                new_file = os.path.join(new_paths['output_video_dir'], new_clip_names[clip['id']])
+                if _carry_rendered_clip(old_render_cache, new_render_cache, old_file, new_file):
+                    report["reused_clips"] += 1
+                    continue
+            report["needs_render"].append(clip.get('clip_name', clip['id']))
+    else:
+        report["needs_render"] = [record['clip_name'] for record in new_records]
+
+    print(f"Info: 基于存档{base_save_id}增量创建存档{new_save_id}：未变化{len(report['unchanged'])}条，"
+          f"成绩更新{len(report['changed'])}条，新增{len(report['added'])}条，移出{len(report['removed'])}条；"
+          f"复用成绩图{report['reused_images']}张，复用已渲染片段{report['reused_clips']}个。")
+    refresh_save(username, new_save_id)
+    return report
@@ -4,36 +4,52 @@ from lxml import etree
 import os
 import re
 import json
+import shutil
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from utils.dxnet_extension import ChartManager
-from utils.PageUtils import DATA_CONFIG_VERSION, format_record_songid
-from utils.DataUtils import FC_PROXY_ENDPOINT
+from utils.PageUtils import DATA_CONFIG_VERSION, format_record_songid, load_music_metadata, remove_invalid_chars
+from utils.PathUtils import get_data_paths
+from utils.StorageUtils import dump_json
+from utils.SaveCatalog import refresh_save_at
+from utils.DataUtils import FC_PROXY_ENDPOINT, DIVING_FISH_ENDPOINT
+from utils.record_filters import (FILTER_PRESETS, build_version_map, create_collector, filter_records,
+                                  requires_version_map)
+from utils.json_stream import stream_json_records
 
 LEVEL_LABEL = ["Basic", "Advanced", "Expert", "Master", "Re:MASTER"]
 
+FISH_REQUEST_TIMEOUT = 30
+FISH_ALL_QUERY_TIMEOUT = 60
+FISH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Content-Type": "application/json"
+}
+
 ################################################
 # Query B50 data from diving-fish.com
 ################################################
-def get_data_from_fish(username, params=None):
+def get_data_from_fish(username, params=None, session=None, timeout=FISH_REQUEST_TIMEOUT,
+                       fish_endpoint=DIVING_FISH_ENDPOINT, proxy_endpoint=FC_PROXY_ENDPOINT):
     """从水鱼获取数据"""
     if params is None:
         params = {}
+    # 未传入session时使用一次性请求，批量查询时传入共享连接池的session
+    http = session if session is not None else requests
     type = params.get("type", "maimai")
     query = params.get("query", "best")
     # MAIMAI DX 的请求
     if type == "maimai":
         if query == "best":
-            url = "https://www.diving-fish.com/api/maimaidxprober/query/player"
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                "Content-Type": "application/json"
-            }
+            url = f"{fish_endpoint}/query/player"
             payload = {
                 "username": username,
                 "b50": "1"
             }
-            response = requests.post(url, headers=headers, json=payload)
+            response = http.post(url, headers=FISH_HEADERS, json=payload, timeout=timeout)
             if response.status_code == 200:
                 return response.json()
             elif response.status_code == 400 or response.status_code == 403:
@@ -42,21 +58,18 @@ def get_data_from_fish(username, params=None):
                     msg = response.json().get("msg", "水鱼端未知错误")
                 return {"error": f"用户校验失败，返回消息：{msg}"}
             else:
-                return {"error": f"请求水鱼数据失败，状态码: {response.status_code}，返回消息：{response.json()}"}
+                return {"error": f"请求水鱼数据失败，状态码: {response.status_code}，返回消息：{response.text}"}
             
         elif query == "all":
             # get all data from thrid party function call
-            response = requests.get(FC_PROXY_ENDPOINT, params={"username": username}, timeout=60)
+            response = http.get(proxy_endpoint, params={"username": username},
+                                timeout=max(timeout, FISH_ALL_QUERY_TIMEOUT))
             response.raise_for_status()
 
             return json.loads(response.text)
         elif query == "test_all":
-            url = "https://www.diving-fish.com/api/maimaidxprober/player/test_data"
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                "Content-Type": "application/json"
-            }
-            response = requests.get(url, headers=headers)
+            url = f"{fish_endpoint}/player/test_data"
+            response = http.get(url, headers=FISH_HEADERS, timeout=timeout)
             response.raise_for_status()
 
             return response.json()
@@ -68,10 +81,53 @@ def get_data_from_fish(username, params=None):
     else:
         raise ValueError("Invalid game data type for diving-fish.com")
     
+def stream_fish_data_with_filter(username, raw_file_path, record_filter, session=None,
+                                 timeout=FISH_ALL_QUERY_TIMEOUT, proxy_endpoint=FC_PROXY_ENDPOINT,
+                                 version_map=None):
+    """
+    流式获取全部成绩数据（query=all），记录到达时直接送入筛选器。
+    原始数据以紧凑格式写入raw_file_path，内存中不保留完整的记录列表。
+
+    Returns:
+        dict: 顶层字段与筛选后的 records（已按筛选规则排序，未添加clip信息）
+    """
+    if version_map is None:
+        version_map = load_version_map(record_filter)
+    collector = create_collector(record_filter, version_map)
+    http = session if session is not None else requests
+    with http.get(proxy_endpoint, params={"username": username},
+                  timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        with open(raw_file_path, "w", encoding="utf-8") as f:
+            parser = stream_json_records(response.iter_content(chunk_size=64 * 1024),
+                                         on_record=collector.push,
+                                         snapshot_file=f)
+    print(f"Info: 共解析{parser.record_count}条成绩记录，其中{collector.matched_count}条符合筛选条件。")
+    fish_data = dict(parser.fields)
+    fish_data["records"] = collector.result()
+    return fish_data
+
 ################################################
 # Maimai B50 data handlers from diving-fish.com
 ################################################
-def fetch_user_gamedata(raw_file_path, data_file_path, username, params, source="fish"):
+def load_version_map(record_filter, game_type="maimaidx"):
+    """
+    从本地乐曲元数据（songs.json）构建version筛选所需的 str(song_id) -> 版本 映射。
+    filter中不含version筛选时返回None。
+    """
+    if not requires_version_map(record_filter):
+        return None
+    try:
+        version_map = build_version_map(load_music_metadata(game_type))
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"Error: 未找到乐曲元数据，无法按版本筛选。{e}") from e
+    if not version_map:
+        raise ValueError("Error: 乐曲元数据中没有版本信息，无法按版本筛选，请更新乐曲元数据。")
+    return version_map
+
+
+def fetch_user_gamedata(raw_file_path, data_file_path, username, params, source="fish", version_map=None,
+                        **request_options):
     # params = {
     #     "type": maimai / chuni / ...,
     #     "query": all / best /
@@ -81,15 +137,24 @@ def fetch_user_gamedata(raw_file_path, data_file_path, username, params, source=
     #     },
     #}
     if source == "fish":
+        query = params.get("query", "best")
+        if version_map is None and query == "all":
+            version_map = load_version_map(params.get("filter", None))
         try:
-            fish_data = get_data_from_fish(username, params)
+            if query == "all" and params.get("filter", None):
+                # 全量数据：边下载边解析，同时写入紧凑的b50_raw_file，只保留筛选出的记录
+                fish_data = stream_fish_data_with_filter(username, raw_file_path, params["filter"],
+                                                         session=request_options.get("session", None),
+                                                         timeout=request_options.get("timeout", FISH_ALL_QUERY_TIMEOUT),
+                                                         proxy_endpoint=request_options.get("proxy_endpoint", FC_PROXY_ENDPOINT),
+                                                         version_map=version_map)
+            else:
+                fish_data = get_data_from_fish(username, params, **request_options)
+                # 缓存，写入b50_raw_file
+                dump_json(raw_file_path, fish_data)
         except json.JSONDecodeError:
             print("Error: 读取 JSON 文件时发生错误，请检查数据格式。")
             return None
-        
-        # 缓存，写入b50_raw_file
-        with open(raw_file_path, "w", encoding="utf-8") as f:
-            json.dump(fish_data, f, ensure_ascii=False, indent=4)
 
         if 'error' in fish_data:
             raise Exception(f"Error: 从水鱼获得B50数据失败。错误信息：{fish_data['error']}")
@@ -97,10 +162,10 @@ def fetch_user_gamedata(raw_file_path, data_file_path, username, params, source=
             raise Exception(f"Error: 从水鱼获得B50数据失败。错误信息：{fish_data['msg']}")
         
         # 生成数据文件
-        generate_config_file_from_fish(fish_data, data_file_path, params)
+        generate_config_file_from_fish(fish_data, data_file_path, params, version_map)
 
 
-def generate_config_file_from_fish(fish_data, data_file_path, params):
+def generate_config_file_from_fish(fish_data, data_file_path, params, version_map=None):
     type = params.get("type", "maimai")
     query = params.get("query", "best")
     filter = params.get("filter", None)
@@ -142,53 +207,126 @@ def generate_config_file_from_fish(fish_data, data_file_path, params):
             else:
                 tag = filter.get("tag", None)
                 top_len = filter.get("top", 50)
-                if tag == "ap":
-                    data_list = filter_maimai_ap_data(fish_data, top_len)
-                    if len(data_list) < top_len:
-                        print(f"Warning: 仅找到{len(data_list)}条AP数据，生成实际数据长度小于top_len={top_len}的配置。")
-                    config_content = {
-                        "version": DATA_CONFIG_VERSION,
-                        "type": type,
-                        "sub_type": tag,
-                        "username": fish_data['username'],
-                        "rating": fish_data['rating'],
-                        "length_of_content": len(data_list),
-                        "records": data_list,
-                    }
-                else:
-                    raise ValueError("Error: 目前仅支持tag为ap的查询类型。")
+                if tag not in FILTER_PRESETS:
+                    raise ValueError(f"Error: 不支持的筛选标签 {tag}，可选值：{list(FILTER_PRESETS.keys())}")
+                if version_map is None:
+                    version_map = load_version_map(filter)
+                data_list = filter_records(fish_data['records'], filter, version_map)
+                if len(data_list) < top_len:
+                    print(f"Warning: 仅找到{len(data_list)}条符合条件的数据，生成实际数据长度小于top_len={top_len}的配置。")
+                config_content = {
+                    "version": DATA_CONFIG_VERSION,
+                    "type": type,
+                    "sub_type": tag,
+                    "username": fish_data['username'],
+                    "rating": fish_data['rating'],
+                    "length_of_content": len(data_list),
+                    "records": data_list,
+                }
                 
         # 写入b50_data_file
-        with open(data_file_path, "w", encoding="utf-8") as f:
-            json.dump(config_content, f, ensure_ascii=False, indent=4)
+        dump_json(data_file_path, config_content)
+        refresh_save_at(data_file_path)
         return config_content
     else:
         raise ValueError("Only MAIMAI DX is supported for now")
 
 
 def filter_maimai_ap_data(fish_data, top_len=50):
-    charts_data = fish_data['records']
+    # 按照ra值降序、ds定数次之，取前top_len条AP记录
+    return filter_records(fish_data['records'], {"tag": "ap", "top": top_len})
+
+################################################
+# Batch query for multiple users
+################################################
+def create_fish_session(pool_size=4):
+    """创建复用连接的requests.Session，连接池大小与并发数一致"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 
-    # 解析AP数据
-    ap_data = []
-    for song in charts_data:
-        fc_flag = song.get('fc', '').lower()
-        if 'ap' in fc_flag or 'app' in fc_flag:
-            ap_data.append(song)
+def get_save_username(raw_username):
+    """将查分器用户名转换为可用作目录名的用户名（与存档管理页面的规则一致）"""
+    return remove_invalid_chars(raw_username).replace(' ', '_')
 
-    # 按照ra值降序排序，如果ra值相同，按照ds定数降序排序
-    ap_data.sort(key=lambda x: (x.get('ra', 0), x.get('ds', 0)), reverse=True)
-    ap_data = ap_data[:top_len]
 
-    for song in ap_data:
-        index = ap_data.index(song) + 1
-        # 将level_label转换为全大写
-        song["level_label"] = song.get("level_label", "").upper()
-        # 添加clip_id字段
-        song['clip_name'] = f"APBest_{index}"
-        song['clip_id'] = f"clip_{index}"
+def fetch_users_gamedata_batch(usernames, params, max_workers=4, timeout=FISH_REQUEST_TIMEOUT,
+                               on_result=None, **endpoints):
+    """
+    并发获取多个用户的数据，每个用户的结果到达后立即写入各自的新存档。
+
+    Args:
+        usernames (list): 查分器用户名列表
+        params (dict): 查询参数，与fetch_user_gamedata相同
+        max_workers (int): 最大并发请求数
+        timeout (float): 单个请求的超时时间（秒）
+        on_result (callable): 可选，每个用户完成时回调 on_result(username, result)
+        endpoints: 可选的 fish_endpoint / proxy_endpoint，用于指向本地测试服务
 
-    return ap_data
+    Returns:
+        dict: username -> {"status": "success"/"error", "save_id": ..., "info": ...}
+    """
+    usernames = list(dict.fromkeys(name.strip() for name in usernames if name and name.strip()))
+    max_workers = max(1, min(max_workers, len(usernames) or 1))
+    # 版本映射对所有用户相同，只加载一次；元数据不可用时在创建任何存档之前报错
+    version_map = load_version_map(params.get("filter", None)) if params.get("query", "best") == "all" else None
+    thread_local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def get_session():
+        # requests.Session 不保证线程安全，每个工作线程持有一个session，线程内复用连接
+        if not hasattr(thread_local, "session"):
+            thread_local.session = create_fish_session()
+            with sessions_lock:
+                sessions.append(thread_local.session)
+        return thread_local.session
+
+    def fetch_one(raw_username):
+        save_username = get_save_username(raw_username)
+        paths = get_data_paths(save_username, timestamp=None)
+        version_dir = os.path.dirname(paths['data_file'])
+        user_dir = os.path.dirname(version_dir)
+        created_user_dir = not os.path.exists(user_dir)
+        os.makedirs(version_dir, exist_ok=True)
+        try:
+            raw_username_file = os.path.join(user_dir, "raw_username.txt")
+            if not os.path.exists(raw_username_file):
+                with open(raw_username_file, 'w', encoding='utf-8') as f:
+                    f.write(raw_username)
+            fetch_user_gamedata(paths['raw_file'], paths['data_file'], raw_username, params,
+                                source="fish", version_map=version_map, session=get_session(), timeout=timeout,
+                                **endpoints)
+            if not os.path.exists(paths['data_file']):
+                raise RuntimeError("未能生成存档文件，请检查返回的数据格式")
+        except Exception:
+            # 获取失败时删除本次创建的存档目录（新用户则删除整个用户目录），不在存档列表中留下空存档
+            shutil.rmtree(user_dir if created_user_dir else version_dir, ignore_errors=True)
+            raise
+        return os.path.basename(version_dir)
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch_one, name): name for name in usernames}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    save_id = future.result()
+                    result = {"status": "success", "save_id": save_id, "info": f"已为{name}创建存档{save_id}"}
+                except Exception as e:
+                    result = {"status": "error", "save_id": None, "info": f"获取{name}的数据失败：{e}"}
+                print(f"[Batch] {result['info']}")
+                results[name] = result
+                if on_result:
+                    on_result(name, result)
+    finally:
+        for session in sessions:
+            session.close()
+    return results
 
 ################################################
 # Origin B50 data file finders
@@ -284,8 +422,7 @@ def read_b50_from_html(b50_raw_file, username):
     b50_json["rating"] = manager.total_rating
 
     # Write b50 JSON to raw file
-    with open(b50_raw_file, 'w', encoding="utf-8") as f:
-        json.dump(b50_json, f, ensure_ascii = False, indent = 4)
+    dump_json(b50_raw_file, b50_json)
     return b50_json
 
 def locate_html_screw(html_tree, div_names):
@@ -387,8 +524,7 @@ def read_dxrating_json(b50_raw_file, username):
     b50_json["rating"] = manager.total_rating
 
     # Write b50 JSON to raw file
-    with open(b50_raw_file, 'w', encoding="utf-8") as f:
-        json.dump(b50_json, f, ensure_ascii = False, indent = 4)
+    dump_json(b50_raw_file, b50_json)
     return b50_json
 
 def parse_dxrating_json(song_json, song_id_placeholder):
@@ -482,8 +618,8 @@ def generate_data_file_int(parsed_data, data_file_path, params):
             }
                 
         # 写入b50_data_file
-        with open(data_file_path, "w", encoding="utf-8") as f:
-            json.dump(config_content, f, ensure_ascii=False, indent=4)
+        dump_json(data_file_path, config_content)
+        refresh_save_at(data_file_path)
         return config_content
     else:
         raise ValueError("Only MAIMAI DX is supported for now")